@@ -1,25 +1,55 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
 from fastapi.security import OAuth2PasswordBearer
 from fastapi.responses import JSONResponse
 from typing import Dict, Optional
 import jwt
 from datetime import datetime, timedelta
+import asyncio
 import os
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
 from dotenv import load_dotenv
 from pydantic import BaseModel
+from caching import TTLCache
+import metrics
 import base64
 import json
 
+logger = logging.getLogger(__name__)
+
 # Load environment variables from .env file
 load_dotenv()
 
 # Get the secret key from environment variables
 SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key-here")
-print(f"Loaded JWT_SECRET_KEY (first 10 chars): {SECRET_KEY[:10] if SECRET_KEY else 'Not set'}")
+logger.debug("JWT_SECRET_KEY is %s", "set" if os.getenv("JWT_SECRET_KEY") else "not set, using default")
 
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# Verified tokens are remembered until they expire, so repeat requests skip
+# signature verification. Entries never outlive MAX_TTL seconds.
+TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", 10000))
+TOKEN_CACHE_MAX_TTL = float(os.getenv("AUTH_TOKEN_CACHE_MAX_TTL", 300))
+token_cache = TTLCache(maxsize=TOKEN_CACHE_SIZE, ttl=TOKEN_CACHE_MAX_TTL)
+metrics.register_cache("verified_tokens", token_cache.stats)
+
+# Token-bucket rate limits per subscription tier: sustained requests per
+# minute and the burst a user may spend at once
+RATE_LIMITS = {
+    "personal": {
+        "per_minute": float(os.getenv("RATE_LIMIT_PERSONAL_PER_MINUTE", 20)),
+        "burst": int(os.getenv("RATE_LIMIT_PERSONAL_BURST", 5))
+    },
+    "corporate": {
+        "per_minute": float(os.getenv("RATE_LIMIT_CORPORATE_PER_MINUTE", 120)),
+        "burst": int(os.getenv("RATE_LIMIT_CORPORATE_BURST", 20))
+    }
+}
+
 router = APIRouter(
     prefix="/auth",
     tags=["auth"]
@@ -45,10 +75,51 @@ async def get_token_from_request(request: Request) -> Optional[str]:
         return auth_header.replace("Bearer ", "")
     return None
 
+def verify_token(token: str) -> Dict:
+    """Verify a JWT and return the user it identifies, using the verified-token cache."""
+    user = token_cache.get(token)
+    if user is not None:
+        return user
+
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except jwt.ExpiredSignatureError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token has expired"
+        )
+    except jwt.InvalidTokenError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid token"
+        )
+
+    user_id = payload.get("sub") or payload.get("id")
+    if not user_id:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid token content"
+        )
+
+    subscription_tier = payload.get("subscription_tier", "personal")
+    if subscription_tier not in ["personal", "corporate"]:
+        subscription_tier = "personal"
+
+    user = {
+        "id": user_id,
+        "subscription_tier": subscription_tier
+    }
+
+    # Cache until the token expires; tokens without exp get the default TTL
+    ttl = TOKEN_CACHE_MAX_TTL
+    if "exp" in payload:
+        ttl = min(ttl, float(payload["exp"]) - time.time())
+    if ttl > 0:
+        token_cache.set(token, user, ttl=ttl)
+    return user
+
 async def get_current_user(request: Request, token: str = Depends(oauth2_scheme)) -> Dict:
     """Get current user from token with better error handling"""
-    print("\n=== Token Validation Debug ===")
-    
     # Try to get token from request if not provided through oauth2_scheme
     if not token:
         token = await get_token_from_request(request)
@@ -60,44 +131,98 @@ async def get_current_user(request: Request, token: str = Depends(oauth2_scheme)
             headers={"WWW-Authenticate": "Bearer"}
         )
     
-    print(f"Validating token (first 20 chars): {token[:20]}...")
-    
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id = payload.get("sub") or payload.get("id")
-        
-        if not user_id:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid token content"
-            )
-            
-        subscription_tier = payload.get("subscription_tier", "personal")
-        if subscription_tier not in ["personal", "corporate"]:
-            subscription_tier = "personal"
-            
-        return {
-            "id": user_id,
-            "subscription_tier": subscription_tier
-        }
-        
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Token has expired"
-        )
-    except jwt.InvalidTokenError:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid token"
-        )
+        return verify_token(token)
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Unexpected error in get_current_user: {str(e)}")
+        logger.error(f"Unexpected error in get_current_user: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Authentication error"
         )
 
+class TokenBucketLimiter:
+    """Per-user token buckets with tier-specific refill rates.
+
+    Each user starts with ``burst`` tokens; tokens refill continuously at
+    ``per_minute / 60`` per second up to ``burst``. Buckets are kept in an
+    LRU map bounded by ``max_users``; an evicted user simply starts full.
+    """
+
+    def __init__(self, limits: Dict[str, Dict], max_users: int = 100000):
+        self.limits = limits
+        self.max_users = max_users
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, user_id: str, tier: str):
+        """Take one token; return (allowed, limit, remaining, seconds until a token is available)."""
+        limit = self.limits.get(tier, self.limits["personal"])
+        capacity = limit["burst"]
+        rate = limit["per_minute"] / 60.0
+        now = time.monotonic()
+        key = (user_id, tier)
+
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_users:
+                self._buckets.popitem(last=False)
+
+        wait = 0.0 if tokens >= 1 else (1 - tokens) / rate if rate > 0 else math.inf
+        return allowed, capacity, int(tokens), wait
+
+rate_limiter = TokenBucketLimiter(RATE_LIMITS)
+
+async def get_rate_limited_user(response: Response, current_user: Dict = Depends(get_current_user)) -> Dict:
+    """Authenticate the user and charge one request to their tier's token bucket.
+
+    Use on inference endpoints; over-limit requests get a 429 before they
+    reach the model queue.
+    """
+    allowed, limit, remaining, wait = rate_limiter.acquire(
+        current_user["id"], current_user.get("subscription_tier", "personal")
+    )
+    headers = {
+        "X-RateLimit-Limit": str(limit),
+        "X-RateLimit-Remaining": str(remaining),
+        "X-RateLimit-Reset": str(math.ceil(wait)) if wait != math.inf else "0"
+    }
+    if not allowed:
+        logger.info("Rate limit exceeded for user %s", current_user["id"])
+        headers["Retry-After"] = str(max(1, math.ceil(wait))) if wait != math.inf else "60"
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Rate limit exceeded, please retry later",
+            headers=headers
+        )
+    response.headers.update(headers)
+    return current_user
+
+async def wait_for_rate_limit(current_user: Dict) -> None:
+    """Charge one token to the user's bucket, waiting for it to refill if it is empty.
+
+    For requests that are admitted once but then run many model calls, such
+    as the batches of a bulk summarization, so those calls are shaped like
+    separate requests.
+    """
+    tier = current_user.get("subscription_tier", "personal")
+    while True:
+        allowed, _, _, wait = rate_limiter.acquire(current_user["id"], tier)
+        if allowed:
+            return
+        if wait == math.inf:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Rate limit exceeded, please retry later"
+            )
+        await asyncio.sleep(wait)
+
 def create_access_token(data: dict) -> str:
     """Create a new access token"""
     to_encode = data.copy()
@@ -112,7 +237,7 @@ def create_access_token(data: dict) -> str:
     try:
         return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     except Exception as e:
-        print(f"Error creating token: {str(e)}")
+        logger.error(f"Error creating token: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Error creating access token"
@@ -0,0 +1,94 @@
+"""Measure how long the FastAPI app takes to import.
+
+Run from the ai_service directory:
+
+    python -m benchmarks.import_time --repeat 5 --budget 1.5
+
+Each run imports ``main`` in a fresh interpreter, so nothing is shared with
+earlier runs, and reports the median wall time. The run fails if the median
+exceeds ``--budget`` seconds or if any module that should only load on the
+first request that needs it (torch, transformers, langchain, ...) was
+imported at startup. ``--importtime`` prints the slowest imports as reported
+by ``python -X importtime``.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must not be imported just to serve /health
+HEAVY_MODULES = [
+    "torch",
+    "transformers",
+    "langchain",
+    "pygame",
+    "gtts",
+    "numpy",
+    "scipy",
+    "spacy",
+    "keybert",
+    "googleapiclient.discovery"
+]
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import main
+elapsed = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed, "modules": [m for m in %r if m in sys.modules]}))
+"""
+
+def run_once():
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE % (HEAVY_MODULES,)],
+        cwd=SERVICE_DIR, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def slowest_imports(limit):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=SERVICE_DIR, capture_output=True, text=True, check=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        # "import time:  <self us> | <cumulative us> | <indented module>"
+        own, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative), int(own), name.strip()))
+    return sorted(rows, reverse=True)[:limit]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=None, help="fail if the median import time exceeds this (seconds)")
+    parser.add_argument("--importtime", type=int, default=0, metavar="N", help="show the N slowest imports")
+    args = parser.parse_args()
+
+    runs = [run_once() for _ in range(args.repeat)]
+    times = [run["seconds"] for run in runs]
+    heavy = sorted({module for run in runs for module in run["modules"]})
+    median = statistics.median(times)
+    print(f"import main: median {median:.3f}s, min {min(times):.3f}s, max {max(times):.3f}s over {len(times)} runs")
+
+    if args.importtime:
+        print(f"\n{'cumulative (ms)':>16} {'self (ms)':>10}  module")
+        for cumulative, own, name in slowest_imports(args.importtime):
+            print(f"{cumulative / 1000:>16.1f} {own / 1000:>10.1f}  {name}")
+
+    failed = False
+    if heavy:
+        print(f"\nFAIL: heavy modules imported at startup: {', '.join(heavy)}")
+        failed = True
+    if args.budget is not None and median > args.budget:
+        print(f"\nFAIL: median import time {median:.3f}s exceeds budget {args.budget:.3f}s")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
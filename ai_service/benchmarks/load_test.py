@@ -0,0 +1,311 @@
+"""Open-loop load generator for the AI service.
+
+Run from the ai_service directory:
+
+    # Against the app with stubbed engines, started and stopped by the harness
+    python -m benchmarks.load_test --stub --rates 5,10,20,40 --duration 20
+
+    # Against a running server that shares this environment's SECRET_KEY
+    python -m benchmarks.load_test --target http://localhost:5001 --rates 10
+
+Requests arrive as a Poisson process at each rate in ``--rates`` in turn, so
+a slow server builds up latency and errors instead of quietly slowing the
+generator down. Each request picks an endpoint by the ``--mix`` weights and
+a synthetic user; the users' JWTs are minted locally with
+create_access_token. Every step reports p50/p95/p99 latency and status
+counts per endpoint. The first step that misses the throughput, error or
+latency targets is reported as the saturation point.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import struct
+import subprocess
+import sys
+import time
+import zlib
+import httpx
+from auth.auth_handler import create_access_token
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MIX = "summarize=4,generate=2,ocr=1,tts=2,youtube=3"
+
+SUMMARIZER_MODELS = {"personal": "distilbart-cnn-12-6", "corporate": "bart-large-cnn"}
+GENERATE_MODELS = {"personal": "distilbart", "corporate": "bart-large"}
+
+SENTENCES = [
+    "Photosynthesis converts light energy into chemical energy stored in glucose.",
+    "The mitochondria produce most of the cell's supply of adenosine triphosphate.",
+    "Newton's second law relates the net force on a body to its acceleration.",
+    "Supply and demand together determine the market price of a good.",
+    "The French Revolution reshaped the political landscape of Europe.",
+    "Recursion solves a problem by reducing it to smaller instances of itself.",
+    "Plate tectonics explains the movement of the continents over geological time.",
+    "An enzyme lowers the activation energy of the reaction it catalyzes.",
+    "Binary search halves the remaining interval at every comparison.",
+    "Machine learning models generalize from examples rather than explicit rules."
+]
+
+TOPICS = [
+    "photosynthesis", "cell biology", "newton's laws", "supply and demand",
+    "french revolution", "recursion", "plate tectonics", "machine learning"
+]
+
+
+def tiny_png(width: int = 64, height: int = 16) -> bytes:
+    """A blank RGB PNG, built by hand so the client needs no imaging library."""
+    def chunk(tag, data):
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xffffffff)
+
+    rows = b"".join(b"\x00" + b"\xff" * width * 3 for _ in range(height))
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(rows)) + chunk(b"IEND", b"")
+
+
+class Workload:
+    """Builds requests for each endpoint from a seeded random source."""
+
+    def __init__(self, rng: random.Random, min_words: int, max_words: int):
+        self.rng = rng
+        self.min_words = min_words
+        self.max_words = max_words
+        self.image = tiny_png()
+
+    def text(self) -> str:
+        words, target = [], self.rng.randint(self.min_words, self.max_words)
+        while len(words) < target:
+            words.extend(self.rng.choice(SENTENCES).split())
+        return " ".join(words[:target]).rstrip(".") + "."
+
+    def build(self, endpoint: str, tier: str) -> dict:
+        if endpoint == "summarize":
+            return {"method": "POST", "url": "/summarizer/", "json": {
+                "text": self.text(), "compression_ratio": 0.3, "model": SUMMARIZER_MODELS[tier]
+            }}
+        if endpoint == "generate":
+            return {"method": "POST", "url": "/models/generate", "json": {
+                "prompt": self.text(), "model_id": GENERATE_MODELS[tier]
+            }}
+        if endpoint == "ocr":
+            return {"method": "POST", "url": "/OCR", "files": {"file": ("page.png", self.image, "image/png")}}
+        if endpoint == "tts":
+            return {"method": "POST", "url": "/Text-to-speech", "json": {
+                "text": " ".join(self.rng.sample(SENTENCES, 2)), "lang": "en"
+            }}
+        if endpoint == "youtube":
+            return {"method": "POST", "url": "/YtSuggestion", "json": {
+                "query": self.rng.choice(TOPICS), "max_results": 5
+            }}
+        raise ValueError(f"Unknown endpoint {endpoint!r}")
+
+
+def parse_weights(spec: str) -> dict:
+    weights = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, weight = item.partition("=")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+def mint_users(count: int, corporate_fraction: float, rng: random.Random) -> list:
+    users = []
+    for index in range(count):
+        tier = "corporate" if rng.random() < corporate_fraction else "personal"
+        token = create_access_token({"sub": f"loadtest-{index}", "subscription_tier": tier})
+        users.append({"tier": tier, "headers": {"Authorization": f"Bearer {token}"}})
+    return users
+
+
+def percentile(values, p):
+    return values[min(len(values) - 1, int(p * len(values)))] if values else 0.0
+
+
+async def send(client, endpoint, request, headers, samples):
+    start = time.perf_counter()
+    try:
+        response = await client.request(headers=headers, **request)
+        outcome = response.status_code
+    except httpx.TimeoutException:
+        outcome = "timeout"
+    except httpx.HTTPError:
+        outcome = "transport"
+    samples.append((endpoint, outcome, time.perf_counter() - start))
+
+
+async def run_step(client, rate, duration, mix, users, workload, rng, max_inflight):
+    """Offer ``rate`` requests per second for ``duration`` seconds.
+
+    Returns the samples and the time until the last response arrived.
+    """
+    samples = []
+    tasks = set()
+    endpoints, weights = list(mix), list(mix.values())
+    start = time.perf_counter()
+    deadline = start + duration
+    next_arrival = start
+    while True:
+        next_arrival += rng.expovariate(rate)
+        if next_arrival >= deadline:
+            break
+        await asyncio.sleep(max(0.0, next_arrival - time.perf_counter()))
+
+        endpoint = rng.choices(endpoints, weights)[0]
+        if len(tasks) >= max_inflight:
+            # The client's own limit: count it, rather than silently lowering the offered rate
+            samples.append((endpoint, "client_limit", 0.0))
+            continue
+        user = rng.choice(users)
+        task = asyncio.create_task(send(client, endpoint, workload.build(endpoint, user["tier"]), user["headers"], samples))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    if tasks:
+        await asyncio.wait(tasks)
+    return samples, time.perf_counter() - start
+
+
+def summarize_step(rate, duration, elapsed, samples, args) -> dict:
+    def stats(rows):
+        latencies = sorted(latency for _, outcome, latency in rows if outcome != "client_limit")
+        ok = sum(1 for _, outcome, _ in rows if isinstance(outcome, int) and outcome < 400)
+        limited = sum(1 for _, outcome, _ in rows if outcome == 429)
+        errors = len(rows) - ok - limited
+        statuses = {}
+        for _, outcome, _ in rows:
+            statuses[str(outcome)] = statuses.get(str(outcome), 0) + 1
+        return {
+            "requests": len(rows),
+            "ok": ok,
+            "rate_limited": limited,
+            "errors": errors,
+            "error_rate": errors / len(rows) if rows else 0.0,
+            "throughput": ok / elapsed,
+            "p50": percentile(latencies, 0.50),
+            "p95": percentile(latencies, 0.95),
+            "p99": percentile(latencies, 0.99),
+            "statuses": statuses
+        }
+
+    endpoints = sorted({endpoint for endpoint, _, _ in samples})
+    report = {
+        "offered_rate": rate,
+        "arrival_rate": len(samples) / duration,
+        "overall": stats(samples),
+        "endpoints": {endpoint: stats([s for s in samples if s[0] == endpoint]) for endpoint in endpoints}
+    }
+
+    overall = report["overall"]
+    # Rate-limited requests were answered promptly, so they count as served here.
+    # Compared with the arrivals actually generated, which vary around the rate
+    served = (overall["ok"] + overall["rate_limited"]) / elapsed
+    reasons = []
+    if served < args.min_throughput * report["arrival_rate"]:
+        reasons.append(f"served {served:.1f}/s of {report['arrival_rate']:.1f}/s arriving")
+    if overall["error_rate"] > args.max_error_rate:
+        reasons.append(f"error rate {overall['error_rate']:.1%}")
+    if args.slo_p99 is not None and overall["p99"] > args.slo_p99:
+        reasons.append(f"p99 {overall['p99']:.2f}s over {args.slo_p99:g}s")
+    report["saturated"] = reasons
+    return report
+
+
+def print_step(report):
+    print(f"\n=== {report['offered_rate']:g} req/s offered, {report['arrival_rate']:.1f} req/s generated ===")
+    print(f"{'endpoint':<10} {'reqs':>6} {'ok/s':>7} {'429':>5} {'errors':>7} {'p50 (s)':>8} {'p95 (s)':>8} {'p99 (s)':>8}  statuses")
+    rows = list(report["endpoints"].items()) + [("all", report["overall"])]
+    for name, s in rows:
+        statuses = " ".join(f"{k}:{v}" for k, v in sorted(s["statuses"].items()))
+        print(
+            f"{name:<10} {s['requests']:>6} {s['throughput']:>7.1f} {s['rate_limited']:>5} {s['errors']:>7} "
+            f"{s['p50']:>8.3f} {s['p95']:>8.3f} {s['p99']:>8.3f}  {statuses}"
+        )
+    if report["saturated"]:
+        print("saturated: " + "; ".join(report["saturated"]))
+
+
+def start_stub_server(args):
+    command = [
+        sys.executable, "-m", "benchmarks.stub_engines",
+        "--port", str(args.stub_port), "--latency", args.stub_latency
+    ]
+    process = subprocess.Popen(command, cwd=SERVICE_DIR)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"stub server exited with status {process.returncode}")
+        try:
+            httpx.get(f"http://127.0.0.1:{args.stub_port}/health", timeout=1)
+            return process
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("stub server did not start")
+
+
+async def run(args) -> list:
+    rng = random.Random(args.seed)
+    mix = parse_weights(args.mix)
+    users = mint_users(args.users, args.corporate_fraction, rng)
+    workload = Workload(rng, args.min_words, args.max_words)
+    limits = httpx.Limits(max_connections=args.max_inflight, max_keepalive_connections=args.max_inflight)
+    reports = []
+    async with httpx.AsyncClient(base_url=args.target, timeout=args.timeout, limits=limits) as client:
+        for rate in [float(r) for r in args.rates.split(",")]:
+            samples, elapsed = await run_step(client, rate, args.duration, mix, users, workload, rng, args.max_inflight)
+            report = summarize_step(rate, args.duration, elapsed, samples, args)
+            print_step(report)
+            reports.append(report)
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--target", default=None, help="base URL of a running server")
+    parser.add_argument("--stub", action="store_true", help="start the app with stubbed engines and target it")
+    parser.add_argument("--stub-port", type=int, default=5099)
+    parser.add_argument("--stub-latency", default="", help="engine=seconds pairs for the stubs")
+    parser.add_argument("--rates", default="5,10,20", help="comma-separated arrival rates (req/s), run in order")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds per rate")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="endpoint=weight pairs")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--corporate-fraction", type=float, default=0.2)
+    parser.add_argument("--min-words", type=int, default=80)
+    parser.add_argument("--max-words", type=int, default=600)
+    parser.add_argument("--max-inflight", type=int, default=256)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--min-throughput", type=float, default=0.9,
+                        help="saturated when less than this fraction of the offered rate is served")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--slo-p99", type=float, default=None, help="saturated when p99 latency exceeds this (s)")
+    parser.add_argument("--json", default=None, help="also write the reports to this file")
+    args = parser.parse_args()
+
+    if args.stub == bool(args.target):
+        parser.error("pass exactly one of --stub or --target")
+
+    server = None
+    if args.stub:
+        server = start_stub_server(args)
+        args.target = f"http://127.0.0.1:{args.stub_port}"
+    try:
+        reports = asyncio.run(run(args))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    saturated = next((r for r in reports if r["saturated"]), None)
+    if saturated is None:
+        print(f"\nNo saturation up to {reports[-1]['offered_rate']:g} req/s")
+    else:
+        print(f"\nSaturation at {saturated['offered_rate']:g} req/s: " + "; ".join(saturated["saturated"]))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(reports, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
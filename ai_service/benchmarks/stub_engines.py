@@ -0,0 +1,130 @@
+"""Serve the real app with every model engine replaced by a fixed-latency stub.
+
+Run from the ai_service directory:
+
+    python -m benchmarks.stub_engines --port 5099 --latency summarize=0.2,generate=0.3
+
+Routing, auth, rate limiting, the inference scheduler, caches and metrics
+are the production code; only the calls into transformers, LLM providers,
+tesseract and the TTS engines are swapped for stubs that block their thread
+for a fixed time and return deterministic output. This makes load-test
+results repeatable and lets them run on a machine without any models.
+"""
+import argparse
+import hashlib
+import time
+from types import SimpleNamespace
+
+# Seconds each stubbed engine call blocks for
+DEFAULT_LATENCY = {
+    "summarize": 0.2,
+    "generate": 0.3,
+    "ocr": 0.1,
+    "tts": 0.05
+}
+
+
+def parse_latency(spec: str) -> dict:
+    """Parse "engine=seconds,..." over the defaults."""
+    latency = dict(DEFAULT_LATENCY)
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        engine, _, seconds = item.partition("=")
+        if engine not in latency:
+            raise ValueError(f"Unknown engine {engine!r}, expected one of {', '.join(latency)}")
+        latency[engine] = float(seconds)
+    return latency
+
+
+class StubTokenizer:
+    """Whitespace tokenizer shaped like a Hugging Face tokenizer's output."""
+
+    def __call__(self, text, return_tensors=None, **kwargs):
+        ids = list(range(len(text.split())))
+        return SimpleNamespace(input_ids=[ids] if return_tensors else ids)
+
+
+class StubSummarizer:
+    """Stands in for a summarization pipeline: sleeps, then returns the leading words."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def __call__(self, text, max_length=60, **kwargs):
+        time.sleep(self.latency)
+        # Like a pipeline, a list of inputs is one batched call with one output each
+        texts = text if isinstance(text, list) else [text]
+        return [{"summary_text": " ".join(t.split()[:max(1, max_length)])} for t in texts]
+
+
+class StubModel:
+    """Stands in for a ModelFactory model."""
+
+    def __init__(self, model_id: str, config: dict, latency: float):
+        self.model_id = model_id
+        self.config = config
+        self.latency = latency
+
+    def generate(self, prompt: str, **kwargs) -> str:
+        time.sleep(self.latency)
+        return " ".join(prompt.split()[:int(len(prompt.split()) * 0.4) + 1])
+
+    def get_model_info(self) -> dict:
+        return self.config
+
+
+def install(latency: dict):
+    """Swap the engines of the already imported app for stubs."""
+    from models.model_factory import ModelConfig, ModelFactory
+    from routers import ocr, summarizer, tts, youtube
+    from tts_service import FunctionBackend
+
+    for tier, spec in summarizer.TIER_MODEL_MAP.items():
+        for path in spec["models"]:
+            summarizer.model_cache[f"{tier}_{path.split('/')[-1]}"] = {
+                "model": StubSummarizer(latency["summarize"]),
+                "tokenizer": StubTokenizer()
+            }
+
+    def get_model(model_id: str, subscription_tier: str):
+        available = ModelFactory.get_available_models(subscription_tier)
+        if not any(m["id"] == model_id for m in available):
+            raise ValueError(f"Access to model {model_id} not allowed for {subscription_tier} tier")
+        config = {**ModelConfig.CORPORATE_MODELS, **ModelConfig.PERSONAL_MODELS}[model_id]
+        return StubModel(model_id, config, latency["generate"])
+
+    ModelFactory.get_model = staticmethod(get_model)
+
+    def synthesize(text, lang):
+        time.sleep(latency["tts"])
+        # Not playable audio, just deterministic bytes of a plausible size
+        return hashlib.sha256(text.encode("utf-8")).digest() * 64
+
+    tts.tts_service.backend = FunctionBackend(synthesize, name="stub")
+
+    def run_ocr(fileobj, language="eng"):
+        time.sleep(latency["ocr"])
+        return ocr.OCRResponse(text="stub text", confidence=90.0)
+
+    ocr.run_ocr = run_ocr
+
+    # Suggestions come from the local index only, never the live API
+    youtube.YOUTUBE_API_KEY = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5099)
+    parser.add_argument("--latency", default="", help="engine=seconds pairs, e.g. summarize=0.2,tts=0.05")
+    parser.add_argument("--log-level", default="warning")
+    args = parser.parse_args()
+
+    import uvicorn
+    import main as app_module
+
+    install(parse_latency(args.latency))
+    uvicorn.run(app_module.app, host=args.host, port=args.port, log_level=args.log_level)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Sweep inference slot count against torch threads per slot.
+
+Run from the ai_service directory:
+
+    python -m benchmarks.thread_slots --model personal:distilbart-cnn-12-6 --requests 24
+    python -m benchmarks.thread_slots --grid 1x8,2x4,4x2,8x1 --pin
+
+For every model and every (slots, threads per slot) layout this submits
+``--requests`` summarizations at once through the inference placement and
+reports throughput, request latency (including the wait for a slot) and
+the time a single call takes on its slot. By default every power-of-two
+layout that fits in the available cores is tried; the best layouts for
+throughput and for p95 latency are printed per model. Use the winner for
+INFERENCE_SLOTS / INFERENCE_THREADS_PER_SLOT.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from placement import available_cores, inference_placement
+from routers.summarizer import get_model_for_tier, run_summarization
+
+SAMPLE_TEXT = (
+    "Photosynthesis converts light energy into chemical energy stored in glucose. "
+    "It takes place in the chloroplasts, where chlorophyll absorbs mostly blue and red light. "
+    "The light-dependent reactions split water, release oxygen and produce ATP and NADPH. "
+    "The Calvin cycle then uses that energy to fix carbon dioxide into three-carbon sugars. "
+    "Rates of photosynthesis depend on light intensity, carbon dioxide concentration and temperature. "
+)
+
+
+def default_grid(cores: int):
+    powers = [1 << i for i in range(cores.bit_length()) if (1 << i) <= cores]
+    return [(slots, threads) for slots in powers for threads in powers if slots * threads <= cores]
+
+
+def parse_grid(spec: str):
+    layouts = []
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        slots, _, threads = item.partition("x")
+        layouts.append((int(slots), int(threads)))
+    return layouts
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))] if values else 0.0
+
+
+async def run_batch(model, tokenizer, text, requests, model_name):
+    def call():
+        start = time.perf_counter()
+        run_summarization(model, tokenizer, text, 0.3, model_name=model_name)
+        return time.perf_counter() - start
+
+    async def timed():
+        start = time.perf_counter()
+        service = await inference_placement.run(call)
+        return time.perf_counter() - start, service
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(timed() for _ in range(requests)))
+    return time.perf_counter() - start, [r[0] for r in results], [r[1] for r in results]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", action="append", help="tier:model, may be repeated")
+    parser.add_argument("--grid", default=None, help="SLOTSxTHREADS layouts, e.g. 1x8,2x4,4x2")
+    parser.add_argument("--requests", type=int, default=16, help="concurrent requests per layout")
+    parser.add_argument("--words", type=int, default=400, help="approximate words per request")
+    parser.add_argument("--pin", action="store_true", help="pin each slot to its cores")
+    args = parser.parse_args()
+
+    models = args.model or ["personal:distilbart-cnn-12-6"]
+    cores = available_cores()
+    layouts = parse_grid(args.grid) if args.grid else default_grid(len(cores))
+    repeats = max(1, args.words // len(SAMPLE_TEXT.split()))
+    text = (SAMPLE_TEXT * repeats).strip()
+
+    for spec in models:
+        tier, _, model_name = spec.partition(":")
+        entry = get_model_for_tier(tier, model_name)
+        model, tokenizer = entry["model"], entry["tokenizer"]
+        # Warm up allocator and kernels outside the measurements
+        inference_placement.configure(cores=cores, slots=1, threads_per_slot=len(cores), pin=args.pin)
+        asyncio.run(run_batch(model, tokenizer, text, 1, model_name))
+
+        print(f"\n{model_name} on {len(cores)} cores, {args.requests} requests of ~{len(text.split())} words")
+        print(f"{'slots':>5} {'threads':>7} {'req/s':>7} {'p50 (s)':>8} {'p95 (s)':>8} {'call (s)':>9}")
+        results = []
+        for slots, threads in layouts:
+            inference_placement.configure(cores=cores, slots=slots, threads_per_slot=threads, pin=args.pin)
+            wall, latencies, service = asyncio.run(run_batch(model, tokenizer, text, args.requests, model_name))
+            row = {
+                "slots": slots,
+                "threads": threads,
+                "throughput": args.requests / wall,
+                "p50": percentile(latencies, 0.50),
+                "p95": percentile(latencies, 0.95),
+                "call": statistics.median(service)
+            }
+            results.append(row)
+            print(
+                f"{slots:>5} {threads:>7} {row['throughput']:>7.2f} {row['p50']:>8.2f} "
+                f"{row['p95']:>8.2f} {row['call']:>9.2f}"
+            )
+
+        best_throughput = max(results, key=lambda r: r["throughput"])
+        best_latency = min(results, key=lambda r: r["p95"])
+        fastest_call = min(results, key=lambda r: r["call"])
+        print(f"best throughput: {best_throughput['slots']}x{best_throughput['threads']} ({best_throughput['throughput']:.2f} req/s)")
+        print(f"best p95 latency: {best_latency['slots']}x{best_latency['threads']} ({best_latency['p95']:.2f}s)")
+        print(f"fastest single call: {fastest_call['slots']}x{fastest_call['threads']} ({fastest_call['call']:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
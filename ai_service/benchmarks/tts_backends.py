@@ -0,0 +1,60 @@
+"""Compare time-to-audio of the TTS backends.
+
+Run from the ai_service directory:
+
+    python -m benchmarks.tts_backends --lang en --repeat 3
+
+For each available backend this reports the time until the first segment's
+audio is ready (what a streaming client waits for) and the time to render
+the whole passage through the segmented pipeline. The cache is bypassed.
+"""
+import argparse
+import statistics
+import time
+from tts_service import BACKENDS, TTSService, split_sentences
+
+SAMPLE_TEXT = (
+    "Photosynthesis converts light energy into chemical energy. "
+    "It takes place in the chloroplasts of plant cells. "
+    "The light-dependent reactions produce ATP and NADPH, "
+    "which the Calvin cycle then uses to fix carbon dioxide into sugars. "
+    "Oxygen is released as a by-product of splitting water molecules."
+)
+
+def measure(backend, text, lang, repeat):
+    service = TTSService(headless=True, backend=backend)
+    first_segment = split_sentences(text)[0]
+    first, total = [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        backend.synthesize(first_segment, lang)
+        first.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for _ in service.synthesize_segments(text, lang):
+            pass
+        total.append(time.perf_counter() - start)
+    return statistics.median(first), statistics.median(total)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lang", default="en")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--text", default=SAMPLE_TEXT)
+    args = parser.parse_args()
+
+    print(f"{'backend':<10} {'first audio (s)':>16} {'full clip (s)':>14}")
+    for name, backend_class in BACKENDS.items():
+        backend = backend_class()
+        if not backend.is_available():
+            print(f"{name:<10} {'unavailable':>16}")
+            continue
+        try:
+            first, total = measure(backend, args.text, args.lang, args.repeat)
+        except Exception as e:
+            print(f"{name:<10} failed: {str(e)}")
+            continue
+        print(f"{name:<10} {first:>16.3f} {total:>14.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""Check that memory grows sub-linearly with the number of serving workers.
+
+Run from the ai_service directory (Linux only, it reads /proc):
+
+    python -m benchmarks.worker_memory --workers 1,2,4 --preload personal:distilbart-cnn-12-6
+
+For each worker count this starts ``serve.py``, waits until every worker is
+up and /health answers, then sums the memory of the supervisor and its
+workers. Summed RSS counts shared pages once per process and so always
+grows linearly; PSS splits each shared page between the processes mapping
+it and is the number that shows whether the weights are really shared.
+
+Exits non-zero if adding a worker costs more PSS than ``--max-marginal``
+times the single-worker total.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def memory_of(pid: int) -> dict:
+    """Rss, Pss and private bytes of a process from /proc/<pid>/smaps_rollup."""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1]) * 1024
+    return {
+        "rss": fields.get("Rss", 0),
+        "pss": fields.get("Pss", 0),
+        "private": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)
+    }
+
+
+def children_of(pid: int):
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # The command name may contain spaces; the ppid follows its closing paren
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == pid:
+            children.append(int(entry))
+    return children
+
+
+def wait_until_ready(process, port: int, workers: int, timeout: float):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"serve.py exited with status {process.returncode}")
+        if len(children_of(process.pid)) >= workers:
+            try:
+                urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=2).read()
+                return
+            except OSError:
+                pass
+        time.sleep(0.5)
+    raise RuntimeError(f"workers not ready after {timeout:.0f}s")
+
+
+def measure(workers: int, args) -> dict:
+    command = [
+        sys.executable, "serve.py",
+        "--host", "127.0.0.1", "--port", str(args.port),
+        "--workers", str(workers),
+        "--preload", args.preload,
+        "--share-mode", args.share_mode,
+        "--log-level", "warning"
+    ]
+    process = subprocess.Popen(command, cwd=SERVICE_DIR)
+    try:
+        wait_until_ready(process, args.port, workers, args.timeout)
+        # Let lifespan startup and first-request allocations settle
+        time.sleep(args.settle)
+        pids = [process.pid] + children_of(process.pid)
+        totals = {"rss": 0, "pss": 0, "private": 0}
+        for pid in pids:
+            for key, value in memory_of(pid).items():
+                totals[key] += value
+        return totals
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", default="1,2,4", help="comma-separated worker counts")
+    parser.add_argument("--preload", default="personal:distilbart-cnn-12-6")
+    parser.add_argument("--share-mode", choices=["shm", "cow"], default="shm")
+    parser.add_argument("--port", type=int, default=5091)
+    parser.add_argument("--timeout", type=float, default=600.0, help="seconds to wait for model loading")
+    parser.add_argument("--settle", type=float, default=2.0)
+    parser.add_argument("--max-marginal", type=float, default=0.5,
+                        help="fail if each extra worker adds more than this fraction of the 1-worker PSS")
+    args = parser.parse_args()
+
+    counts = sorted({int(n) for n in args.workers.split(",")})
+    if counts[0] != 1:
+        counts.insert(0, 1)
+
+    mib = 1024 * 1024
+    print(f"{'workers':>7} {'sum RSS (MiB)':>14} {'sum PSS (MiB)':>14} {'private (MiB)':>14} {'PSS / worker':>13}")
+    results = {}
+    for workers in counts:
+        totals = results[workers] = measure(workers, args)
+        print(
+            f"{workers:>7} {totals['rss'] / mib:>14.1f} {totals['pss'] / mib:>14.1f} "
+            f"{totals['private'] / mib:>14.1f} {totals['pss'] / workers / mib:>13.1f}"
+        )
+
+    base = results[1]["pss"]
+    failed = False
+    for workers in counts[1:]:
+        marginal = (results[workers]["pss"] - base) / (workers - 1)
+        print(f"{workers} workers: each extra worker adds {marginal / mib:.1f} MiB PSS ({marginal / base:.0%} of one worker)")
+        if marginal > args.max_marginal * base:
+            failed = True
+    if failed:
+        print(f"FAIL: extra workers cost more than {args.max_marginal:.0%} of the single-worker footprint")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Content-defined chunking of notes for incremental summarization.
+
+A note is cut into chunks at sentence boundaries chosen by the content of
+the sentences themselves: a chunk ends after a sentence whose hash hits a
+fixed pattern, once the chunk has at least ``min_words`` words, or after a
+paragraph break past that size, and always before it exceeds ``max_words``.
+Because the decision only depends on the text since the previous cut, an
+edit changes the chunk it falls in (and at most the one after, until the
+next content-defined cut) while every other chunk keeps its exact text and
+hash, so their summaries can be reused.
+"""
+import hashlib
+import os
+import re
+from typing import List
+
+SUMMARY_CHUNK_MIN_WORDS = int(os.getenv("SUMMARY_CHUNK_MIN_WORDS", 200))
+# Stays within BART's 1024-token input window with room for long words
+SUMMARY_CHUNK_MAX_WORDS = int(os.getenv("SUMMARY_CHUNK_MAX_WORDS", 600))
+# On average one sentence in this many past the minimum size ends a chunk
+SUMMARY_CHUNK_BOUNDARY_EVERY = int(os.getenv("SUMMARY_CHUNK_BOUNDARY_EVERY", 4))
+
+_PARAGRAPHS = re.compile(r"\n\s*\n")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def normalize(text: str) -> str:
+    """Collapse whitespace so reflowing a paragraph does not change its hash."""
+    return " ".join(text.split())
+
+
+def _is_boundary(sentence: str, every: int) -> bool:
+    digest = hashlib.blake2b(normalize(sentence).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % every == 0
+
+
+def content_chunks(text: str, min_words: int = SUMMARY_CHUNK_MIN_WORDS,
+                   max_words: int = SUMMARY_CHUNK_MAX_WORDS,
+                   every: int = SUMMARY_CHUNK_BOUNDARY_EVERY) -> List[str]:
+    """Split ``text`` into chunks whose boundaries are stable under local edits.
+
+    A text of at most ``max_words`` words is returned as a single chunk.
+    """
+    if len(text.split()) <= max_words:
+        return [text.strip()] if text.strip() else []
+
+    chunks, current, words = [], [], 0
+
+    def cut():
+        nonlocal current, words
+        if current:
+            chunks.append(" ".join(current))
+        current, words = [], 0
+
+    for paragraph in _PARAGRAPHS.split(text):
+        sentences = [s for s in _SENTENCE_END.split(paragraph.strip()) if s]
+        for index, sentence in enumerate(sentences):
+            length = len(sentence.split())
+            if current and words + length > max_words:
+                cut()
+            if length > max_words:
+                # A run-on "sentence" (e.g. a pasted list) is cut by size alone
+                tokens = sentence.split()
+                chunks.extend(" ".join(tokens[start:start + max_words]) for start in range(0, len(tokens), max_words))
+                continue
+            current.append(normalize(sentence))
+            words += length
+            paragraph_end = index == len(sentences) - 1
+            if words >= min_words and (paragraph_end or _is_boundary(sentence, every)):
+                cut()
+    cut()
+    return chunks
+
+
+def lead_sentences(text: str, max_words: int) -> str:
+    """Extractive fallback summary: the leading sentences of ``text``, up to ``max_words``."""
+    picked, words = [], 0
+    for sentence in _SENTENCE_END.split(normalize(text)):
+        length = len(sentence.split())
+        if picked and words + length > max_words:
+            break
+        picked.append(sentence if length <= max_words else " ".join(sentence.split()[:max_words]))
+        words += length
+    return " ".join(picked)
+
+
+def chunk_key(chunk: str, *parts) -> str:
+    """Cache key of a chunk together with whatever else its result depends on."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\0")
+    digest.update(normalize(chunk).encode("utf-8"))
+    return digest.hexdigest()
@@ -0,0 +1,144 @@
+"""Per-request deadlines and cancellation of abandoned model work.
+
+A request gets a time budget from its ``X-Request-Timeout`` header (in
+seconds, capped at REQUEST_MAX_TIMEOUT) or REQUEST_DEFAULT_TIMEOUT. The
+deadline lives in a context variable, which ``inference_placement.run``
+carries into the slot thread, so model code can check it between chunks
+and, through a stopping criterion, between generated tokens. The deadline
+is cancelled as soon as the client disconnects, so nobody keeps computing
+an answer that will never be read.
+"""
+import asyncio
+import functools
+import math
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Optional
+from fastapi import HTTPException, Request
+import metrics
+
+REQUEST_DEFAULT_TIMEOUT = float(os.getenv("REQUEST_DEFAULT_TIMEOUT", 60))
+REQUEST_MAX_TIMEOUT = float(os.getenv("REQUEST_MAX_TIMEOUT", 300))
+
+TIMEOUT_HEADER = "X-Request-Timeout"
+
+_current_deadline: ContextVar[Optional["Deadline"]] = ContextVar("deadline", default=None)
+
+
+class RequestCancelled(Exception):
+    """The work was abandoned because nobody is waiting for it any more."""
+
+
+class Deadline:
+    """A time budget that can also be cancelled outright.
+
+    ``budget`` of None never expires. ``cancelled`` may be an existing
+    event, e.g. a background job's cancellation flag. Model code sets
+    ``degraded`` when it returns less than a full answer to stay in budget.
+    """
+
+    def __init__(self, budget: Optional[float], cancelled: Optional[threading.Event] = None):
+        self.budget = budget
+        self.expires = time.monotonic() + budget if budget is not None else math.inf
+        self.cancelled = cancelled or threading.Event()
+        self.degraded = False
+
+    def remaining(self) -> float:
+        return self.expires - time.monotonic()
+
+    def expired(self) -> bool:
+        return self.cancelled.is_set() or self.remaining() <= 0
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def check(self):
+        """Raise RequestCancelled if the work has been cancelled."""
+        if self.cancelled.is_set():
+            raise RequestCancelled("Request was cancelled")
+
+
+def current() -> Optional[Deadline]:
+    return _current_deadline.get()
+
+
+@contextmanager
+def scope(deadline: Deadline):
+    """Make ``deadline`` the current one for code run inside the block."""
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+
+def request_budget(request: Request) -> float:
+    value = request.headers.get(TIMEOUT_HEADER)
+    if value is None:
+        return REQUEST_DEFAULT_TIMEOUT
+    try:
+        budget = float(value)
+    except ValueError:
+        budget = -1
+    if not 0 < budget < math.inf:
+        raise HTTPException(status_code=400, detail=f"{TIMEOUT_HEADER} must be a positive number of seconds")
+    return min(budget, REQUEST_MAX_TIMEOUT)
+
+
+@asynccontextmanager
+async def request_deadline(request: Request, endpoint: str):
+    """Run the block under the request's deadline, cancelled if the client disconnects."""
+    deadline = Deadline(request_budget(request))
+
+    async def watch():
+        # The body has been read, so the next message is the disconnect.
+        # Request.is_disconnected() only peeks, which never gets through the
+        # task groups of the "http" middlewares.
+        while True:
+            message = await request.receive()
+            if message["type"] == "http.disconnect":
+                deadline.cancel()
+                metrics.requests_cancelled.labels(endpoint).inc()
+                return
+
+    watcher = asyncio.create_task(watch())
+    try:
+        with scope(deadline):
+            yield deadline
+    finally:
+        watcher.cancel()
+
+
+@functools.lru_cache(maxsize=None)
+def _criteria_class():
+    from transformers import StoppingCriteria
+
+    class DeadlineCriteria(StoppingCriteria):
+        """Stops generation once the deadline has passed or was cancelled."""
+
+        def __init__(self, deadline: Deadline):
+            self.deadline = deadline
+
+        def __call__(self, input_ids, scores, **kwargs) -> bool:
+            if self.deadline.expired():
+                self.deadline.degraded = True
+                return True
+            return False
+
+    return DeadlineCriteria
+
+
+def generation_kwargs() -> dict:
+    """Extra ``generate()`` arguments that stop generation at the current deadline."""
+    deadline = current()
+    if deadline is None:
+        return {}
+    try:
+        from transformers import StoppingCriteriaList
+    except ImportError:
+        # Engines without transformers have no token loop to stop
+        return {}
+    return {"stopping_criteria": StoppingCriteriaList([_criteria_class()(deadline)])}
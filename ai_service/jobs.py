@@ -0,0 +1,410 @@
+"""Durable queue and in-process runner for long-running AI jobs.
+
+Jobs are rows in a SQLite database (JOBS_DB_PATH), so queued work survives
+restarts and every serving process can claim from the same queue. A worker
+claims a job by taking a lease and keeps extending it while the job runs; a
+job whose lease runs out because its worker died is handed to the next
+claimant, up to JOBS_MAX_ATTEMPTS attempts. Finished jobs keep their result
+for JOBS_RESULT_TTL seconds and are then purged.
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List, Optional
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+import deadlines
+import metrics
+
+logger = logging.getLogger(__name__)
+
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", "jobs.db")
+# Where uploaded job inputs (OCR pages) wait until their job runs
+JOBS_SPOOL_DIR = os.getenv("JOBS_SPOOL_DIR", "job_inputs")
+# Jobs run at the same time by this process; 0 makes it accept jobs only
+JOBS_CONCURRENCY = int(os.getenv("JOBS_CONCURRENCY", 2))
+JOBS_RESULT_TTL = float(os.getenv("JOBS_RESULT_TTL", 3600))
+JOBS_MAX_ATTEMPTS = int(os.getenv("JOBS_MAX_ATTEMPTS", 3))
+JOBS_LEASE_SECONDS = float(os.getenv("JOBS_LEASE_SECONDS", 60))
+JOBS_POLL_INTERVAL = float(os.getenv("JOBS_POLL_INTERVAL", 1.0))
+JOBS_PURGE_INTERVAL = 60.0
+# Leases are renewed, and cancellation noticed, at least this often
+JOBS_HEARTBEAT_INTERVAL = min(JOBS_LEASE_SECONDS / 3, 2.0)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+TERMINAL_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    tier TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_expires REAL,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    expires_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs (status, created_at);
+CREATE INDEX IF NOT EXISTS jobs_by_expiry ON jobs (expires_at);
+"""
+
+
+def _row_to_job(row) -> Dict:
+    job = dict(row)
+    job["payload"] = json.loads(job["payload"])
+    job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+    job["cancel_requested"] = bool(job["cancel_requested"])
+    return job
+
+
+class JobStore:
+    """SQLite-backed job table shared by all serving processes.
+
+    Nothing touches the database until ``open()`` (called at app startup)
+    or the first query, so importing the app creates no files.
+    """
+
+    def __init__(self, path: str = JOBS_DB_PATH, max_attempts: int = JOBS_MAX_ATTEMPTS,
+                 lease_seconds: float = JOBS_LEASE_SECONDS, result_ttl: float = JOBS_RESULT_TTL):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self.result_ttl = result_ttl
+        self.opened = False
+        self._local = threading.local()
+        self._open_lock = threading.Lock()
+
+    def open(self, path: Optional[str] = None):
+        """Create the database at ``path`` (default: the configured one) if needed."""
+        with self._open_lock:
+            if path is not None and path != self.path:
+                self.path = path
+                self._local = threading.local()
+                self.opened = False
+            if self.opened:
+                return
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = self._connect()
+            try:
+                conn.executescript(SCHEMA)
+            finally:
+                conn.close()
+            self.opened = True
+
+    def _connect(self):
+        # Autocommit; writes that read-then-update take BEGIN IMMEDIATE themselves
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _conn(self):
+        # One connection per thread, and never one inherited across a fork
+        if not self.opened:
+            self.open()
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = self._local.conn = self._connect()
+            self._local.pid = os.getpid()
+        return conn
+
+    def _transaction(self):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        return conn
+
+    def submit(self, kind: str, payload: Dict, owner: str, tier: str) -> Dict:
+        job_id = uuid.uuid4().hex
+        self._conn().execute(
+            "INSERT INTO jobs (id, kind, owner, tier, payload, status, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (job_id, kind, owner, tier, json.dumps(payload), QUEUED, time.time())
+        )
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        row = self._conn().execute(
+            "SELECT * FROM jobs WHERE id = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (job_id, time.time())
+        ).fetchone()
+        return _row_to_job(row) if row is not None else None
+
+    def claim(self, worker: str) -> Optional[Dict]:
+        """Lease the oldest runnable job to ``worker``.
+
+        Running jobs whose lease has expired belong to a crashed worker: they
+        are retried, unless they are out of attempts or were being cancelled.
+        """
+        now = time.time()
+        conn = self._transaction()
+        try:
+            conn.execute(
+                "UPDATE jobs SET status = CASE WHEN cancel_requested THEN ? ELSE ? END, "
+                "error = CASE WHEN cancel_requested THEN NULL ELSE ? END, "
+                "finished_at = ?, expires_at = ? "
+                "WHERE status = ? AND lease_expires < ? AND (cancel_requested OR attempts >= ?)",
+                (CANCELLED, FAILED, "Worker stopped responding on the final attempt",
+                 now, now + self.result_ttl, RUNNING, now, self.max_attempts)
+            )
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE status = ? OR (status = ? AND lease_expires < ?) "
+                "ORDER BY created_at LIMIT 1",
+                (QUEUED, RUNNING, now)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = ?, attempts = attempts + 1, worker = ?, lease_expires = ?, "
+                "started_at = ? WHERE id = ?",
+                (RUNNING, worker, now + self.lease_seconds, now, row["id"])
+            )
+            job = _row_to_job(conn.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone())
+            conn.execute("COMMIT")
+            return job
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def heartbeat(self, job_id: str, worker: str) -> Optional[bool]:
+        """Extend the lease; return whether cancellation was requested, or None if the lease was lost."""
+        conn = self._conn()
+        updated = conn.execute(
+            "UPDATE jobs SET lease_expires = ? WHERE id = ? AND worker = ? AND status = ?",
+            (time.time() + self.lease_seconds, job_id, worker, RUNNING)
+        ).rowcount
+        if not updated:
+            return None
+        row = conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row["cancel_requested"])
+
+    def finish(self, job_id: str, worker: str, status: str, result: Optional[Dict] = None,
+               error: Optional[str] = None) -> bool:
+        """Record the outcome of a leased job; a cancelled job drops its result."""
+        now = time.time()
+        updated = self._conn().execute(
+            "UPDATE jobs SET status = CASE WHEN cancel_requested THEN ? ELSE ? END, "
+            "result = CASE WHEN cancel_requested THEN NULL ELSE ? END, error = ?, "
+            "finished_at = ?, expires_at = ?, lease_expires = NULL "
+            "WHERE id = ? AND worker = ? AND status = ?",
+            (CANCELLED, status, json.dumps(result) if result is not None else None, error,
+             now, now + self.result_ttl, job_id, worker, RUNNING)
+        ).rowcount
+        return bool(updated)
+
+    def requeue(self, job_id: str, worker: str) -> bool:
+        """Give a leased job back to the queue without spending an attempt."""
+        updated = self._conn().execute(
+            "UPDATE jobs SET status = ?, attempts = attempts - 1, worker = NULL, lease_expires = NULL "
+            "WHERE id = ? AND worker = ? AND status = ?",
+            (QUEUED, job_id, worker, RUNNING)
+        ).rowcount
+        return bool(updated)
+
+    def cancel(self, job_id: str) -> Optional[Dict]:
+        """Cancel a queued job at once, or ask the worker running it to stop."""
+        now = time.time()
+        conn = self._transaction()
+        try:
+            conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, expires_at = ? WHERE id = ? AND status = ?",
+                (CANCELLED, now, now + self.result_ttl, job_id, QUEUED)
+            )
+            conn.execute(
+                "UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = ?",
+                (job_id, RUNNING)
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return self.get(job_id)
+
+    def purge_expired(self) -> List[Dict]:
+        """Delete jobs whose results have expired and return them."""
+        conn = self._transaction()
+        try:
+            rows = conn.execute("SELECT * FROM jobs WHERE expires_at <= ?", (time.time(),)).fetchall()
+            conn.executemany("DELETE FROM jobs WHERE id = ?", [(row["id"],) for row in rows])
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return [_row_to_job(row) for row in rows]
+
+    def queue_depths(self) -> Dict:
+        if not self.opened:
+            return {}
+        rows = self._conn().execute(
+            "SELECT kind, COUNT(*) AS queued FROM jobs WHERE status = ? GROUP BY kind", (QUEUED,)
+        ).fetchall()
+        return {(row["kind"],): row["queued"] for row in rows}
+
+
+def public_view(job: Dict) -> Dict:
+    """The parts of a job a client may see."""
+    return {
+        "job_id": job["id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "attempts": job["attempts"],
+        "cancel_requested": job["cancel_requested"],
+        "result": job["result"],
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+        "expires_at": job["expires_at"]
+    }
+
+
+def remove_inputs(job: Dict):
+    for path in job["payload"].get("input_paths", []):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class JobContext:
+    """What a handler gets: the job row plus a flag set when cancellation is requested."""
+
+    def __init__(self, job: Dict):
+        self.job = job
+        self.id = job["id"]
+        self.payload = job["payload"]
+        self.tier = job["tier"]
+        self.cancelled = threading.Event()
+
+
+class JobRunner:
+    """Claims jobs from the store and runs their handlers on the event loop.
+
+    Handlers are ``async def handler(ctx) -> dict`` and do their blocking work
+    in the threadpool. Cancellation is cooperative: a running handler sees
+    ``ctx.cancelled`` set, and whatever it returns afterwards is discarded.
+    """
+
+    def __init__(self, store: JobStore, handlers: Dict[str, Callable], concurrency: int = JOBS_CONCURRENCY):
+        self.store = store
+        self.handlers = handlers
+        self.concurrency = concurrency
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._tasks = []
+        self._wake = None
+
+    def start(self):
+        if self.concurrency <= 0 or self._tasks:
+            return
+        # A forked worker must not reuse its parent's id
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._wake = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.concurrency)]
+        self._tasks.append(asyncio.create_task(self._purge()))
+        logger.info("Started %d job worker(s) as %s", self.concurrency, self.worker_id)
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self):
+        """Wake an idle worker right away instead of at the next poll."""
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _work(self):
+        while True:
+            try:
+                job = await run_in_threadpool(self.store.claim, self.worker_id)
+            except sqlite3.Error as e:
+                logger.error(f"Claiming a job failed: {str(e)}")
+                job = None
+            if job is None:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), JOBS_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job)
+
+    async def _run(self, job: Dict):
+        ctx = JobContext(job)
+        handler = self.handlers.get(job["kind"])
+        start = time.perf_counter()
+        if handler is None:
+            status, result, error = FAILED, None, f"Unknown job kind {job['kind']}"
+        else:
+            task = asyncio.create_task(handler(ctx))
+            try:
+                while True:
+                    done, _ = await asyncio.wait({task}, timeout=min(self.store.lease_seconds / 3, JOBS_HEARTBEAT_INTERVAL))
+                    if done:
+                        break
+                    if await run_in_threadpool(self.store.heartbeat, ctx.id, self.worker_id) is not False:
+                        # Cancelled, or the lease went to another worker
+                        ctx.cancelled.set()
+            except asyncio.CancelledError:
+                # Shutting down: let another worker pick the job up
+                task.cancel()
+                await asyncio.shield(run_in_threadpool(self.store.requeue, ctx.id, self.worker_id))
+                raise
+
+            status, result, error = SUCCEEDED, None, None
+            try:
+                result = task.result()
+            except HTTPException as e:
+                if e.status_code == 503:
+                    # Inference queue full; try again later without spending an attempt
+                    await run_in_threadpool(self.store.requeue, ctx.id, self.worker_id)
+                    await asyncio.sleep(JOBS_POLL_INTERVAL)
+                    return
+                status, error = FAILED, str(e.detail)
+            except deadlines.RequestCancelled:
+                # The handler stopped because cancellation was requested or the lease was lost
+                logger.info(f"Job {ctx.id} ({job['kind']}) cancelled")
+                status = CANCELLED
+            except Exception as e:
+                logger.error(f"Job {ctx.id} ({job['kind']}) failed: {str(e)}")
+                status, error = FAILED, str(e)
+
+        finished = await run_in_threadpool(self.store.finish, ctx.id, self.worker_id, status, result, error)
+        if finished:
+            remove_inputs(job)
+        metrics.job_seconds.labels(job["kind"], status).observe(time.perf_counter() - start)
+
+    async def _purge(self):
+        while True:
+            await asyncio.sleep(JOBS_PURGE_INTERVAL)
+            try:
+                for job in await run_in_threadpool(self.store.purge_expired):
+                    remove_inputs(job)
+            except sqlite3.Error as e:
+                logger.error(f"Purging expired jobs failed: {str(e)}")
+
+
+job_store = JobStore()
+metrics.job_queue_depth.add_source(job_store.queue_depths)
@@ -1,11 +1,14 @@
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, PlainTextResponse
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from dotenv import load_dotenv
 import os
 import logging
+import time
 import traceback
+import metrics
+import profiling
 
 # Configure logging
 logging.basicConfig(
@@ -25,6 +28,11 @@ origins = [
     "http://127.0.0.1:3000"
 ]
 
+# Cut off oversized uploads while they stream in; added first so CORS headers still
+# reach a rejected browser upload
+from uploads import UploadLimitMiddleware
+app.add_middleware(UploadLimitMiddleware)
+
 # Configure CORS middleware with simplified settings
 app.add_middleware(
     CORSMiddleware,
@@ -54,6 +62,63 @@ async def log_errors(request: Request, call_next):
             content={"detail": str(e)}
         )
 
+# Record per-route latency and in-flight requests
+@app.middleware("http")
+async def record_metrics(request: Request, call_next):
+    start = time.perf_counter()
+    status_code = 500
+    metrics.http_requests_in_flight.inc()
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        metrics.http_requests_in_flight.dec()
+        # Label by route template, not raw path, to keep cardinality bounded
+        route = request.scope.get("route")
+        metrics.http_request_duration.labels(
+            request.method,
+            route.path if route is not None else "unmatched",
+            status_code
+        ).observe(time.perf_counter() - start)
+
+# Opt-in profiling of single requests (X-Profile + X-Profile-Token headers)
+@app.middleware("http")
+async def profile_requests(request: Request, call_next):
+    mode = profiling.requested_mode(request)
+    if mode is None:
+        return await call_next(request)
+    session = profiling.start_profile(mode, f"{request.method} {request.url.path}")
+    try:
+        response = await call_next(request)
+    except BaseException:
+        await profiling.finish_profile(session)
+        raise
+    response.headers["X-Profile-Id"] = session.request_id
+    # Headers go out before the body is produced: keep sampling until it is sent
+    response.body_iterator = profiling.profile_body(session, response.body_iterator)
+    return response
+
+@app.get("/profiles", include_in_schema=False)
+async def list_profiles(request: Request):
+    if not profiling.is_authorized(request):
+        raise HTTPException(status_code=403, detail="Profiling is not enabled for this client")
+    return {"profiles": profiling.list_reports()}
+
+@app.get("/profiles/{request_id}", include_in_schema=False)
+async def get_profile(request: Request, request_id: str):
+    if not profiling.is_authorized(request):
+        raise HTTPException(status_code=403, detail="Profiling is not enabled for this client")
+    report = profiling.load_report(request_id)
+    if report is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(report)
+
+# Prometheus scrape endpoint
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    return Response(metrics.generate_latest(), media_type=metrics.CONTENT_TYPE_LATEST)
+
 # Health check endpoint with CORS debugging info
 @app.get("/health")
 async def health_check(request: Request):
@@ -69,6 +134,14 @@ async def health_check(request: Request):
         "cors_debug": cors_debug
     }
 
+# Inference admission queue depth, per-tier wait times and core placement
+from scheduler import inference_scheduler
+from placement import inference_placement
+
+@app.get("/scheduler/stats")
+async def scheduler_stats():
+    return {**inference_scheduler.stats(), "placement": inference_placement.stats()}
+
 # Import and register routers
 from routers import youtube
 app.include_router(youtube.router)
@@ -77,6 +150,26 @@ app.include_router(youtube.router)
 from routers import summarizer
 app.include_router(summarizer.router)
 
+# Add the mind map router
+from routers import mindmap
+app.include_router(mindmap.router)
+
+# Add the text-to-speech router
+from routers import tts
+app.include_router(tts.router)
+
+# Add the OCR router
+from routers import ocr
+app.include_router(ocr.router)
+
+# Add the model selection router
+from routers import model_selector
+app.include_router(model_selector.router)
+
+# Add the background job router
+from routers import jobs
+app.include_router(jobs.router)
+
 # Log startup configuration
 @app.on_event("startup")
 async def startup_event():
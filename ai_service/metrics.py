@@ -0,0 +1,436 @@
+"""Minimal in-process metrics with Prometheus text exposition.
+
+Metrics are plain Python objects updated in place under a per-metric lock,
+so recording a sample costs a dictionary lookup and an addition. Values that
+already live elsewhere (cache statistics, queue depths, process memory) are
+read through callbacks only when /metrics is scraped.
+
+Under ``serve.py`` every forked worker has its own registry. With a
+multiprocess directory configured, each worker writes a snapshot of its
+samples there every METRICS_FLUSH_INTERVAL seconds (and when it is
+scraped), and /metrics on any worker merges all snapshots: counters and
+histograms are summed across workers, including ones that have exited,
+while gauges are reported per live worker with a ``worker`` label. What
+the supervisor counted before forking (model loads during preload) is in
+its own snapshot and counted once.
+"""
+import bisect
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# Where forked workers share their samples; set by serve.py unless given
+METRICS_MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR")
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", 5.0))
+
+_registry = []
+_registry_lock = threading.Lock()
+_multiproc_dir = METRICS_MULTIPROC_DIR
+# The flush thread and a scrape both write this process's snapshot
+_snapshot_lock = threading.Lock()
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ""
+    escaped = ",".join(
+        '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for k, v in pairs
+    )
+    return "{" + escaped + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    def labels(self, *values, **kwargs):
+        """Return the child for a label combination, creating it on first use."""
+        if kwargs:
+            values = tuple(kwargs[name] for name in self.labelnames)
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _default(self):
+        return self.labels() if not self.labelnames else None
+
+    def samples(self):
+        """``(sample name, [(label, value), ...], value)`` for every sample."""
+        samples = []
+        for key, child in list(self._children.items()):
+            samples.extend(self._child_samples(key, child))
+        return samples
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for name, pairs, value in self.samples():
+            lines.append(f"{name}{_format_labels(pairs)} {_format_value(value)}")
+        return lines
+
+
+class _Value:
+    __slots__ = ("value", "lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1.0):
+        with self.lock:
+            self.value += amount
+
+    def dec(self, amount=1.0):
+        with self.lock:
+            self.value -= amount
+
+    def set(self, value):
+        self.value = float(value)
+
+    def reset(self):
+        self.value = 0.0
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount=1.0):
+        self._default().inc(amount)
+
+    def _child_samples(self, key, child):
+        return [(self.name, list(zip(self.labelnames, key)), child.value)]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value):
+        self._default().set(value)
+
+    def dec(self, amount=1.0):
+        self._default().dec(amount)
+
+    @contextmanager
+    def track_inprogress(self, *values):
+        child = self.labels(*values)
+        child.inc()
+        try:
+            yield
+        finally:
+            child.dec()
+
+
+class _HistogramValue:
+    __slots__ = ("upper_bounds", "counts", "sum", "lock")
+
+    def __init__(self, upper_bounds):
+        self.upper_bounds = upper_bounds
+        self.counts = [0] * (len(upper_bounds) + 1)
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.upper_bounds, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def reset(self):
+        with self.lock:
+            self.counts = [0] * len(self.counts)
+            self.sum = 0.0
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+    def _child_samples(self, key, child):
+        samples = []
+        cumulative = 0
+        counts = list(child.counts)
+        pairs = list(zip(self.labelnames, key))
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            samples.append((f"{self.name}_bucket", pairs + [("le", _format_value(bound))], cumulative))
+        samples.append((f"{self.name}_sum", pairs, child.sum))
+        samples.append((f"{self.name}_count", pairs, cumulative))
+        return samples
+
+
+class CallbackMetric(_Metric):
+    """A metric whose samples are produced by callbacks at scrape time.
+
+    Each source returns ``{label values tuple: value}``.
+    """
+
+    def __init__(self, name, documentation, labelnames=(), kind="gauge"):
+        self.kind = kind
+        self._sources = []
+        super().__init__(name, documentation, labelnames)
+
+    def add_source(self, source):
+        self._sources.append(source)
+
+    def samples(self):
+        samples = []
+        for source in self._sources:
+            try:
+                values = source()
+            except Exception:
+                continue
+            for key, value in values.items():
+                samples.append((self.name, list(zip(self.labelnames, key)), float(value)))
+        return samples
+
+
+def _registered():
+    with _registry_lock:
+        return list(_registry)
+
+
+def generate_latest() -> str:
+    """Render every registered metric in the Prometheus text format."""
+    if _multiproc_dir:
+        return _render_merged(_read_snapshots())
+    lines = []
+    for metric in _registered():
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def enable_multiprocess(directory: str) -> None:
+    """Share samples through ``directory``; call before forking the workers."""
+    global _multiproc_dir
+    os.makedirs(directory, exist_ok=True)
+    _multiproc_dir = directory
+
+
+def _cumulative(metric) -> bool:
+    return isinstance(metric, (Counter, Histogram)) and not isinstance(metric, Gauge)
+
+
+def write_snapshot(cumulative_only: bool = False) -> None:
+    """Write this process's samples to the multiprocess directory.
+
+    The supervisor writes only its counters and histograms (model loads
+    during preload) before forking; the workers start those from zero.
+    """
+    if not _multiproc_dir:
+        return
+    with _snapshot_lock:
+        _write_snapshot(cumulative_only)
+
+
+def _write_snapshot(cumulative_only):
+    snapshot = {
+        "pid": os.getpid(),
+        "metrics": [
+            {"name": m.name, "kind": m.kind, "documentation": m.documentation, "samples": m.samples()}
+            for m in _registered()
+            if _cumulative(m) or not cumulative_only
+        ]
+    }
+    path = os.path.join(_multiproc_dir, f"{os.getpid()}.json")
+    with open(path + ".tmp", "w") as f:
+        json.dump(snapshot, f)
+    os.replace(path + ".tmp", path)
+
+
+def init_worker(interval: float = METRICS_FLUSH_INTERVAL) -> None:
+    """Start a forked worker's counts from zero and write snapshots in the background."""
+    if not _multiproc_dir:
+        return
+    # What the parent counted before the fork is in its own snapshot
+    for metric in _registered():
+        if _cumulative(metric):
+            for child in list(metric._children.values()):
+                child.reset()
+
+    def flush():
+        while True:
+            try:
+                write_snapshot()
+            except OSError:
+                pass
+            time.sleep(interval)
+
+    threading.Thread(target=flush, name="metrics-flush", daemon=True).start()
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _read_snapshots():
+    write_snapshot()
+    snapshots = []
+    for path in sorted(glob.glob(os.path.join(_multiproc_dir, "*.json"))):
+        try:
+            with open(path) as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return snapshots
+
+
+def _render_merged(snapshots) -> str:
+    """Sum counters and histograms over all workers; label gauges of live ones by worker."""
+    headers, merged = {}, {}
+    for snapshot in snapshots:
+        pid = snapshot["pid"]
+        alive = _alive(pid)
+        for metric in snapshot["metrics"]:
+            headers.setdefault(metric["name"], metric)
+            samples = merged.setdefault(metric["name"], {})
+            for name, pairs, value in metric["samples"]:
+                if metric["kind"] == "gauge":
+                    if not alive:
+                        continue
+                    pairs = pairs + [["worker", str(pid)]]
+                key = (name, tuple(tuple(pair) for pair in pairs))
+                samples[key] = samples.get(key, 0) + value
+    lines = []
+    for name, metric in headers.items():
+        lines.append(f"# HELP {name} {metric['documentation']}")
+        lines.append(f"# TYPE {name} {metric['kind']}")
+        for (sample, pairs), value in merged[name].items():
+            lines.append(f"{sample}{_format_labels(list(pairs))} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
+# HTTP
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ["method", "route", "status"]
+)
+http_requests_in_flight = Gauge("http_requests_in_flight", "HTTP requests currently being served")
+
+# Models
+model_load_seconds = Histogram(
+    "model_load_seconds", "Time to load a model into memory", ["model"],
+    buckets=(0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+)
+model_memory_bytes = Gauge("model_resident_memory_bytes", "Parameter memory held by a loaded model", ["model"])
+model_inference_seconds = Histogram("model_inference_seconds", "Model inference time per request", ["model"])
+model_tokens_per_second = Histogram(
+    "model_tokens_per_second", "Generated tokens per second of inference", ["model"],
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+)
+model_generated_tokens = Counter("model_generated_tokens_total", "Tokens generated by a model", ["model"])
+summary_chunks = Histogram(
+    "summary_chunks", "Number of chunks a summarization request was split into", ["model"],
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128)
+)
+summary_batch_size = Histogram(
+    "summary_batch_size", "Chunks per batched summarization call", ["model"],
+    buckets=(1, 2, 4, 8, 16, 32, 64)
+)
+
+# Deadlines
+requests_cancelled = Counter(
+    "requests_cancelled_total", "Requests whose model work was abandoned after the client disconnected", ["endpoint"]
+)
+deadline_degraded = Counter(
+    "deadline_degraded_total", "Responses cut short or made extractive to meet their deadline", ["model"]
+)
+
+# Inference admission
+inference_queue_wait = Histogram("inference_queue_wait_seconds", "Time spent waiting for an inference slot", ["tier"])
+inference_queue_depth = CallbackMetric("inference_queue_depth", "Requests waiting for an inference slot", ["tier"])
+
+# Jobs
+ocr_job_seconds = Histogram("ocr_job_seconds", "OCR processing time per image")
+tts_job_seconds = Histogram("tts_job_seconds", "Text-to-speech synthesis time per request", ["mode"])
+
+# Background jobs
+jobs_submitted = Counter("jobs_submitted_total", "Jobs accepted by the job API", ["kind"])
+job_seconds = Histogram(
+    "job_seconds", "Time from claiming a background job to its outcome", ["kind", "status"],
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+)
+job_queue_depth = CallbackMetric("job_queue_depth", "Background jobs waiting to be claimed", ["kind"])
+
+# Caches, fed by the modules owning them
+cache_hits = CallbackMetric("cache_hits_total", "Cache hits", ["cache"], kind="counter")
+cache_misses = CallbackMetric("cache_misses_total", "Cache misses", ["cache"], kind="counter")
+cache_entries = CallbackMetric("cache_entries", "Entries currently cached", ["cache"])
+
+
+def register_cache(name, stats):
+    """Expose a cache whose ``stats()`` returns hits, misses and entries."""
+    cache_hits.add_source(lambda: {(name,): stats()["hits"]})
+    cache_misses.add_source(lambda: {(name,): stats()["misses"]})
+    cache_entries.add_source(lambda: {(name,): stats()["entries"]})
+
+
+def _process_rss():
+    try:
+        with open("/proc/self/statm") as f:
+            return {(): int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")}
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return {}
+    # ru_maxrss is the peak, in kilobytes on Linux
+    return {(): resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024}
+
+
+process_rss = CallbackMetric("process_resident_memory_bytes", "Resident memory of this worker")
+process_rss.add_source(_process_rss)
@@ -0,0 +1,258 @@
+"""Local store of model checkpoints converted for fast, offline cold loads.
+
+Run from the ai_service directory:
+
+    python model_store.py fetch --dtype bfloat16
+    python model_store.py fetch --model sshleifer/distilbart-cnn-12-6 --dtype float32
+    python model_store.py list
+    python model_store.py bench --compare-hub
+
+``fetch`` downloads each configured checkpoint (or the ones given with
+``--model``), casts it to the target dtype and saves it with its tokenizer
+as safetensors shards under MODEL_STORE_DIR. Loaders resolve a checkpoint
+through ``load_options``: a stored one is loaded from local files only,
+in its stored dtype and with ``low_cpu_mem_usage``, so the safetensors
+shards are memory-mapped and assigned to the model without a full fp32
+copy on the heap; anything not in the store still comes from the hub.
+
+``bench`` loads every stored model in a fresh interpreter and reports the
+cold-load time and peak RSS, optionally next to a load from the hub cache.
+"""
+import argparse
+import json
+import logging
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MODEL_STORE_DIR = os.getenv("MODEL_STORE_DIR", "model_store")
+# dtype checkpoints are converted to unless --dtype says otherwise
+MODEL_STORE_DTYPE = os.getenv("MODEL_STORE_DTYPE", "float32")
+MODEL_STORE_SHARD_SIZE = os.getenv("MODEL_STORE_SHARD_SIZE", "2GB")
+
+MANIFEST = "store.json"
+DTYPES = ("float32", "bfloat16", "float16")
+
+
+def entry_dir(model_path: str, root: str = None) -> str:
+    return os.path.join(root or MODEL_STORE_DIR, model_path.replace("/", "--"))
+
+
+def _read_manifest(directory: str) -> Optional[Dict]:
+    try:
+        with open(os.path.join(directory, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def manifest(model_path: str, root: str = None) -> Optional[Dict]:
+    """The store entry for ``model_path``, or None if it has not been fetched."""
+    entry = _read_manifest(entry_dir(model_path, root))
+    # "a/b--c" and "a--b/c" share a directory name; the manifest says which one it holds
+    if entry is None or entry.get("source") != model_path:
+        return None
+    return entry
+
+
+def stored_models(root: str = None) -> List[str]:
+    """Checkpoints with a complete entry in the store."""
+    root = root or MODEL_STORE_DIR
+    try:
+        names = sorted(os.listdir(root))
+    except OSError:
+        return []
+    # Directory names cannot be decoded back: a repo id may itself contain "--"
+    entries = (_read_manifest(os.path.join(root, name)) for name in names if not name.endswith(".partial"))
+    return [entry["source"] for entry in entries if entry is not None and "source" in entry]
+
+
+def load_options(model_path: str) -> Tuple[str, Dict]:
+    """Where to load ``model_path`` from and the ``from_pretrained`` arguments for it."""
+    if manifest(model_path) is None:
+        return model_path, {}
+    return entry_dir(model_path), {
+        # The stored config records the converted dtype, so nothing is cast on load
+        "torch_dtype": "auto",
+        "low_cpu_mem_usage": True,
+        "local_files_only": True
+    }
+
+
+def configured_models() -> List[str]:
+    """Every Hugging Face checkpoint the service can be asked to load."""
+    from models.model_factory import ModelConfig
+    from routers.summarizer import TIER_MODEL_MAP
+
+    paths = {path for spec in TIER_MODEL_MAP.values() for path in spec["models"]}
+    for models in (ModelConfig.CORPORATE_MODELS, ModelConfig.PERSONAL_MODELS):
+        paths.update(config["model_path"] for config in models.values() if "model_path" in config)
+    return sorted(paths)
+
+
+def model_class(config):
+    import transformers
+
+    name = "AutoModelForSeq2SeqLM" if config.is_encoder_decoder else "AutoModelForCausalLM"
+    return getattr(transformers, name)
+
+
+def fetch(model_path: str, dtype: str, root: str = None, force: bool = False) -> Dict:
+    """Download ``model_path``, convert it to ``dtype`` and save it in the store."""
+    existing = manifest(model_path, root)
+    if existing is not None and existing["dtype"] == dtype and not force:
+        logger.info("%s is already stored as %s", model_path, dtype)
+        return existing
+
+    import torch
+    from transformers import AutoConfig, AutoTokenizer
+
+    start = time.perf_counter()
+    config = AutoConfig.from_pretrained(model_path)
+    cls = model_class(config)
+    model = cls.from_pretrained(model_path, torch_dtype=getattr(torch, dtype), low_cpu_mem_usage=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_path)
+
+    target = entry_dir(model_path, root)
+    staging = target + ".partial"
+    shutil.rmtree(staging, ignore_errors=True)
+    model.save_pretrained(staging, safe_serialization=True, max_shard_size=MODEL_STORE_SHARD_SIZE)
+    tokenizer.save_pretrained(staging)
+    files = sorted(name for name in os.listdir(staging) if name.endswith(".safetensors"))
+    entry = {
+        "source": model_path,
+        "dtype": dtype,
+        "class": cls.__name__,
+        "files": files,
+        "bytes": sum(os.path.getsize(os.path.join(staging, name)) for name in files),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    }
+    with open(os.path.join(staging, MANIFEST), "w") as f:
+        json.dump(entry, f, indent=2)
+
+    # Swap the finished entry in, so loaders never see a half-written one
+    shutil.rmtree(target, ignore_errors=True)
+    os.replace(staging, target)
+    logger.info("Stored %s as %s (%.1f GB) in %.0fs", model_path, dtype, entry["bytes"] / 1e9, time.perf_counter() - start)
+    return entry
+
+
+def _rss() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def load_once(model_path: str, source: str) -> Dict:
+    """Load ``model_path`` the way the service does and measure it (run in a fresh process)."""
+    from transformers import AutoConfig, AutoTokenizer
+
+    if source == "store":
+        location, kwargs = load_options(model_path)
+        if not kwargs:
+            raise SystemExit(f"{model_path} is not in the store")
+    else:
+        location, kwargs = model_path, {}
+    # Count the framework imports as baseline, not as load cost
+    baseline = _rss()
+    start = time.perf_counter()
+    config = AutoConfig.from_pretrained(location, local_files_only=source == "store")
+    model = model_class(config).from_pretrained(location, **kwargs)
+    AutoTokenizer.from_pretrained(location)
+    seconds = time.perf_counter() - start
+    # ru_maxrss is in kilobytes on Linux
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return {
+        "model": model_path,
+        "source": source,
+        "dtype": str(next(model.parameters()).dtype).replace("torch.", ""),
+        "seconds": round(seconds, 2),
+        "peak_rss_bytes": peak,
+        "load_peak_bytes": peak - baseline,
+        "rss_after_bytes": _rss()
+    }
+
+
+def bench(model_path: str, source: str) -> Dict:
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "load-once", model_path, "--source", source],
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        return {"model": model_path, "source": source, "error": result.stderr.strip().splitlines()[-1:]}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--root", default=MODEL_STORE_DIR, help="store directory")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    fetch_parser = commands.add_parser("fetch", help="download and convert checkpoints into the store")
+    fetch_parser.add_argument("--model", action="append", help="checkpoint path, may be repeated (default: all configured)")
+    fetch_parser.add_argument("--dtype", choices=DTYPES, default=MODEL_STORE_DTYPE)
+    fetch_parser.add_argument("--force", action="store_true", help="convert again even if already stored")
+
+    commands.add_parser("list", help="show stored checkpoints")
+
+    bench_parser = commands.add_parser("bench", help="report cold-load time and peak RSS per stored model")
+    bench_parser.add_argument("--model", action="append", help="checkpoint path, may be repeated (default: all stored)")
+    bench_parser.add_argument("--compare-hub", action="store_true", help="also load each model from the hub cache")
+    bench_parser.add_argument("--json", action="store_true", help="print results as JSON")
+
+    once_parser = commands.add_parser("load-once")
+    once_parser.add_argument("model")
+    once_parser.add_argument("--source", choices=["store", "hub"], default="store")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    # The load-once subprocesses read the store location from the environment
+    os.environ["MODEL_STORE_DIR"] = args.root
+
+    if args.command == "fetch":
+        failed = 0
+        for model_path in args.model or configured_models():
+            try:
+                fetch(model_path, args.dtype, root=args.root, force=args.force)
+            except Exception as e:
+                logger.error(f"Fetching {model_path} failed: {str(e)}")
+                failed += 1
+        sys.exit(1 if failed else 0)
+
+    if args.command == "load-once":
+        print(json.dumps(load_once(args.model, args.source)))
+        return
+
+    stored = stored_models(args.root)
+    if args.command == "list":
+        for model_path in stored:
+            entry = manifest(model_path, args.root)
+            print(f"{model_path:45} {entry['dtype']:9} {entry['bytes'] / 1e9:7.2f} GB  {len(entry['files'])} file(s)  {entry['created']}")
+        return
+
+    results = []
+    for model_path in args.model or stored:
+        for source in (["store", "hub"] if args.compare_hub else ["store"]):
+            results.append(bench(model_path, source))
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'model':45} {'source':6} {'dtype':9} {'load (s)':>9} {'peak RSS':>10} {'load peak':>10}")
+    for row in results:
+        if "error" in row:
+            print(f"{row['model']:45} {row['source']:6} failed: {' '.join(row['error'])}")
+            continue
+        print(
+            f"{row['model']:45} {row['source']:6} {row['dtype']:9} {row['seconds']:>9.2f} "
+            f"{row['peak_rss_bytes'] / 2**20:>8.0f}MB {row['load_peak_bytes'] / 2**20:>8.0f}MB"
+        )
+    sys.exit(1 if any("error" in row for row in results) else 0)
+
+
+if __name__ == "__main__":
+    main()
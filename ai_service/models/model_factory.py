@@ -1,12 +1,12 @@
 from abc import ABC, abstractmethod
 from typing import Dict, List
-from transformers import pipeline, AutoTokenizer, AutoModelForCausalLM
-import torch
-from langchain.chat_models import ChatOpenAI, ChatAnthropic
-from langchain.schema import HumanMessage, SystemMessage
 import os
+import threading
 from enum import Enum
 from pydantic import BaseModel
+import deadlines
+import model_store
+import profiling
 
 class ModelTier(str, Enum):
     PERSONAL = "personal"
@@ -78,6 +78,7 @@ class ModelConfig:
             "description": "Balanced performance model",
             "max_tokens": 1024,
             "cost_per_1k": 0.001,
+            "model_path": "facebook/bart-base",
             "provider": "huggingface"
         },
         "sumy": {
@@ -104,10 +105,18 @@ class BaseModel(ABC):
     def get_model_info(self) -> Dict:
         pass
 
+    def load(self) -> None:
+        """Load local weights now rather than on the first generate()."""
+
+    def module(self):
+        """The torch module holding the local weights, or None if there are none (yet)."""
+        return None
+
 class GPT4Model(BaseModel):
     def __init__(self):
         self.model_name = "gpt-4"
         self.config = ModelConfig.CORPORATE_MODELS[self.model_name]
+        from langchain.chat_models import ChatOpenAI
         self.model = ChatOpenAI(
             model_name="gpt-4",
             temperature=0.7,
@@ -116,6 +125,7 @@ class GPT4Model(BaseModel):
         )
 
     def generate(self, prompt: str, **kwargs) -> str:
+        from langchain.schema import HumanMessage, SystemMessage
         messages = [
             SystemMessage(content="You are a helpful AI assistant."),
             HumanMessage(content=prompt)
@@ -130,6 +140,7 @@ class ClaudeModel(BaseModel):
     def __init__(self):
         self.model_name = "claude-3"
         self.config = ModelConfig.CORPORATE_MODELS[self.model_name]
+        from langchain.chat_models import ChatAnthropic
         self.model = ChatAnthropic(
             model="claude-3-opus-20240229",
             temperature=0.7,
@@ -138,6 +149,7 @@ class ClaudeModel(BaseModel):
         )
 
     def generate(self, prompt: str, **kwargs) -> str:
+        from langchain.schema import HumanMessage, SystemMessage
         messages = [
             SystemMessage(content="You are a helpful AI assistant."),
             HumanMessage(content=prompt)
@@ -154,14 +166,32 @@ class LlamaModel(BaseModel):
         self.config = config
         self.model = None
         self.tokenizer = None
+        self._load_lock = threading.Lock()
+
+    def load(self) -> None:
+        with self._load_lock:
+            if self.model is None:
+                from transformers import AutoTokenizer, AutoModelForCausalLM
+                location, load_kwargs = model_store.load_options(self.config["model_path"])
+                self.tokenizer = AutoTokenizer.from_pretrained(location)
+                self.model = AutoModelForCausalLM.from_pretrained(location, **load_kwargs)
+
+    def module(self):
+        return self.model
 
     def generate(self, prompt: str, **kwargs) -> str:
         if not self.model:
-            self.model = AutoModelForCausalLM.from_pretrained(self.config["model_path"])
-            self.tokenizer = AutoTokenizer.from_pretrained(self.config["model_path"])
+            self.load()
         
         inputs = self.tokenizer(prompt, return_tensors="pt", truncation=True, max_length=self.config["max_tokens"])
-        outputs = self.model.generate(**inputs, max_new_tokens=int(len(prompt.split()) * 0.4), **kwargs)
+        # The API's max_tokens caps the generated tokens; generate() does not know the name
+        max_new_tokens = int(len(prompt.split()) * 0.4)
+        if "max_tokens" in kwargs:
+            max_new_tokens = min(max_new_tokens, kwargs.pop("max_tokens"))
+        with profiling.torch_profile(f"generate {self.model_id}"):
+            # Stops between tokens once the request's deadline passes or it is cancelled
+            generate_kwargs = {**deadlines.generation_kwargs(), **kwargs}
+            outputs = self.model.generate(**inputs, max_new_tokens=max_new_tokens, **generate_kwargs)
         return self.tokenizer.decode(outputs[0], skip_special_tokens=True)
 
     def get_model_info(self) -> Dict:
@@ -173,16 +203,31 @@ class BartModel(BaseModel):
         self.config = config
         self.model = None
         self.tokenizer = None
+        self._load_lock = threading.Lock()
+
+    def load(self) -> None:
+        with self._load_lock:
+            if self.model is None:
+                from transformers import pipeline, AutoTokenizer, AutoModelForSeq2SeqLM
+                location, load_kwargs = model_store.load_options(self.config["model_path"])
+                self.model = pipeline(
+                    "summarization",
+                    model=AutoModelForSeq2SeqLM.from_pretrained(location, **load_kwargs),
+                    tokenizer=AutoTokenizer.from_pretrained(location),
+                    device="cpu"
+                )
+
+    def module(self):
+        return self.model.model if self.model is not None else None
 
     def generate(self, prompt: str, **kwargs) -> str:
         if not self.model:
-            self.model = pipeline(
-                "summarization",
-                model=self.config["model_path"],
-                device="cpu"
-            )
+            self.load()
         
-        return self.model(prompt, max_length=self.config["max_tokens"], **kwargs)[0]["summary_text"]
+        # The API's max_tokens caps the summary length; the pipeline does not know the name
+        max_length = min(kwargs.pop("max_tokens", self.config["max_tokens"]), self.config["max_tokens"])
+        generate_kwargs = {**deadlines.generation_kwargs(), **kwargs}
+        return self.model(prompt, max_length=max_length, **generate_kwargs)[0]["summary_text"]
 
     def get_model_info(self) -> Dict:
         return self.config
@@ -195,10 +240,11 @@ class SumyModel(BaseModel):
         from sumy.nlp.tokenizers import Tokenizer
         from sumy.summarizers.lsa import LsaSummarizer
         self.parser_class = PlaintextParser
+        self.tokenizer_class = Tokenizer
         self.summarizer = LsaSummarizer()
 
     def generate(self, prompt: str, **kwargs) -> str:
-        parser = self.parser_class.from_string(prompt, Tokenizer("english"))
+        parser = self.parser_class.from_string(prompt, self.tokenizer_class("english"))
         summary_sentences = self.summarizer(parser.document, sentences_count=int(len(prompt.split()) * 0.3))
         return " ".join([str(sentence) for sentence in summary_sentences])
 
@@ -206,6 +252,11 @@ class SumyModel(BaseModel):
         return self.config
 
 class ModelFactory:
+    # One instance per model, so its weights are loaded once per process
+    # (or once in the parent before forking workers) and not per request
+    _instances: Dict[str, BaseModel] = {}
+    _instances_lock = threading.Lock()
+
     @staticmethod
     def get_available_models(subscription_tier: str) -> List[Dict]:
         """Get list of available models based on user's subscription tier."""
@@ -216,13 +267,13 @@ class ModelFactory:
 
         return [
             {
-                "id": config["id"],
+                "id": model_id,
                 "name": config["name"],
                 "description": config["description"],
                 "max_tokens": config["max_tokens"],
                 "provider": config["provider"]
             }
-            for config in models_config.values()
+            for model_id, config in models_config.items()
         ]
 
     @staticmethod
@@ -242,16 +293,41 @@ class ModelFactory:
         if not model_config:
             raise ValueError(f"Model {model_id} not found")
 
-        # Initialize and return the appropriate model
+        with ModelFactory._instances_lock:
+            model = ModelFactory._instances.get(model_id)
+            if model is None:
+                model = ModelFactory._instances[model_id] = ModelFactory._create(model_id, model_config)
+        return model
+
+    @staticmethod
+    def _create(model_id: str, model_config: Dict) -> BaseModel:
+        """Initialize the appropriate model; weights are loaded on first use."""
         if model_id == "sumy":
-            return SumyModel()
-        elif model_id in ["distilbart", "bart"]:
-            return TransformersModel(model_config["model_path"])
-        elif model_id in ["llama", "gpt-neox", "tiny-llama"]:
-            return LargeLanguageModel(model_id, model_config)
+            return SumyModel(model_id, model_config)
+        elif model_id == "gpt-4":
+            return GPT4Model()
+        elif model_id == "claude-3":
+            return ClaudeModel()
+        elif model_id in ["distilbart", "bart-base", "bart-large"]:
+            return BartModel(model_id, model_config)
+        elif model_id in ["llama-3", "gpt-neox", "tiny-llama"]:
+            return LlamaModel(model_id, model_config)
         else:
             raise ValueError(f"Unknown model type: {model_id}")
 
+    @staticmethod
+    def preload(specs) -> None:
+        """Load the weights of ``(tier, model_id)`` pairs ahead of serving."""
+        for tier, model_id in specs:
+            ModelFactory.get_model(model_id, tier).load()
+
+    @staticmethod
+    def loaded_modules() -> List:
+        """Torch modules of every model instance whose weights are loaded."""
+        with ModelFactory._instances_lock:
+            models = list(ModelFactory._instances.values())
+        return [module for module in (model.module() for model in models) if module is not None]
+
 # Base class for all models
 class BaseModel:
     def generate(self, text: str, **kwargs) -> str:
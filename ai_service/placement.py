@@ -0,0 +1,201 @@
+"""Placement of CPU inference onto fixed partitions of the machine's cores.
+
+The cores are split into slots of INFERENCE_THREADS_PER_SLOT cores each.
+Every slot is one long-lived thread that sets torch's intra-op thread count
+to its share (and, with INFERENCE_PIN_CPUS, pins itself to its cores), so
+concurrent model calls each get their own cores instead of every call
+spawning a full-machine thread pool and all of them contending. Model calls
+are run with ``await inference_placement.run(func, *args)``, which waits
+for a free slot. A slot is only freed once its call returns: a caller that
+stops waiting (e.g. on a client disconnect) cannot make room for another
+call on cores that are still busy.
+"""
+import asyncio
+import contextvars
+import functools
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def available_cores() -> List[int]:
+    """Cores this process may run on."""
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        return list(range(os.cpu_count() or 1))
+
+
+def _env_int(name: str) -> Optional[int]:
+    value = os.getenv(name)
+    return int(value) if value else None
+
+
+INFERENCE_SLOTS = _env_int("INFERENCE_SLOTS")
+INFERENCE_THREADS_PER_SLOT = _env_int("INFERENCE_THREADS_PER_SLOT")
+INFERENCE_PIN_CPUS = os.getenv("INFERENCE_PIN_CPUS", "false").lower() in ("1", "true", "yes")
+# Threads per slot when neither setting is given
+DEFAULT_THREADS_PER_SLOT = 4
+
+# Calls started by ``run`` inside a ``tracking_calls`` block
+_running_calls: ContextVar[Optional[list]] = ContextVar("running_calls", default=None)
+
+
+@contextmanager
+def tracking_calls():
+    """Collect the futures of the slot calls started inside the block."""
+    calls = []
+    token = _running_calls.set(calls)
+    try:
+        yield calls
+    finally:
+        _running_calls.reset(token)
+
+
+class Slot:
+    def __init__(self, index: int, cores: List[int], threads: int, pin: bool):
+        self.index = index
+        self.cores = cores
+        self.threads = threads
+        self.pin = pin
+        self.calls = 0
+        self.busy_seconds = 0.0
+        self.executor = ThreadPoolExecutor(
+            max_workers=1,
+            thread_name_prefix=f"inference-slot-{index}",
+            initializer=self._setup_thread
+        )
+
+    def _setup_thread(self):
+        if self.pin and hasattr(os, "sched_setaffinity"):
+            # Applies to this thread only; torch's OpenMP workers inherit it
+            os.sched_setaffinity(0, self.cores)
+        try:
+            import torch
+        except ImportError:
+            return
+        # OpenMP keeps the team size per calling thread, so each slot thread
+        # gets its own pool of this many threads
+        torch.set_num_threads(self.threads)
+
+    def _call(self, func, args, kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.calls += 1
+            self.busy_seconds += time.perf_counter() - start
+
+
+class InferencePlacement:
+    def __init__(self, cores: Optional[List[int]] = None, slots: Optional[int] = INFERENCE_SLOTS,
+                 threads_per_slot: Optional[int] = INFERENCE_THREADS_PER_SLOT, pin: bool = INFERENCE_PIN_CPUS):
+        self.slots = []
+        self.pin = pin
+        self._free = None
+        self._free_loop = None
+        self.configure(cores, slots, threads_per_slot, pin)
+
+    def configure(self, cores: Optional[List[int]] = None, slots: Optional[int] = None,
+                  threads_per_slot: Optional[int] = None, pin: Optional[bool] = None):
+        """(Re)partition ``cores`` into slots; must not be called while calls are running.
+
+        With only one of ``slots`` and ``threads_per_slot`` given the other
+        is derived from the core count; slots beyond the cores available
+        share cores round-robin.
+        """
+        cores = list(cores) if cores is not None else available_cores()
+        pin = self.pin if pin is None else pin
+        if slots is None and threads_per_slot is None:
+            threads_per_slot = min(DEFAULT_THREADS_PER_SLOT, len(cores))
+        if slots is None:
+            slots = max(1, len(cores) // threads_per_slot)
+        if threads_per_slot is None:
+            threads_per_slot = max(1, len(cores) // slots)
+
+        for slot in self.slots:
+            slot.executor.shutdown(wait=True)
+        self.cores = cores
+        self.pin = pin
+        self.threads_per_slot = threads_per_slot
+        self.slots = [
+            Slot(
+                index,
+                [cores[(index * threads_per_slot + i) % len(cores)] for i in range(threads_per_slot)],
+                threads_per_slot,
+                pin
+            )
+            for index in range(slots)
+        ]
+        self._free = None
+        logger.info(
+            "Inference placement: %d slot(s) x %d thread(s) over %d core(s)%s",
+            slots, threads_per_slot, len(cores), ", pinned" if pin else ""
+        )
+
+    def _free_slots(self) -> asyncio.Queue:
+        loop = asyncio.get_running_loop()
+        if self._free is None or self._free_loop is not loop:
+            self._free = asyncio.Queue()
+            self._free_loop = loop
+            for slot in self.slots:
+                self._free.put_nowait(slot)
+        return self._free
+
+    async def run(self, func, *args, **kwargs):
+        """Run the blocking ``func`` on the next free slot and return its result."""
+        free = self._free_slots()
+        slot = await free.get()
+        try:
+            # Carry context variables (e.g. the profiling session) into the slot thread
+            context = contextvars.copy_context()
+            call = functools.partial(context.run, slot._call, func, args, kwargs)
+            future = asyncio.get_running_loop().run_in_executor(slot.executor, call)
+        except BaseException:
+            free.put_nowait(slot)
+            raise
+
+        def finished(future):
+            free.put_nowait(slot)
+            # Nobody may be awaiting the result any more
+            if not future.cancelled():
+                future.exception()
+
+        future.add_done_callback(finished)
+        calls = _running_calls.get()
+        if calls is not None:
+            calls.append(future)
+        # Cancelling the caller must not cancel the future, which would hand
+        # the slot back while its thread is still running the call
+        return await asyncio.shield(future)
+
+    def stats(self) -> dict:
+        return {
+            "slots": len(self.slots),
+            "threads_per_slot": self.threads_per_slot,
+            "pinned": self.pin,
+            "free": self._free.qsize() if self._free is not None else len(self.slots),
+            "per_slot": [
+                {"cores": slot.cores, "calls": slot.calls, "busy_seconds": round(slot.busy_seconds, 3)}
+                for slot in self.slots
+            ]
+        }
+
+
+def share_of_cores(index: int, count: int, cores: Optional[List[int]] = None) -> List[int]:
+    """The contiguous block of cores belonging to process ``index`` of ``count``."""
+    cores = cores if cores is not None else available_cores()
+    if count >= len(cores):
+        return [cores[index % len(cores)]]
+    size, extra = divmod(len(cores), count)
+    start = index * size + min(index, extra)
+    return cores[start:start + size + (1 if index < extra else 0)]
+
+
+inference_placement = InferencePlacement()
@@ -0,0 +1,230 @@
+"""Opt-in profiling of individual requests.
+
+A request carrying ``X-Profile: 1`` (or ``?profile=1``) together with an
+``X-Profile-Token`` matching PROFILE_TOKEN is run under a sampling profiler;
+``torch`` instead of ``1`` additionally runs the torch profiler around model
+calls. The report is written to a bounded ring of files in PROFILE_DIR and
+can be fetched by the request id returned in the ``X-Profile-Id`` header.
+Profiling covers the whole response, including a streamed body.
+
+Profiling is disabled entirely when PROFILE_TOKEN is unset, and requests
+without the flag only pay for one header lookup.
+"""
+import asyncio
+import hmac
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional
+from fastapi.concurrency import run_in_threadpool
+
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_MAX_REPORTS = int(os.getenv("PROFILE_MAX_REPORTS", 50))
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", 0.005))
+
+_REPORT_ID = re.compile(r"^[0-9a-f]{32}$")
+
+# Leaf frames of threads that are parked rather than doing work
+_IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+}
+
+_current_session: ContextVar[Optional["ProfileSession"]] = ContextVar("profile_session", default=None)
+
+
+class StackSampler:
+    """Periodically sample the Python stacks of all busy threads.
+
+    Inference runs in threadpool workers, so every thread is sampled, not just
+    the one serving the request; concurrent requests show up in the profile
+    too and are best avoided when reproducing a slow request.
+    """
+
+    def __init__(self, interval: float = PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                code = frame.f_code
+                if (os.path.basename(code.co_filename), code.co_name) in _IDLE_FRAMES:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def summary(self, limit: int = 30) -> List[str]:
+        inclusive = Counter()
+        own = Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            own[frames[-1]] += count
+            for frame in set(frames):
+                inclusive[frame] += count
+
+        total = sum(self.stacks.values()) or 1
+        lines = ["Top functions by self samples:"]
+        lines += [f"  {count:6d} {100 * count / total:5.1f}%  {frame}" for frame, count in own.most_common(limit)]
+        lines += ["", "Top functions by inclusive samples:"]
+        lines += [f"  {count:6d} {100 * count / total:5.1f}%  {frame}" for frame, count in inclusive.most_common(limit)]
+        lines += ["", "Folded stacks (flamegraph.pl / speedscope input):"]
+        lines += [f"{stack} {count}" for stack, count in self.stacks.most_common()]
+        return lines
+
+
+class ProfileSession:
+    def __init__(self, request_id: str, torch: bool, description: str = ""):
+        self.request_id = request_id
+        self.torch = torch
+        self.description = description
+        self.start = None
+        self.sections = []
+        self.sampler = StackSampler()
+
+    def add_section(self, title: str, body: str):
+        self.sections.append((title, body))
+
+
+def requested_mode(request) -> Optional[str]:
+    """Return "sample" or "torch" if this request asked for, and may use, profiling."""
+    if not PROFILE_TOKEN:
+        return None
+    flag = request.headers.get("x-profile") or request.query_params.get("profile")
+    if not flag:
+        return None
+    if not hmac.compare_digest(request.headers.get("x-profile-token", ""), PROFILE_TOKEN):
+        return None
+    return "torch" if flag.lower() == "torch" else "sample"
+
+
+def is_authorized(request) -> bool:
+    return bool(PROFILE_TOKEN) and hmac.compare_digest(request.headers.get("x-profile-token", ""), PROFILE_TOKEN)
+
+
+def start_profile(mode: str, description: str) -> ProfileSession:
+    """Start profiling the current request; end it with ``finish_profile``.
+
+    The session is visible to ``torch_profile`` in this context and in the
+    tasks it starts, which includes the one producing a streamed body.
+    """
+    session = ProfileSession(uuid.uuid4().hex, torch=(mode == "torch"), description=description)
+    _current_session.set(session)
+    session.start = time.perf_counter()
+    session.sampler.start()
+    return session
+
+
+async def finish_profile(session: ProfileSession):
+    """Stop the sampler and store the report without blocking the event loop."""
+    # Still store the report if the client disconnects meanwhile
+    await asyncio.shield(run_in_threadpool(_finish, session))
+
+
+async def profile_body(session: ProfileSession, body_iterator):
+    """Pass a response body through, finishing the profile once it has been sent."""
+    try:
+        async for chunk in body_iterator:
+            yield chunk
+    finally:
+        await finish_profile(session)
+
+
+def _finish(session: ProfileSession):
+    session.sampler.stop()
+    elapsed = time.perf_counter() - session.start
+    header = [
+        f"Request: {session.description}",
+        f"Request id: {session.request_id}",
+        f"Wall time: {elapsed:.3f}s",
+        f"Samples: {session.sampler.samples} every {session.sampler.interval * 1000:.1f}ms",
+        ""
+    ]
+    body = header + session.sampler.summary()
+    for title, section in session.sections:
+        body += ["", f"=== {title} ===", section]
+    store_report(session.request_id, "\n".join(body))
+
+
+@contextmanager
+def torch_profile(label: str):
+    """Run the torch profiler around a model call when the current request asked for it."""
+    session = _current_session.get()
+    if session is None or not session.torch:
+        yield
+        return
+
+    from torch.profiler import profile, ProfilerActivity
+    with profile(activities=[ProfilerActivity.CPU], record_shapes=True) as prof:
+        yield
+    session.add_section(
+        f"torch profiler: {label}",
+        prof.key_averages().table(sort_by="self_cpu_time_total", row_limit=30)
+    )
+
+
+def store_report(request_id: str, report: str):
+    """Write a report and drop the oldest ones beyond PROFILE_MAX_REPORTS."""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    tmp_path = os.path.join(PROFILE_DIR, f".{request_id}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(report)
+    os.replace(tmp_path, os.path.join(PROFILE_DIR, f"{request_id}.txt"))
+
+    reports = sorted(
+        (entry for entry in os.scandir(PROFILE_DIR) if entry.name.endswith(".txt")),
+        key=lambda entry: entry.stat().st_mtime
+    )
+    for entry in reports[:max(0, len(reports) - PROFILE_MAX_REPORTS)]:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
+
+
+def list_reports() -> List[str]:
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    reports = sorted(
+        (entry for entry in os.scandir(PROFILE_DIR) if entry.name.endswith(".txt")),
+        key=lambda entry: entry.stat().st_mtime,
+        reverse=True
+    )
+    return [entry.name[:-4] for entry in reports]
+
+
+def load_report(request_id: str) -> Optional[str]:
+    if not _REPORT_ID.match(request_id):
+        return None
+    path = os.path.join(PROFILE_DIR, f"{request_id}.txt")
+    if not os.path.isfile(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
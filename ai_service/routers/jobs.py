@@ -0,0 +1,214 @@
+from fastapi import APIRouter, HTTPException, Depends, Request, UploadFile, File, Form
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from typing import Dict, List, Optional
+from auth.auth_handler import get_current_user, get_rate_limited_user
+from scheduler import inference_scheduler
+from placement import inference_placement
+from uploads import check_upload_size
+from jobs import (
+    JobRunner, JOBS_DB_PATH, JOBS_SPOOL_DIR, TERMINAL_STATES, job_store, public_view, remove_inputs
+)
+from routers import ocr
+from routers.summarizer import SummarizeRequest, summarize_with_model
+from routers.tts import TTSRequest, tts_service
+import asyncio
+import json
+import logging
+import os
+import shutil
+import uuid
+import deadlines
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# How often an event stream checks a job for changes
+EVENT_POLL_INTERVAL = 0.5
+# Comment lines sent on an idle event stream so proxies keep it open
+EVENT_KEEPALIVE_SECONDS = 15.0
+
+router = APIRouter(
+    prefix="/jobs",
+    tags=["jobs"]
+)
+
+class JobSubmitted(BaseModel):
+    job_id: str
+    status: str
+    status_url: str
+    events_url: str
+
+async def summarize_job(ctx) -> Dict:
+    payload = ctx.payload
+    # Background summaries draw from the same inference slots as live requests;
+    # cancelling the job stops the model between chunks and tokens
+    with deadlines.scope(deadlines.Deadline(None, cancelled=ctx.cancelled)):
+        async with inference_scheduler.slot(ctx.tier):
+            summary = await inference_placement.run(
+                summarize_with_model,
+                ctx.tier,
+                payload["model"],
+                payload["text"],
+                payload["compression_ratio"]
+            )
+    return {"summary": summary, "model_used": payload["model"]}
+
+async def tts_job(ctx) -> Dict:
+    payload = ctx.payload
+    with metrics.tts_job_seconds.labels("job").time():
+        audio_file = await run_in_threadpool(
+            tts_service.text_to_speech,
+            text=payload["text"],
+            lang=payload["lang"],
+            play_audio=False
+        )
+    if not audio_file:
+        raise RuntimeError("Failed to convert text to speech")
+    return {"filename": os.path.basename(audio_file)}
+
+def ocr_pages(paths: List[str], language: str, cancelled) -> Dict:
+    pages = []
+    for path in paths:
+        if cancelled.is_set():
+            break
+        with open(path, "rb") as f:
+            pages.append(ocr.run_ocr(f, language).dict())
+    confidence = sum(page["confidence"] for page in pages) / len(pages) if pages else 0
+    return {
+        "text": "\n\n".join(page["text"] for page in pages),
+        "confidence": confidence,
+        "pages": pages
+    }
+
+async def ocr_job(ctx) -> Dict:
+    return await run_in_threadpool(ocr_pages, ctx.payload["input_paths"], ctx.payload["language"], ctx.cancelled)
+
+JOB_HANDLERS = {
+    "summarize": summarize_job,
+    "tts": tts_job,
+    "ocr": ocr_job
+}
+
+job_runner = JobRunner(job_store, JOB_HANDLERS)
+
+@router.on_event("startup")
+async def start_job_runner():
+    await run_in_threadpool(job_store.open, JOBS_DB_PATH)
+    job_runner.start()
+
+@router.on_event("shutdown")
+async def stop_job_runner():
+    await job_runner.stop()
+
+async def submitted(request: Request, kind: str, payload: Dict, user: Dict) -> JobSubmitted:
+    job = await run_in_threadpool(
+        job_store.submit, kind, payload, str(user["id"]), user.get("subscription_tier", "personal")
+    )
+    metrics.jobs_submitted.labels(kind).inc()
+    job_runner.notify()
+    return JobSubmitted(
+        job_id=job["id"],
+        status=job["status"],
+        status_url=str(request.url_for("get_job", job_id=job["id"])),
+        events_url=str(request.url_for("job_events", job_id=job["id"]))
+    )
+
+async def owned_job(job_id: str, user: Dict) -> Dict:
+    job = await run_in_threadpool(job_store.get, job_id)
+    # Someone else's job is reported as missing rather than forbidden
+    if job is None or job["owner"] != str(user["id"]):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+def job_response(request: Request, job: Dict) -> Dict:
+    view = public_view(job)
+    if job["kind"] == "tts" and view["result"]:
+        view["result"]["audio_url"] = str(request.url_for("get_audio", filename=view["result"]["filename"]))
+    return view
+
+@router.post("/summarize", response_model=JobSubmitted, status_code=202)
+async def submit_summarize(
+    request: Request,
+    summarize_req: SummarizeRequest,
+    current_user: Dict = Depends(get_rate_limited_user)
+):
+    """Queue a summarization and return its job id at once."""
+    return await submitted(request, "summarize", summarize_req.dict(), current_user)
+
+@router.post("/tts", response_model=JobSubmitted, status_code=202)
+async def submit_tts(
+    request: Request,
+    tts_request: TTSRequest,
+    current_user: Dict = Depends(get_current_user)
+):
+    """Queue a text-to-speech clip; the result carries its audio URL."""
+    if not tts_request.text.strip():
+        raise HTTPException(status_code=400, detail="No text to speak")
+    return await submitted(request, "tts", {"text": tts_request.text, "lang": tts_request.lang}, current_user)
+
+@router.post("/ocr", response_model=JobSubmitted, status_code=202)
+async def submit_ocr(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    language: Optional[str] = Form('eng'),
+    current_user: Dict = Depends(get_current_user)
+):
+    """Queue OCR of one or more page images, recognized in upload order."""
+    for upload in files:
+        check_upload_size(upload)
+
+    os.makedirs(JOBS_SPOOL_DIR, exist_ok=True)
+    prefix = uuid.uuid4().hex
+    paths = []
+    for index, upload in enumerate(files):
+        path = os.path.join(JOBS_SPOOL_DIR, f"{prefix}-{index}")
+        with open(path, "wb") as f:
+            await run_in_threadpool(shutil.copyfileobj, upload.file, f)
+        paths.append(path)
+    return await submitted(request, "ocr", {"input_paths": paths, "language": language}, current_user)
+
+@router.get("/{job_id}", name="get_job")
+async def get_job(request: Request, job_id: str, current_user: Dict = Depends(get_current_user)):
+    """Current status of a job, with its result once it has succeeded."""
+    return job_response(request, await owned_job(job_id, current_user))
+
+@router.get("/{job_id}/events", name="job_events")
+async def job_events(request: Request, job_id: str, current_user: Dict = Depends(get_current_user)):
+    """Server-sent events with the job's state on every change, ending when it finishes."""
+    job = await owned_job(job_id, current_user)
+
+    async def events():
+        last = None
+        idle = 0.0
+        current = job
+        while True:
+            view = job_response(request, current)
+            if view != last:
+                yield f"event: {view['status']}\ndata: {json.dumps(view)}\n\n"
+                last = view
+                idle = 0.0
+            elif idle >= EVENT_KEEPALIVE_SECONDS:
+                yield ": keepalive\n\n"
+                idle = 0.0
+            if view["status"] in TERMINAL_STATES or await request.is_disconnected():
+                return
+            await asyncio.sleep(EVENT_POLL_INTERVAL)
+            idle += EVENT_POLL_INTERVAL
+            current = await run_in_threadpool(job_store.get, job_id)
+            if current is None:
+                return
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@router.delete("/{job_id}")
+async def cancel_job(request: Request, job_id: str, current_user: Dict = Depends(get_current_user)):
+    """Cancel a job. Queued jobs stop at once; running ones when their handler next checks."""
+    await owned_job(job_id, current_user)
+    job = await run_in_threadpool(job_store.cancel, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] == "cancelled":
+        remove_inputs(job)
+    return job_response(request, job)
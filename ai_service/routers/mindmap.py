@@ -0,0 +1,199 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field, model_validator
+from typing import Dict, List
+from collections import Counter
+from caching import TTLCache
+import metrics
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+SPACY_MODEL = os.getenv("MINDMAP_SPACY_MODEL", "en_core_web_sm")
+NLP_BATCH_SIZE = int(os.getenv("MINDMAP_BATCH_SIZE", 256))
+
+# Mind maps of identical notes are served from memory
+mindmap_cache = TTLCache(
+    maxsize=int(os.getenv("MINDMAP_CACHE_SIZE", 256)),
+    ttl=float(os.getenv("MINDMAP_CACHE_TTL", 24 * 3600))
+)
+metrics.register_cache("mindmap", mindmap_cache.stats)
+
+_SENTENCE_SPLIT = re.compile(r'(?<=[.!?])\s+|\n+')
+_WORD = re.compile(r"[A-Za-z][A-Za-z\-]+")
+_FALLBACK_STOPWORDS = frozenset("""
+a about above after again all also an and any are as at be because been before being
+between both but by can could did do does each for from had has have he her here his how
+i if in into is it its just more most my no not of on only or other our out over own same
+she should so some such than that the their them then there these they this those through
+to too under up very was we were what when where which while who why will with would you
+your yours also using used like get make
+""".split())
+
+class MindmapRequest(BaseModel):
+    text: str = Field(..., min_length=20, description="Note text to build the mind map from")
+    max_depth: int = Field(default=3, ge=1, le=4)
+    min_keywords: int = Field(default=5, ge=1, le=50)
+    max_keywords: int = Field(default=8, ge=1, le=50)
+
+    @model_validator(mode="after")
+    def check_keyword_range(self):
+        if self.min_keywords > self.max_keywords:
+            raise ValueError("min_keywords must not be greater than max_keywords")
+        return self
+
+class MindmapResponse(BaseModel):
+    status: str
+    mindmap: Dict
+
+_nlp = None
+_nlp_lock = threading.Lock()
+
+def get_nlp():
+    """Load the spaCy pipeline once per process; None if it is not installed."""
+    global _nlp
+    if _nlp is None:
+        with _nlp_lock:
+            if _nlp is None:
+                try:
+                    import spacy
+                    # Only the tagger, parser and lemmatizer are needed for noun chunks
+                    _nlp = spacy.load(SPACY_MODEL, disable=["ner"])
+                except Exception as e:
+                    logger.warning(f"spaCy model {SPACY_MODEL} unavailable, using regex tokenizer: {str(e)}")
+                    _nlp = False
+    return _nlp or None
+
+def split_sentences(text: str) -> List[str]:
+    return [s.strip() for s in _SENTENCE_SPLIT.split(text) if len(s.strip()) > 2]
+
+def sentence_terms(sentences: List[str]) -> List[List[str]]:
+    """Extract candidate concept terms per sentence.
+
+    With spaCy, sentences go through ``nlp.pipe`` in batches and terms are the
+    lemmatized noun chunks (minus determiners and stopwords) plus standalone
+    nouns. Without it, non-stopword words are used.
+    """
+    nlp = get_nlp()
+    if nlp is None:
+        return [
+            [w.lower() for w in _WORD.findall(sentence) if w.lower() not in _FALLBACK_STOPWORDS and len(w) > 3]
+            for sentence in sentences
+        ]
+
+    terms = []
+    for doc in nlp.pipe(sentences, batch_size=NLP_BATCH_SIZE):
+        found = []
+        for chunk in doc.noun_chunks:
+            words = [t.lemma_.lower() for t in chunk if not (t.is_stop or t.is_punct or t.like_num)]
+            if words:
+                found.append(" ".join(words))
+        for token in doc:
+            if token.pos_ in ("NOUN", "PROPN") and not token.is_stop and len(token.text) > 2:
+                found.append(token.lemma_.lower())
+        terms.append(found)
+    return terms
+
+def build_mindmap(text: str, max_depth: int, min_keywords: int, max_keywords: int) -> Dict:
+    """Build a keyword tree from sentence-level co-occurrence.
+
+    Sentences and terms form a sparse binary incidence matrix X; the term
+    co-occurrence matrix is X.T @ X. The most connected term becomes the
+    root, the strongest terms become branches and each branch's children are
+    the terms it co-occurs with most, without repeating a term in the tree.
+    """
+    import numpy as np
+    from scipy import sparse
+
+    sentences = split_sentences(text)
+    per_sentence = sentence_terms(sentences)
+
+    counts = Counter(term for terms in per_sentence for term in set(terms))
+    # Keep a bounded vocabulary so the co-occurrence matrix stays small
+    vocabulary = [term for term, _ in counts.most_common(max(200, max_keywords * 10))]
+    if not vocabulary:
+        raise ValueError("No key concepts found in text")
+    index = {term: i for i, term in enumerate(vocabulary)}
+
+    rows, cols = [], []
+    for row, terms in enumerate(per_sentence):
+        for term in set(terms):
+            if term in index:
+                rows.append(row)
+                cols.append(index[term])
+    incidence = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.float32), (rows, cols)),
+        shape=(len(per_sentence), len(vocabulary))
+    )
+    cooccurrence = (incidence.T @ incidence).tocsr()
+    frequency = cooccurrence.diagonal()
+    cooccurrence.setdiag(0)
+    cooccurrence.eliminate_zeros()
+
+    # Rank terms by frequency plus how strongly they connect to everything else
+    strength = frequency + np.asarray(cooccurrence.sum(axis=1)).ravel()
+    ranked = np.argsort(-strength, kind="stable")
+
+    root_id = int(ranked[0])
+    used = {root_id}
+    root = {"id": "root", "text": vocabulary[root_id], "children": []}
+
+    branch_count = max(min_keywords, min(max_keywords, len(vocabulary) - 1))
+    branches = [int(i) for i in ranked[1:] if int(i) not in used][:branch_count]
+    used.update(branches)
+
+    def children_of(term_id, prefix, depth):
+        if depth >= max_depth:
+            return []
+        row = cooccurrence.getrow(term_id)
+        order = row.indices[np.argsort(-row.data, kind="stable")]
+        picked = [int(i) for i in order if int(i) not in used][:3]
+        used.update(picked)
+        return [
+            {
+                "id": f"{prefix}-{n}",
+                "text": vocabulary[i],
+                "children": children_of(i, f"{prefix}-{n}", depth + 1)
+            }
+            for n, i in enumerate(picked)
+        ]
+
+    for n, term_id in enumerate(branches):
+        if max_depth < 2:
+            break
+        root["children"].append({
+            "id": f"keyword-{n}",
+            "text": vocabulary[term_id],
+            "children": children_of(term_id, f"concept-{n}", 2)
+        })
+    return root
+
+@router.post("/Mindmap-gen", response_model=MindmapResponse)
+async def generate_mindmap(request: MindmapRequest):
+    """Generate a mind map tree from note text."""
+    try:
+        params = [request.text, request.max_depth, request.min_keywords, request.max_keywords]
+        cache_key = hashlib.sha256(json.dumps(params).encode("utf-8")).hexdigest()
+        mindmap = mindmap_cache.get(cache_key)
+        if mindmap is None:
+            mindmap = await run_in_threadpool(
+                build_mindmap,
+                request.text,
+                request.max_depth,
+                request.min_keywords,
+                request.max_keywords
+            )
+            mindmap_cache.set(cache_key, mindmap)
+        return MindmapResponse(status="success", mindmap=mindmap)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error generating mind map: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to generate mind map: {str(e)}")
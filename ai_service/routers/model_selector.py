@@ -3,9 +3,15 @@ from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from typing import List, Dict, Optional
 from models.model_factory import ModelFactory
-from auth.auth_handler import get_current_user, SECRET_KEY
-import jwt
-import traceback
+from auth.auth_handler import get_current_user, get_rate_limited_user
+from scheduler import inference_scheduler
+from placement import inference_placement
+import logging
+import time
+import deadlines
+import metrics
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(
     prefix="/models",
@@ -28,40 +34,26 @@ class GenerateRequest(BaseModel):
 async def get_available_models(request: Request, current_user: Dict = Depends(get_current_user)):
     """Get list of available models based on user's subscription tier."""
     try:
-        print("\n=== Models Route Debug ===")
-        print("Request path:", request.url.path)
-        print("Request method:", request.method)
-        print("Request headers:", dict(request.headers))
-        print("Auth header:", request.headers.get("authorization"))
-        print("Current user data:", current_user)
-        
         subscription_tier = current_user.get("subscription_tier", "personal")
-        print(f"User tier: {subscription_tier}")
+        logger.debug("Listing models for user %s (tier %s)", current_user.get("id"), subscription_tier)
         
         try:
             models = ModelFactory.get_available_models(subscription_tier)
-            print(f"Retrieved models: {models}")
-            print("=== End Models Route Debug ===\n")
+            logger.debug("Retrieved %d models", len(models))
             return models
             
         except Exception as model_error:
-            print(f"Error in ModelFactory: {str(model_error)}")
-            print(f"Error type: {type(model_error).__name__}")
-            print(traceback.format_exc())
+            logger.exception(f"Error in ModelFactory: {str(model_error)}")
             raise HTTPException(
                 status_code=500,
                 detail=f"Model factory error: {str(model_error)}"
             )
             
     except HTTPException as http_error:
-        print(f"HTTP error in get_available_models: {str(http_error)}")
-        print(f"Status code: {http_error.status_code}")
-        print(f"Detail: {http_error.detail}")
+        logger.debug(f"HTTP error in get_available_models: {http_error.status_code} {http_error.detail}")
         raise
     except Exception as e:
-        print(f"Unexpected error in get_available_models: {str(e)}")
-        print(f"Error type: {type(e).__name__}")
-        print(traceback.format_exc())
+        logger.exception(f"Unexpected error in get_available_models: {str(e)}")
         raise HTTPException(
             status_code=500,
             detail=f"Server error: {str(e)}"
@@ -71,11 +63,11 @@ async def get_available_models(request: Request, current_user: Dict = Depends(ge
 async def generate_text(
     request: Request,
     generate_request: GenerateRequest,
-    current_user: Dict = Depends(get_current_user)
+    current_user: Dict = Depends(get_rate_limited_user)
 ):
     """Generate text using the selected model."""
     try:
-        print(f"Generate request for model: {generate_request.model_id}")
+        logger.debug(f"Generate request for model: {generate_request.model_id}")
         subscription_tier = current_user.get("subscription_tier", "personal")
         
         try:
@@ -95,52 +87,29 @@ async def generate_text(
             model.get_model_info()["max_tokens"]
         )
         
-        result = model.generate(generate_request.prompt, **parameters)
-        return {"result": result}
+        # Wait for an inference slot, then run the model on a core-partitioned placement slot,
+        # within the request's deadline and only while the client is still connected
+        async with deadlines.request_deadline(request, "generate") as deadline:
+            async with inference_scheduler.slot(subscription_tier):
+                deadline.check()
+                start = time.perf_counter()
+                result = await inference_placement.run(model.generate, generate_request.prompt, **parameters)
+                elapsed = time.perf_counter() - start
+        
+        # Whitespace-delimited words approximate tokens across heterogeneous providers
+        generated = len(result.split())
+        metrics.model_inference_seconds.labels(generate_request.model_id).observe(elapsed)
+        metrics.model_generated_tokens.labels(generate_request.model_id).inc(generated)
+        if elapsed > 0:
+            metrics.model_tokens_per_second.labels(generate_request.model_id).observe(generated / elapsed)
+        if deadline.degraded:
+            metrics.deadline_degraded.labels(generate_request.model_id).inc()
+        return {"result": result, "degraded": deadline.degraded}
     except HTTPException:
         raise
+    except deadlines.RequestCancelled:
+        logger.info("Client disconnected, abandoned generation")
+        raise HTTPException(status_code=499, detail="Client closed request")
     except Exception as e:
-        print(f"Error in generate_text: {str(e)}")
+        logger.error(f"Error in generate_text: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
-
-@router.get("/test-auth")
-async def test_auth(request: Request):
-    """Test endpoint to debug token validation."""
-    try:
-        print("\n=== Test Auth Debug ===")
-        auth_header = request.headers.get("authorization")
-        if not auth_header:
-            return {"error": "No authorization header"}
-        
-        if not auth_header.startswith("Bearer "):
-            return {"error": "Invalid authorization header format"}
-            
-        token = auth_header.replace("Bearer ", "")
-        
-        # First, decode without verification to inspect the payload
-        decoded_unverified = decode_jwt_without_verification(token)
-        print("Token structure (unverified):", decoded_unverified)
-        
-        try:
-            # Try to decode and verify the token
-            payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
-            print("Successfully verified token!")
-            print("Verified payload:", payload)
-            return {
-                "status": "success",
-                "unverified_decode": decoded_unverified,
-                "verified_payload": payload
-            }
-        except jwt.InvalidSignatureError:
-            print("Invalid token signature")
-            return {"error": "Invalid token signature", "unverified_decode": decoded_unverified}
-        except jwt.ExpiredSignatureError:
-            print("Token has expired")
-            return {"error": "Token has expired", "unverified_decode": decoded_unverified}
-        except Exception as e:
-            print(f"JWT verification error: {str(e)}")
-            return {"error": f"Token verification failed: {str(e)}", "unverified_decode": decoded_unverified}
-            
-    except Exception as e:
-        print(f"Test auth error: {str(e)}")
-        return {"error": f"Test failed: {str(e)}"} 
\ No newline at end of file
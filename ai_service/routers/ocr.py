@@ -1,42 +1,61 @@
 from fastapi import APIRouter, HTTPException, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import Optional
-import pytesseract
-from PIL import Image
-import io
 import os
-
-# Configure Tesseract path for Windows
-pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
+from uploads import check_upload_size, image_source
+import metrics
 
 router = APIRouter()
 
+_pytesseract = None
+
+def get_pytesseract():
+    """Import and configure pytesseract on first use."""
+    global _pytesseract
+    if _pytesseract is None:
+        import pytesseract
+        # Configure Tesseract path for Windows
+        pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
+        _pytesseract = pytesseract
+    return _pytesseract
+
 class OCRResponse(BaseModel):
     text: str
     confidence: float
 
-@router.post("/OCR")
-async def extract_text(file: UploadFile = File(...), language: Optional[str] = 'eng'):
-    try:
-        # Read the uploaded file
-        contents = await file.read()
-        
-        # Open the image using PIL
-        image = Image.open(io.BytesIO(contents))
+def run_ocr(fileobj, language: str = 'eng') -> OCRResponse:
+    """Extract text and mean word confidence from an image file object."""
+    from PIL import Image
+    pytesseract = get_pytesseract()
+
+    # Decode the image straight from the spooled file (or its memory map)
+    with image_source(fileobj) as source, metrics.ocr_job_seconds.time():
+        image = Image.open(source)
         
         # Extract text using pytesseract
         data = pytesseract.image_to_data(image, lang=language, output_type=pytesseract.Output.DICT)
-        
-        # Calculate average confidence
-        confidences = [float(conf) for conf in data['conf'] if conf != '-1']
-        avg_confidence = sum(confidences) / len(confidences) if confidences else 0
-        
-        # Combine all text
-        text = ' '.join([word for word in data['text'] if word.strip()])
-        
-        return OCRResponse(
-            text=text,
-            confidence=avg_confidence
-        )
+    
+    # Calculate average confidence
+    confidences = [float(conf) for conf in data['conf'] if conf != '-1']
+    avg_confidence = sum(confidences) / len(confidences) if confidences else 0
+    
+    # Combine all text
+    text = ' '.join([word for word in data['text'] if word.strip()])
+    
+    return OCRResponse(
+        text=text,
+        confidence=avg_confidence
+    )
+
+@router.post("/OCR")
+async def extract_text(file: UploadFile = File(...), language: Optional[str] = 'eng'):
+    try:
+        # The body was capped while streaming in; enforce the per-file cap on the spooled upload
+        check_upload_size(file)
+        # Tesseract blocks, so keep it off the event loop
+        return await run_in_threadpool(run_ocr, file.file, language)
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
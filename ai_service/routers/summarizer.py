@@ -1,9 +1,22 @@
-from fastapi import APIRouter, HTTPException, Request, Depends
+from fastapi import APIRouter, HTTPException, Request, Response, Depends
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from typing import Dict, List
+import json
 import logging
-from transformers import pipeline, AutoTokenizer
-from auth.auth_handler import get_current_user
+import os
+import time
+from auth.auth_handler import get_current_user, get_rate_limited_user, wait_for_rate_limit
+from scheduler import inference_scheduler
+from placement import inference_placement
+from caching import TTLCache
+from chunking import content_chunks, chunk_key, lead_sentences
+from models.model_factory import ModelFactory
+import deadlines
+import metrics
+import model_store
+import profiling
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -31,6 +44,25 @@ TIER_MODEL_MAP = {
 # Cache for loaded models
 model_cache = {}
 
+# Summaries of individual chunks, so re-summarizing an edited note only runs
+# the model on the chunks that changed
+chunk_summary_cache = TTLCache(
+    maxsize=int(os.getenv("SUMMARY_CACHE_SIZE", 4096)),
+    ttl=float(os.getenv("SUMMARY_CACHE_TTL", 24 * 3600))
+)
+metrics.register_cache("summary_chunks", chunk_summary_cache.stats)
+
+# Moving average of seconds per chunk and model, to tell whether the next
+# chunk still fits in a request's deadline
+chunk_seconds = {}
+
+SUMMARY_BULK_MAX_NOTES = int(os.getenv("SUMMARY_BULK_MAX_NOTES", 500))
+# Chunks per batched model call, and the cap on padded input tokens per call
+SUMMARY_BULK_BATCH_SIZE = int(os.getenv("SUMMARY_BULK_BATCH_SIZE", 8))
+SUMMARY_BULK_BATCH_TOKENS = int(os.getenv("SUMMARY_BULK_BATCH_TOKENS", 8192))
+# Longest chunk in a batch relative to its shortest, since they share generation lengths
+SUMMARY_BULK_LENGTH_SPREAD = float(os.getenv("SUMMARY_BULK_LENGTH_SPREAD", 1.25))
+
 class ModelInfo(BaseModel):
     id: str
     name: str
@@ -49,6 +81,24 @@ class SummarizeRequest(BaseModel):
 class SummarizeResponse(BaseModel):
     summary: str
     model_used: str
+    degraded: bool = Field(
+        default=False,
+        description="Part of the summary was cut short or extractive to meet the request deadline"
+    )
+
+class BulkNote(BaseModel):
+    id: str = Field(..., description="Caller's identifier, echoed back with the summary")
+    text: str = Field(..., min_length=10, description="Text to summarize")
+    compression_ratio: float = Field(
+        default=0.3,
+        gt=0.1,
+        lt=0.9,
+        description="Target length of summary as a fraction of original text"
+    )
+
+class BulkSummarizeRequest(BaseModel):
+    notes: List[BulkNote] = Field(..., min_length=1, description="Notes to summarize")
+    model: str = Field(..., description="Model identifier to use for summarization")
 
 router = APIRouter(
     prefix="/summarizer",
@@ -97,6 +147,11 @@ async def get_available_models(current_user: Dict = Depends(get_current_user)):
             detail=f"Failed to get available models: {str(e)}"
         )
 
+def parameter_bytes(module) -> int:
+    """Memory held by a torch module's parameters and buffers."""
+    tensors = list(module.parameters()) + list(module.buffers())
+    return sum(t.numel() * t.element_size() for t in tensors)
+
 def get_model_for_tier(tier: str, model_name: str):
     """Get the appropriate model based on user tier and model name."""
     if tier not in TIER_MODEL_MAP:
@@ -124,13 +179,22 @@ def get_model_for_tier(tier: str, model_name: str):
     if cache_key not in model_cache:
         logger.info(f"Loading model {model_path} for tier {tier}")
         try:
-            tokenizer = AutoTokenizer.from_pretrained(model_path)
+            load_start = time.perf_counter()
+            # Imported here so the app starts without loading torch/transformers
+            from transformers import pipeline, AutoTokenizer, AutoModelForSeq2SeqLM
+            # A checkpoint in the local model store is memory-mapped in its stored dtype, offline
+            location, load_kwargs = model_store.load_options(model_path)
+            tokenizer = AutoTokenizer.from_pretrained(location)
             model = pipeline(
                 "summarization",
-                model=model_path,
+                model=AutoModelForSeq2SeqLM.from_pretrained(location, **load_kwargs),
                 tokenizer=tokenizer,
                 device="cpu"
             )
+            load_seconds = time.perf_counter() - load_start
+            logger.info(f"Loaded {model_path} from {'the model store' if load_kwargs else 'the hub'} in {load_seconds:.1f}s")
+            metrics.model_load_seconds.labels(model_name).observe(load_seconds)
+            metrics.model_memory_bytes.labels(model_name).set(parameter_bytes(model.model))
             model_cache[cache_key] = {
                 "model": model,
                 "tokenizer": tokenizer
@@ -144,10 +208,117 @@ def get_model_for_tier(tier: str, model_name: str):
     
     return model_cache[cache_key]
 
+def preload_models(specs, generate_specs=()) -> None:
+    """Load ``(tier, model_name)`` pairs into the model cache ahead of serving.
+
+    ``generate_specs`` are ``(tier, model_id)`` pairs of the models behind
+    ``/models/generate``, loaded through ModelFactory.
+    """
+    for tier, model_name in specs:
+        get_model_for_tier(tier, model_name)
+    ModelFactory.preload(generate_specs)
+
+def prepare_for_fork(share_memory: bool = True) -> None:
+    """Get the loaded models ready to be shared with forked workers.
+
+    Models are put in inference mode so nothing writes to their weights. With
+    ``share_memory`` the parameters are moved into shared memory, so workers
+    map the same pages even if the allocator would otherwise touch them;
+    without it workers rely on copy-on-write of the parent's pages.
+    """
+    modules = [entry["model"].model for entry in model_cache.values()] + ModelFactory.loaded_modules()
+    for module in modules:
+        module.eval()
+        module.requires_grad_(False)
+        if share_memory:
+            module.share_memory()
+
+def summarize_chunk(model, chunk: str, compression_ratio: float) -> str:
+    """Run the model over a single chunk that fits its input window."""
+    max_length = max(1, int(len(chunk.split()) * compression_ratio))
+    return model(
+        chunk,
+        max_length=max_length,
+        min_length=min(30, max_length),
+        do_sample=False,
+        # Chunks are cut by words; one with long words can still exceed the input window
+        truncation=True,
+        **deadlines.generation_kwargs()
+    )[0]["summary_text"]
+
+def run_summarization(model, tokenizer, text: str, compression_ratio: float, model_name: str = "unknown") -> str:
+    """Run the (blocking) summarization pipeline over ``text``, chunking long inputs.
+
+    Chunk boundaries are content-defined and each chunk's summary is cached,
+    so after an edit only the chunks around it are summarized again. Under
+    a deadline, chunks that no longer fit fall back to their lead sentences
+    and generation stops when it runs out; a cancelled deadline raises
+    RequestCancelled before the next chunk.
+    """
+    inference_start = time.perf_counter()
+    deadline = deadlines.current()
+    chunks = content_chunks(text)
+    metrics.summary_chunks.labels(model_name).observe(len(chunks))
+    summaries = []
+    computed = []
+    
+    # Profiled with the torch profiler only when this request asked for it
+    with profiling.torch_profile(f"summarize {model_name}"):
+        for chunk in chunks:
+            key = chunk_key(chunk, model_name, compression_ratio)
+            chunk_summary = chunk_summary_cache.get(key)
+            if chunk_summary is None:
+                if deadline is not None:
+                    deadline.check()
+                    if deadline.remaining() < chunk_seconds.get(model_name, 0.0):
+                        deadline.degraded = True
+                        summaries.append(lead_sentences(chunk, max(1, int(len(chunk.split()) * compression_ratio))))
+                        continue
+                chunk_start = time.perf_counter()
+                chunk_summary = summarize_chunk(model, chunk, compression_ratio)
+                seconds = time.perf_counter() - chunk_start
+                chunk_seconds[model_name] = 0.8 * chunk_seconds.get(model_name, seconds) + 0.2 * seconds
+                if deadline is not None:
+                    deadline.check()
+                # A summary whose generation may have been stopped early is not reused
+                if deadline is None or not deadline.expired():
+                    chunk_summary_cache.set(key, chunk_summary)
+                computed.append(chunk_summary)
+            summaries.append(chunk_summary)
+    
+    if computed:
+        elapsed = time.perf_counter() - inference_start
+        generated = sum(len(tokenizer(summary).input_ids) for summary in computed)
+        metrics.model_inference_seconds.labels(model_name).observe(elapsed)
+        metrics.model_generated_tokens.labels(model_name).inc(generated)
+        if elapsed > 0:
+            metrics.model_tokens_per_second.labels(model_name).observe(generated / elapsed)
+    if deadline is not None and deadline.degraded:
+        metrics.deadline_degraded.labels(model_name).inc()
+    return finish_summary(summaries)
+
+def finish_summary(summaries: List[str]) -> str:
+    """Join chunk summaries and clean up the result."""
+    final_summary = " ".join(summaries).strip()
+    if not final_summary.endswith('.'):
+        final_summary += '.'
+    return final_summary
+
+def summarize_with_model(tier: str, model_name: str, text: str, compression_ratio: float) -> str:
+    model_instance = get_model_for_tier(tier, model_name)
+    return run_summarization(
+        model_instance["model"],
+        model_instance["tokenizer"],
+        text,
+        compression_ratio,
+        model_name=model_name
+    )
+
 @router.post("/", response_model=SummarizeResponse)
 async def summarize_text(
+    request: Request,
     summarize_req: SummarizeRequest,
-    current_user: Dict = Depends(get_current_user)
+    current_user: Dict = Depends(get_rate_limited_user)
 ):
     """Summarize text using the specified model based on user's tier."""
     try:
@@ -155,54 +326,222 @@ async def summarize_text(
         tier = current_user.get("subscription_tier", "personal")
         logger.info(f"Processing summarization request for tier: {tier}")
         
-        # Get the model instance for this tier and model
-        model_instance = get_model_for_tier(tier, summarize_req.model)
-        model = model_instance["model"]
-        tokenizer = model_instance["tokenizer"]
-        
-        # Process text
-        max_chunk_size = 1024  # Maximum tokens per chunk
-        text_tokens = tokenizer(summarize_req.text, truncation=False, return_tensors="pt")
-        
-        if len(text_tokens.input_ids[0]) > max_chunk_size:
-            # Split into chunks if text is too long
-            chunks = [summarize_req.text[i:i + max_chunk_size] for i in range(0, len(summarize_req.text), max_chunk_size)]
-            summaries = []
-            
-            for chunk in chunks:
-                chunk_summary = model(
-                    chunk,
-                    max_length=int(len(chunk.split()) * summarize_req.compression_ratio),
-                    min_length=30,
-                    do_sample=False
-                )[0]["summary_text"]
-                summaries.append(chunk_summary)
-            
-            final_summary = " ".join(summaries)
-        else:
-            # Process text in one go if it's short enough
-            final_summary = model(
-                summarize_req.text,
-                max_length=int(len(summarize_req.text.split()) * summarize_req.compression_ratio),
-                min_length=30,
-                do_sample=False
-            )[0]["summary_text"]
-        
-        # Clean up the summary
-        final_summary = final_summary.strip()
-        if not final_summary.endswith('.'):
-            final_summary += '.'
+        # Wait for an inference slot, then load the model and run it on a core-partitioned placement slot,
+        # within the request's deadline and only while the client is still connected
+        async with deadlines.request_deadline(request, "summarize") as deadline:
+            async with inference_scheduler.slot(tier):
+                final_summary = await inference_placement.run(
+                    summarize_with_model,
+                    tier,
+                    summarize_req.model,
+                    summarize_req.text,
+                    summarize_req.compression_ratio
+                )
             
         logger.info(f"Successfully generated summary using {summarize_req.model}")
         
         return SummarizeResponse(
             summary=final_summary,
-            model_used=summarize_req.model
+            model_used=summarize_req.model,
+            degraded=deadline.degraded
         )
         
+    except HTTPException:
+        raise
+    except deadlines.RequestCancelled:
+        logger.info("Client disconnected, abandoned summarization")
+        raise HTTPException(status_code=499, detail="Client closed request")
     except Exception as e:
         logger.error(f"Error generating summary: {str(e)}")
         raise HTTPException(
             status_code=500,
             detail=f"Failed to generate summary: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+def summarize_batch(model, chunks: List[str], compression_ratio: float) -> List[str]:
+    """Run the model over several chunks of similar length in one padded batch.
+
+    Generation lengths are shared by the batch, so they follow its longest
+    and shortest chunk; ``plan_batches`` keeps those within
+    SUMMARY_BULK_LENGTH_SPREAD of each other.
+    """
+    words = [len(chunk.split()) for chunk in chunks]
+    max_length = max(1, int(max(words) * compression_ratio))
+    outputs = model(
+        chunks,
+        batch_size=len(chunks),
+        max_length=max_length,
+        min_length=min(30, max(1, int(min(words) * compression_ratio))),
+        do_sample=False,
+        truncation=True
+    )
+    return [output["summary_text"] for output in outputs]
+
+def plan_batches(items: List[Dict], batch_size: int = SUMMARY_BULK_BATCH_SIZE,
+                 batch_tokens: int = SUMMARY_BULK_BATCH_TOKENS,
+                 length_spread: float = SUMMARY_BULK_LENGTH_SPREAD) -> List[List[Dict]]:
+    """Bucket chunks with ``tokens`` and ``ratio`` into batches of similar length.
+
+    Chunks are sorted by compression ratio, then token count, so each batch
+    shares its generation settings and pads its inputs as little as
+    possible; a batch is closed when it is full, its padded size would
+    exceed ``batch_tokens`` or its longest chunk would be more than
+    ``length_spread`` times its shortest, so every summary stays close to
+    its own chunk's target length.
+    """
+    batches, batch = [], []
+    for item in sorted(items, key=lambda item: (item["ratio"], item["tokens"])):
+        if batch and (
+            len(batch) >= batch_size
+            or item["ratio"] != batch[0]["ratio"]
+            or item["tokens"] * (len(batch) + 1) > batch_tokens
+            or item["tokens"] > length_spread * max(1, batch[0]["tokens"])
+        ):
+            batches.append(batch)
+            batch = []
+        batch.append(item)
+    if batch:
+        batches.append(batch)
+    return batches
+
+def plan_bulk(notes: List[BulkNote], tokenizer, model_name: str):
+    """Chunk every note and collect the chunks whose summaries are not cached.
+
+    Returns the per-note state and the batches to run. Identical chunks
+    (at the same compression ratio) are summarized once.
+    """
+    states, pending = [], {}
+    for note_index, note in enumerate(notes):
+        chunks = content_chunks(note.text)
+        state = {"id": note.id, "summaries": [None] * len(chunks), "pending": 0, "cached": 0, "failed": False}
+        for chunk_index, chunk in enumerate(chunks):
+            key = chunk_key(chunk, model_name, note.compression_ratio)
+            cached = chunk_summary_cache.get(key)
+            if cached is not None:
+                state["summaries"][chunk_index] = cached
+                state["cached"] += 1
+                continue
+            state["pending"] += 1
+            if key not in pending:
+                pending[key] = {
+                    "key": key,
+                    "chunk": chunk,
+                    "ratio": note.compression_ratio,
+                    "tokens": len(tokenizer(chunk).input_ids),
+                    "targets": []
+                }
+            pending[key]["targets"].append((note_index, chunk_index))
+        states.append(state)
+    return states, plan_batches(list(pending.values()))
+
+@router.post("/bulk")
+async def summarize_bulk(
+    bulk_req: BulkSummarizeRequest,
+    response: Response,
+    current_user: Dict = Depends(get_rate_limited_user)
+):
+    """Summarize many notes with batched inference, streaming NDJSON as notes finish.
+
+    Each line is ``{"id", "summary", "chunks", "cached"}`` for a finished
+    note or ``{"id", "error"}`` for a failed one; the last line has
+    ``"done": true`` with totals and throughput. Besides the request itself,
+    every batch run on the model is charged to the user's rate limit, and
+    the stream waits for the bucket to refill when it is empty.
+    """
+    if len(bulk_req.notes) > SUMMARY_BULK_MAX_NOTES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {SUMMARY_BULK_MAX_NOTES} notes can be summarized per request"
+        )
+    tier = current_user.get("subscription_tier", "personal")
+    model_name = bulk_req.model
+    logger.info(f"Processing bulk summarization of {len(bulk_req.notes)} notes for tier: {tier}")
+
+    # Loading a model is inference work too, so it waits for admission like any other
+    async with inference_scheduler.slot(tier):
+        model_instance = await inference_placement.run(get_model_for_tier, tier, model_name)
+    model, tokenizer = model_instance["model"], model_instance["tokenizer"]
+    states, batches = await run_in_threadpool(plan_bulk, bulk_req.notes, tokenizer, model_name)
+
+    def note_line(state) -> bytes:
+        if state["failed"]:
+            line = {"id": state["id"], "error": state["error"]}
+        else:
+            line = {
+                "id": state["id"],
+                "summary": finish_summary(state["summaries"]),
+                "chunks": len(state["summaries"]),
+                "cached": state["cached"]
+            }
+        return (json.dumps(line) + "\n").encode("utf-8")
+
+    def run_batch(chunks: List[str], compression_ratio: float):
+        batch_start = time.perf_counter()
+        with profiling.torch_profile(f"summarize batch {model_name}"):
+            summaries = summarize_batch(model, chunks, compression_ratio)
+        elapsed = time.perf_counter() - batch_start
+        generated = sum(len(tokenizer(summary).input_ids) for summary in summaries)
+        metrics.summary_batch_size.labels(model_name).observe(len(chunks))
+        metrics.model_inference_seconds.labels(model_name).observe(elapsed)
+        metrics.model_generated_tokens.labels(model_name).inc(generated)
+        if elapsed > 0:
+            metrics.model_tokens_per_second.labels(model_name).observe(generated / elapsed)
+        return summaries, generated
+
+    async def stream():
+        start = time.perf_counter()
+        generated = 0
+        for state in states:
+            metrics.summary_chunks.labels(model_name).observe(len(state["summaries"]))
+            if state["pending"] == 0:
+                yield note_line(state)
+
+        for batch in batches:
+            try:
+                await wait_for_rate_limit(current_user)
+                async with inference_scheduler.slot(tier):
+                    summaries, batch_generated = await inference_placement.run(
+                        run_batch, [item["chunk"] for item in batch], batch[0]["ratio"]
+                    )
+            except Exception as e:
+                logger.error(f"Error generating batch summary: {str(e)}")
+                detail = e.detail if isinstance(e, HTTPException) else str(e)
+                for item in batch:
+                    for note_index, _ in item["targets"]:
+                        state = states[note_index]
+                        if not state["failed"]:
+                            state["failed"], state["error"] = True, f"Failed to generate summary: {detail}"
+                            yield note_line(state)
+                continue
+
+            generated += batch_generated
+            for item, summary in zip(batch, summaries):
+                chunk_summary_cache.set(item["key"], summary)
+                for note_index, chunk_index in item["targets"]:
+                    state = states[note_index]
+                    state["summaries"][chunk_index] = summary
+                    state["pending"] -= 1
+                    if state["pending"] == 0 and not state["failed"]:
+                        yield note_line(state)
+
+        elapsed = time.perf_counter() - start
+        chunks = sum(len(state["summaries"]) for state in states)
+        computed = sum(len(batch) for batch in batches)
+        summary = {
+            "done": True,
+            "notes": len(states),
+            "failed": sum(state["failed"] for state in states),
+            "chunks": chunks,
+            "computed_chunks": computed,
+            "batches": len(batches),
+            "seconds": round(elapsed, 3),
+            "notes_per_second": round(len(states) / elapsed, 3) if elapsed > 0 else None,
+            "generated_tokens": generated,
+            "tokens_per_second": round(generated / elapsed, 1) if elapsed > 0 else None
+        }
+        logger.info(f"Bulk summarization of {len(states)} notes with {model_name} finished in {elapsed:.2f}s")
+        yield (json.dumps(summary) + "\n").encode("utf-8")
+
+    # The rate-limit headers set on the injected response do not reach a returned one
+    headers = {name: value for name, value in response.headers.items() if name.startswith("x-ratelimit-")}
+    return StreamingResponse(stream(), media_type="application/x-ndjson", headers=headers)
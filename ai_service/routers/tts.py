@@ -1,50 +1,129 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import Optional
 from tts_service import TTSService
+from uploads import iter_string_chunks, write_base64_stream
+import metrics
+import os
+import time
 
 router = APIRouter()
-tts_service = TTSService()
+
+# The API server never plays audio itself unless explicitly configured to
+TTS_HEADLESS = os.getenv("TTS_HEADLESS", "true").lower() in ("1", "true", "yes")
+tts_service = TTSService(headless=TTS_HEADLESS)
+metrics.register_cache("tts_audio", tts_service.cache.stats)
 
 class TTSRequest(BaseModel):
     text: str
     lang: Optional[str] = 'en'
-    play_audio: Optional[bool] = True
+    play_audio: Optional[bool] = False
+    return_audio: Optional[bool] = False
+
+def audio_url(request: Request, audio_file: str) -> str:
+    return str(request.url_for("get_audio", filename=os.path.basename(audio_file)))
 
 @router.post("/Text-to-speech")
-async def text_to_speech(request: TTSRequest):
+async def text_to_speech(request: Request, tts_request: TTSRequest):
+    """Synthesize speech off the event loop and hand the audio back.
+
+    With ``return_audio`` the MP3 bytes are the response body, otherwise the
+    response carries a URL the client can fetch (or stream) the clip from.
+    """
     try:
-        audio_file = tts_service.text_to_speech(
-            text=request.text,
-            lang=request.lang,
-            play_audio=request.play_audio
-        )
+        with metrics.tts_job_seconds.labels("file").time():
+            audio_file = await run_in_threadpool(
+                tts_service.text_to_speech,
+                text=tts_request.text,
+                lang=tts_request.lang,
+                play_audio=tts_request.play_audio
+            )
         if audio_file:
+            if tts_request.return_audio:
+                return FileResponse(
+                    audio_file,
+                    media_type="audio/mpeg",
+                    filename=os.path.basename(audio_file)
+                )
             return {
                 "status": "success",
                 "message": "Text converted to speech successfully",
-                "audio_file": audio_file
+                "audio_file": audio_file,
+                "audio_url": audio_url(request, audio_file)
             }
         else:
             raise HTTPException(status_code=500, detail="Failed to convert text to speech")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def timed_stream(chunks):
+    """Record the time until a streamed clip has been fully produced."""
+    start = time.perf_counter()
+    yield from chunks
+    metrics.tts_job_seconds.labels("stream").observe(time.perf_counter() - start)
+
+@router.post("/Text-to-speech/stream")
+async def stream_text_to_speech(tts_request: TTSRequest):
+    """Stream MP3 audio to the client sentence by sentence as it is synthesized."""
+    if not tts_request.text.strip():
+        raise HTTPException(status_code=400, detail="No text to speak")
+    return StreamingResponse(
+        timed_stream(tts_service.stream_speech(tts_request.text, tts_request.lang)),
+        media_type="audio/mpeg"
+    )
+
 @router.post("/base64-to-audio")
-async def base64_to_audio(base64_string: str, filename: Optional[str] = "audio.mp3", play_audio: Optional[bool] = True):
+async def base64_to_audio(
+    request: Request,
+    base64_string: Optional[str] = None,
+    filename: Optional[str] = "audio.mp3",
+    play_audio: Optional[bool] = False
+):
+    """Decode base64 audio to disk chunk by chunk.
+
+    The payload is streamed from the raw request body; the ``base64_string``
+    query parameter is still accepted for older clients.
+    """
     try:
-        audio_file = tts_service.save_base64_audio(
-            base64_string=base64_string,
-            filename=filename,
-            play_audio=play_audio
-        )
-        if audio_file:
-            return {
-                "status": "success",
-                "message": "Base64 audio saved and played successfully",
-                "audio_file": audio_file
-            }
+        if base64_string:
+            chunks = iter_string_chunks(base64_string)
         else:
-            raise HTTPException(status_code=500, detail="Failed to process base64 audio")
+            chunks = request.stream()
+        
+        try:
+            audio_file = tts_service.output_path(filename)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        await write_base64_stream(chunks, audio_file)
+        await run_in_threadpool(tts_service.trim_uploads)
+        
+        if play_audio:
+            await run_in_threadpool(tts_service.play_file, audio_file)
+        
+        return {
+            "status": "success",
+            "message": "Base64 audio saved successfully",
+            "audio_file": audio_file,
+            "audio_url": audio_url(request, audio_file)
+        }
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/Text-to-speech/cache")
+async def tts_cache_stats():
+    """Report hit/miss counts and disk usage of the synthesized audio cache."""
+    return tts_service.cache.stats()
+
+@router.get("/audio/{filename}", name="get_audio")
+async def get_audio(filename: str):
+    """Serve a synthesized or uploaded clip."""
+    audio_file = tts_service.audio_path(filename)
+    if audio_file is None:
+        raise HTTPException(status_code=404, detail="Audio file not found")
+    return FileResponse(audio_file, media_type="audio/mpeg")
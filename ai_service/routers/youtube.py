@@ -1,10 +1,14 @@
 from fastapi import APIRouter, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
-from typing import List
-from googleapiclient.discovery import build
+from typing import List, Optional
 from googleapiclient.errors import HttpError
+from caching import TTLCache
+from video_index import VideoIndex, extract_keywords
+import metrics
 import os
+import threading
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -15,8 +19,73 @@ router = APIRouter()
 # Get API key from environment
 YOUTUBE_API_KEY = os.getenv("YOUTUBE_API_KEY")
 
+# Optional override of the API root, e.g. a local stub server for testing
+YOUTUBE_API_ENDPOINT = os.getenv("YOUTUBE_API_ENDPOINT")
+
+# Cache of normalized query -> search results, to save quota on popular topics
+YT_CACHE_TTL = float(os.getenv("YT_CACHE_TTL", 6 * 3600))
+YT_CACHE_SIZE = int(os.getenv("YT_CACHE_SIZE", 2048))
+search_cache = TTLCache(maxsize=YT_CACHE_SIZE, ttl=YT_CACHE_TTL)
+metrics.register_cache("youtube_search", search_cache.stats)
+
+# The discovery-based client is built once per process. httplib2 connections
+# are not thread-safe, so each worker thread executes requests on its own.
+_youtube_client = None
+_client_lock = threading.Lock()
+_thread_local = threading.local()
+
+def get_youtube_client():
+    """Return the process-wide YouTube client, building it on first use."""
+    global _youtube_client
+    if _youtube_client is None:
+        with _client_lock:
+            if _youtube_client is None:
+                # discovery pulls in the generated API surface; load it on first search
+                from googleapiclient.discovery import build
+                client_options = {"api_endpoint": YOUTUBE_API_ENDPOINT} if YOUTUBE_API_ENDPOINT else None
+                _youtube_client = build(
+                    "youtube", "v3",
+                    developerKey=YOUTUBE_API_KEY,
+                    client_options=client_options,
+                    static_discovery=True,
+                    cache_discovery=False
+                )
+    return _youtube_client
+
+def _thread_http():
+    http = getattr(_thread_local, "http", None)
+    if http is None:
+        from googleapiclient.http import build_http
+        http = _thread_local.http = build_http()
+    return http
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+class SearchUnavailable(Exception):
+    """The search API could not be reached (timeout, DNS or connection failure)."""
+
+def search_videos(query: str, max_results: int) -> dict:
+    """Run the blocking search call; meant to be executed off the event loop."""
+    http = _thread_http()
+    # Already loaded by build_http
+    import httplib2
+    try:
+        return get_youtube_client().search().list(
+            q=query,
+            part="snippet",
+            type="video",
+            maxResults=max_results,
+            relevanceLanguage="en",  # Prefer English results
+            safeSearch="strict"  # Use strict safe search
+        ).execute(http=http)
+    except (OSError, httplib2.HttpLib2Error) as e:
+        # socket.timeout, socket.gaierror and refused connections are all OSErrors
+        raise SearchUnavailable(str(e) or type(e).__name__) from e
+
 class YouTubeSearchRequest(BaseModel):
-    query: str
+    query: str = ""
+    note_text: Optional[str] = None
     max_results: int = 5
 
 class YouTubeSearchResponse(BaseModel):
@@ -73,38 +142,67 @@ MOCK_VIDEO_DATABASE = {
     ],
 }
 
+# Offline catalog, loaded from YT_CATALOG_PATH when set. Suggestions are served
+# from this index first; the live API is only queried on an index miss.
+YT_CATALOG_PATH = os.getenv("YT_CATALOG_PATH")
+YT_INDEX_MIN_SCORE = float(os.getenv("YT_INDEX_MIN_SCORE", 0.2))
+video_index = VideoIndex.from_file(YT_CATALOG_PATH) if YT_CATALOG_PATH else VideoIndex(MOCK_VIDEO_DATABASE)
+
+def to_response(videos: list) -> YouTubeSearchResponse:
+    return YouTubeSearchResponse(
+        video_titles=[video["title"] for video in videos],
+        video_links=[f"https://www.youtube.com/watch?v={video['video_id']}" for video in videos],
+        channel_names=[video["channel"] for video in videos]
+    )
+
 @router.post("/YtSuggestion", response_model=YouTubeSearchResponse)
 async def suggest_youtube_video(request: YouTubeSearchRequest):
     try:
+        max_results = min(request.max_results, 10)  # Cap at 10 results
+
+        # Derive the query from the note itself when one is supplied
+        query = request.query
+        if request.note_text:
+            keywords = extract_keywords(request.note_text, vocabulary=video_index.vocabulary())
+            query = f"{query} {' '.join(keywords)}"
+        query = normalize_query(query)
+        if not query:
+            raise HTTPException(status_code=400, detail="A search query or note text is required.")
+
+        videos = video_index.search(query, limit=max_results, min_score=YT_INDEX_MIN_SCORE)
+        if videos:
+            return to_response(videos)
+
         if not YOUTUBE_API_KEY:
+            if video_index.default_videos:
+                return to_response(video_index.default_videos[:max_results])
             raise HTTPException(
                 status_code=500,
                 detail="YouTube API key not found. Please check your environment configuration."
             )
 
-        # Initialize the YouTube API client
-        youtube = build("youtube", "v3", developerKey=YOUTUBE_API_KEY)
-        
-        # Make the search request
-        search_response = youtube.search().list(
-            q=request.query,
-            part="snippet",
-            type="video",
-            maxResults=min(request.max_results, 10),  # Cap at 10 results
-            relevanceLanguage="en",  # Prefer English results
-            safeSearch="strict"  # Use strict safe search
-        ).execute()
+        cache_key = (query, max_results)
+
+        result = search_cache.get(cache_key)
+        if result is None:
+            # Make the search request in the threadpool
+            search_response = await run_in_threadpool(search_videos, query, max_results)
+
+            video_titles = []
+            video_links = []
+            channel_names = []
+
+            # Process search results
+            for item in search_response.get("items", []):
+                if "id" in item and "videoId" in item["id"]:
+                    video_titles.append(item["snippet"]["title"])
+                    video_links.append(f"https://www.youtube.com/watch?v={item['id']['videoId']}")
+                    channel_names.append(item["snippet"]["channelTitle"])
 
-        video_titles = []
-        video_links = []
-        channel_names = []
+            result = (video_titles, video_links, channel_names)
+            search_cache.set(cache_key, result)
 
-        # Process search results
-        for item in search_response.get("items", []):
-            if "id" in item and "videoId" in item["id"]:
-                video_titles.append(item["snippet"]["title"])
-                video_links.append(f"https://www.youtube.com/watch?v={item['id']['videoId']}")
-                channel_names.append(item["snippet"]["channelTitle"])
+        video_titles, video_links, channel_names = result
 
         if not video_titles:
             raise HTTPException(
@@ -118,13 +216,27 @@ async def suggest_youtube_video(request: YouTubeSearchRequest):
             channel_names=channel_names
         )
 
+    except HTTPException:
+        raise
     except HttpError as e:
+        # Quota exhausted or API unavailable: fall back to the offline catalog
+        if video_index.default_videos:
+            return to_response(video_index.default_videos[:max_results])
+
         # Handle YouTube API specific errors
         error_message = e.error_details[0]["message"] if e.error_details else str(e)
         raise HTTPException(
             status_code=e.resp.status,
             detail=f"YouTube API error: {error_message}"
         )
+    except SearchUnavailable as e:
+        # Network trouble on the way to the API: same fallback as an API error
+        if video_index.default_videos:
+            return to_response(video_index.default_videos[:max_results])
+        raise HTTPException(
+            status_code=503,
+            detail=f"YouTube API unreachable: {str(e)}"
+        )
     except Exception as e:
         # Handle other errors
         raise HTTPException(
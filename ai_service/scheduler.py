@@ -0,0 +1,225 @@
+import asyncio
+import itertools
+import logging
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from fastapi import HTTPException
+import deadlines
+import metrics
+from placement import inference_placement, tracking_calls
+
+logger = logging.getLogger(__name__)
+
+# Number of inference calls allowed to run at the same time, by default one per placement slot
+INFERENCE_CONCURRENCY = int(os.getenv("INFERENCE_CONCURRENCY", len(inference_placement.slots)))
+
+# Per-tier scheduling policy:
+#   weight   - share of inference slots under contention
+#   max_queue - waiting requests beyond this are rejected with 503
+#   slo      - queue-wait target in seconds, reported as SLO misses
+#   max_wait - starvation bound: a request waiting longer is admitted next
+TIER_POLICIES = {
+    "corporate": {
+        "weight": float(os.getenv("SCHED_CORPORATE_WEIGHT", 4)),
+        "max_queue": int(os.getenv("SCHED_CORPORATE_MAX_QUEUE", 64)),
+        "slo": float(os.getenv("SCHED_CORPORATE_SLO", 2.0)),
+        "max_wait": float(os.getenv("SCHED_CORPORATE_MAX_WAIT", 5.0))
+    },
+    "personal": {
+        "weight": float(os.getenv("SCHED_PERSONAL_WEIGHT", 1)),
+        "max_queue": int(os.getenv("SCHED_PERSONAL_MAX_QUEUE", 32)),
+        "slo": float(os.getenv("SCHED_PERSONAL_SLO", 10.0)),
+        "max_wait": float(os.getenv("SCHED_PERSONAL_MAX_WAIT", 30.0))
+    }
+}
+
+# Number of recent queue waits kept per tier for percentile reporting
+WAIT_SAMPLE_SIZE = 1024
+# How often a queued request checks whether its deadline was cancelled
+DEADLINE_POLL_INTERVAL = 0.1
+
+
+class _Waiter:
+    __slots__ = ("tier", "finish_tag", "enqueued", "future", "seq")
+
+    def __init__(self, tier, finish_tag, future, seq):
+        self.tier = tier
+        self.finish_tag = finish_tag
+        self.enqueued = time.monotonic()
+        self.future = future
+        self.seq = seq
+
+
+class InferenceScheduler:
+    """Weighted fair-queuing admission control in front of model inference.
+
+    Each request gets a virtual finish tag ``max(virtual_time, last tag of its
+    tier) + 1 / weight``; when a slot frees up the queued request with the
+    smallest tag is admitted, so under contention tiers share slots in
+    proportion to their weights while an idle tier's share goes to the rest.
+    A request that has waited past its tier's ``max_wait`` is admitted ahead
+    of any tag order, which bounds starvation of low-weight tiers.
+    """
+
+    def __init__(self, concurrency=INFERENCE_CONCURRENCY, policies=None):
+        self.concurrency = concurrency
+        self.policies = policies or TIER_POLICIES
+        self.active = 0
+        self.virtual_time = 0.0
+        self._queues = {tier: deque() for tier in self.policies}
+        self._last_tag = {tier: 0.0 for tier in self.policies}
+        self._seq = itertools.count()
+        self._stats = {
+            tier: {
+                "admitted": 0,
+                "rejected": 0,
+                "slo_misses": 0,
+                "starvation_promotions": 0,
+                "waits": deque(maxlen=WAIT_SAMPLE_SIZE)
+            }
+            for tier in self.policies
+        }
+
+    def _tier(self, tier):
+        return tier if tier in self.policies else "personal"
+
+    @asynccontextmanager
+    async def slot(self, tier: str):
+        """Wait for an inference slot for a request of ``tier``; release it on exit.
+
+        If the block exits (e.g. is cancelled) while a call it started with
+        ``inference_placement.run`` is still running, the slot is released
+        when that call finishes instead.
+        """
+        tier = self._tier(tier)
+        await self._acquire(tier)
+        calls = []
+        try:
+            with tracking_calls() as calls:
+                yield
+        finally:
+            running = [call for call in calls if not call.done()]
+            if running:
+                asyncio.gather(*running, return_exceptions=True).add_done_callback(lambda _: self._release())
+            else:
+                self._release()
+
+    async def _acquire(self, tier):
+        policy = self.policies[tier]
+        queue = self._queues[tier]
+
+        if self.active < self.concurrency and not any(self._queues.values()):
+            self.active += 1
+            self._record_wait(tier, 0.0)
+            return
+
+        if len(queue) >= policy["max_queue"]:
+            self._stats[tier]["rejected"] += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Inference queue is full, please retry later",
+                headers={"Retry-After": str(max(1, int(policy["slo"])))}
+            )
+
+        finish_tag = max(self.virtual_time, self._last_tag[tier]) + 1.0 / policy["weight"]
+        self._last_tag[tier] = finish_tag
+        waiter = _Waiter(tier, finish_tag, asyncio.get_running_loop().create_future(), next(self._seq))
+        queue.append(waiter)
+
+        try:
+            await self._wait_admitted(waiter, deadlines.current())
+        except BaseException:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Admitted at the same moment the request gave up
+                self._release()
+            else:
+                queue.remove(waiter)
+            raise
+
+        self._record_wait(tier, time.monotonic() - waiter.enqueued)
+
+    async def _wait_admitted(self, waiter, deadline):
+        """Wait for ``waiter`` to be admitted, giving up once its request's deadline does."""
+        if deadline is None:
+            await waiter.future
+            return
+        while not waiter.future.done():
+            # Nobody is waiting for the answer any more: leave the queue (499)
+            deadline.check()
+            remaining = deadline.remaining()
+            if remaining <= 0:
+                raise HTTPException(
+                    status_code=504,
+                    detail="Request deadline passed while waiting for an inference slot"
+                )
+            # Does not cancel the future on timeout, so the queue position is kept
+            await asyncio.wait({waiter.future}, timeout=min(remaining, DEADLINE_POLL_INTERVAL))
+
+    def _release(self):
+        self.active -= 1
+        while self.active < self.concurrency:
+            waiter = self._next_waiter()
+            if waiter is None:
+                return
+            self._queues[waiter.tier].popleft()
+            self.virtual_time = max(self.virtual_time, waiter.finish_tag)
+            self.active += 1
+            waiter.future.set_result(None)
+
+    def _next_waiter(self):
+        now = time.monotonic()
+        heads = [queue[0] for queue in self._queues.values() if queue]
+        if not heads:
+            return None
+
+        starving = [w for w in heads if now - w.enqueued > self.policies[w.tier]["max_wait"]]
+        if starving:
+            waiter = min(starving, key=lambda w: w.enqueued)
+            if waiter is not min(heads, key=lambda w: (w.finish_tag, w.seq)):
+                self._stats[waiter.tier]["starvation_promotions"] += 1
+            return waiter
+        return min(heads, key=lambda w: (w.finish_tag, w.seq))
+
+    def _record_wait(self, tier, wait):
+        metrics.inference_queue_wait.labels(tier).observe(wait)
+        stats = self._stats[tier]
+        stats["admitted"] += 1
+        stats["waits"].append(wait)
+        if wait > self.policies[tier]["slo"]:
+            stats["slo_misses"] += 1
+            logger.warning("%s request waited %.2fs for inference, SLO is %.2fs", tier, wait, self.policies[tier]["slo"])
+
+    def stats(self) -> dict:
+        """Queue depth, admissions and queue-wait percentiles per tier."""
+        report = {"concurrency": self.concurrency, "active": self.active, "tiers": {}}
+        for tier, stats in self._stats.items():
+            waits = sorted(stats["waits"])
+
+            def percentile(p):
+                return waits[min(len(waits) - 1, int(p * len(waits)))] if waits else 0.0
+
+            report["tiers"][tier] = {
+                "queued": len(self._queues[tier]),
+                "admitted": stats["admitted"],
+                "rejected": stats["rejected"],
+                "slo_seconds": self.policies[tier]["slo"],
+                "slo_misses": stats["slo_misses"],
+                "starvation_promotions": stats["starvation_promotions"],
+                "wait_p50": percentile(0.50),
+                "wait_p95": percentile(0.95),
+                "wait_p99": percentile(0.99)
+            }
+        return report
+
+
+# Shared by the summarizer and /models/generate so both draw from one pool of slots
+inference_scheduler = InferenceScheduler()
+
+
+def _queue_depths():
+    return {(tier,): len(queue) for tier, queue in inference_scheduler._queues.items()}
+
+
+metrics.inference_queue_depth.add_source(_queue_depths)
@@ -0,0 +1,193 @@
+"""Serve the AI service from several workers that share preloaded models.
+
+Run from the ai_service directory:
+
+    python serve.py --workers 4 --preload personal:distilbart-cnn-12-6 --preload-generate personal:bart-base
+
+The parent process imports the app, loads the summarizer models named by
+``--preload`` (or SERVE_PRELOAD_MODELS) and the ``/models/generate`` models
+named by ``--preload-generate`` (or SERVE_PRELOAD_GENERATE_MODELS) and gets
+them ready for sharing, then binds the
+listening socket and forks the workers. Each worker inherits the weights
+instead of loading its own copy, so adding a worker costs roughly the
+interpreter and request-handling memory rather than another copy of every
+model. Dead workers are restarted; SIGINT/SIGTERM shut everything down.
+
+With more than one worker, /metrics on whichever worker is scraped reports
+all of them: the workers share samples through METRICS_MULTIPROC_DIR (a
+temporary directory by default), see metrics.py.
+
+``uvicorn --workers`` starts workers with spawn, which re-imports the app in
+each of them, so it cannot share anything loaded in the parent.
+"""
+import argparse
+import gc
+import logging
+import os
+import shutil
+import signal
+import tempfile
+import time
+import uvicorn
+import metrics
+
+logger = logging.getLogger(__name__)
+
+SERVE_WORKERS = int(os.getenv("SERVE_WORKERS", 1))
+# Comma-separated "tier:model" pairs, e.g. "personal:distilbart-cnn-12-6"
+SERVE_PRELOAD_MODELS = os.getenv("SERVE_PRELOAD_MODELS", "")
+# Same format with ModelFactory ids, e.g. "personal:bart-base"
+SERVE_PRELOAD_GENERATE_MODELS = os.getenv("SERVE_PRELOAD_GENERATE_MODELS", "")
+# "shm" moves weights into shared memory, "cow" relies on copy-on-write only
+SERVE_SHARE_MODE = os.getenv("SERVE_SHARE_MODE", "shm")
+
+# A worker exiting sooner than this after starting is restarted with a delay
+MIN_WORKER_UPTIME = 1.0
+
+
+def parse_preload(spec: str):
+    """Parse "tier:model,tier:model" into a list of (tier, model) pairs."""
+    pairs = []
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        tier, sep, model_name = item.partition(":")
+        if not sep or not model_name:
+            raise ValueError(f"Invalid preload entry {item!r}, expected tier:model")
+        pairs.append((tier.strip(), model_name.strip()))
+    return pairs
+
+
+def load_app(preload, share_mode: str, preload_generate=()):
+    """Import the app in the parent and preload the requested models."""
+    import main
+    from routers import summarizer
+
+    if preload or preload_generate:
+        start = time.perf_counter()
+        summarizer.preload_models(preload, preload_generate)
+        summarizer.prepare_for_fork(share_memory=(share_mode == "shm"))
+        logger.info("Preloaded %d model(s) in %.1fs", len(preload) + len(preload_generate), time.perf_counter() - start)
+
+    # Keep the collector from writing to every inherited object header, which
+    # would copy the parent's pages into each worker
+    gc.collect()
+    gc.freeze()
+    return main.app
+
+
+def place_worker(index: int, workers: int):
+    """Give each worker its own block of cores to split into inference slots."""
+    import placement
+    from scheduler import inference_scheduler
+
+    placement.inference_placement.configure(
+        cores=placement.share_of_cores(index, workers),
+        slots=placement.INFERENCE_SLOTS,
+        threads_per_slot=placement.INFERENCE_THREADS_PER_SLOT
+    )
+    if not os.getenv("INFERENCE_CONCURRENCY"):
+        inference_scheduler.concurrency = len(placement.inference_placement.slots)
+
+
+class Supervisor:
+    def __init__(self, config: uvicorn.Config, workers: int):
+        self.config = config
+        self.workers = workers
+        self.children = {}
+        self.stopping = False
+
+    def spawn(self, index: int, sock):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                # Own process group, so a terminal Ctrl-C reaches only the supervisor
+                os.setpgid(0, 0)
+                signal.signal(signal.SIGINT, signal.SIG_DFL)
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                place_worker(index, self.workers)
+                metrics.init_worker()
+                uvicorn.Server(self.config).run(sockets=[sock])
+            except BaseException:
+                logger.exception("Worker %d crashed", index)
+                code = 1
+            finally:
+                os._exit(code)
+        self.children[pid] = (index, time.monotonic())
+        logger.info("Started worker %d (pid %d)", index, pid)
+
+    def stop(self, signum, frame):
+        self.stopping = True
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def share_metrics(self):
+        """Point the workers at a shared metrics directory; returns it if it is temporary."""
+        if self.workers < 2:
+            return None
+        directory = metrics.METRICS_MULTIPROC_DIR
+        temporary = None
+        if directory:
+            # Snapshots of a previous run would be summed in as dead workers
+            for name in os.listdir(directory) if os.path.isdir(directory) else []:
+                if name.endswith(".json"):
+                    os.remove(os.path.join(directory, name))
+        else:
+            directory = temporary = tempfile.mkdtemp(prefix="ai-service-metrics-")
+        metrics.enable_multiprocess(directory)
+        metrics.write_snapshot(cumulative_only=True)
+        return temporary
+
+    def run(self):
+        metrics_dir = self.share_metrics()
+        sock = self.config.bind_socket()
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+        for index in range(self.workers):
+            self.spawn(index, sock)
+
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            index, started = self.children.pop(pid, (None, 0.0))
+            if index is None or self.stopping:
+                continue
+            logger.warning("Worker %d (pid %d) exited with status %d, restarting", index, pid, status)
+            if time.monotonic() - started < MIN_WORKER_UPTIME:
+                time.sleep(MIN_WORKER_UPTIME)
+            self.spawn(index, sock)
+        sock.close()
+        if metrics_dir:
+            shutil.rmtree(metrics_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", 5001)))
+    parser.add_argument("--workers", type=int, default=SERVE_WORKERS)
+    parser.add_argument("--preload", default=SERVE_PRELOAD_MODELS, help="comma-separated tier:model pairs")
+    parser.add_argument("--preload-generate", default=SERVE_PRELOAD_GENERATE_MODELS,
+                        help="comma-separated tier:model pairs for /models/generate")
+    parser.add_argument("--share-mode", choices=["shm", "cow"], default=SERVE_SHARE_MODE)
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=args.log_level.upper(),
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    app = load_app(parse_preload(args.preload), args.share_mode, parse_preload(args.preload_generate))
+    config = uvicorn.Config(app, host=args.host, port=args.port, log_level=args.log_level)
+    Supervisor(config, max(1, args.workers)).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+import os
+import sys
+import tempfile
+import pytest
+
+# Tests import the service's modules the way uvicorn does, from ai_service/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Keep anything the app writes out of the working tree
+_scratch = tempfile.mkdtemp(prefix="ai_service_tests_")
+os.environ.setdefault("JOBS_DB_PATH", os.path.join(_scratch, "jobs.db"))
+os.environ.setdefault("JOBS_SPOOL_DIR", os.path.join(_scratch, "job_inputs"))
+os.environ.setdefault("JOBS_CONCURRENCY", "0")
+
+
+@pytest.fixture
+def client():
+    from fastapi.testclient import TestClient
+    import main
+
+    return TestClient(main.app)
+
+
+@pytest.fixture
+def auth_headers():
+    from auth.auth_handler import create_access_token
+
+    def headers(tier: str = "personal", user: str = "test-user"):
+        token = create_access_token({"sub": user, "subscription_tier": tier})
+        return {"Authorization": f"Bearer {token}"}
+
+    return headers
@@ -0,0 +1,147 @@
+import time
+import pytest
+from jobs import CANCELLED, FAILED, QUEUED, RUNNING, SUCCEEDED, JobStore
+
+LEASE = 0.1
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / "jobs.db"), max_attempts=2, lease_seconds=LEASE, result_ttl=60)
+
+
+def submit(store, kind="summarize"):
+    return store.submit(kind, {"text": "a note"}, owner="owner", tier="personal")
+
+
+def test_claim_leases_the_oldest_queued_job(store):
+    first = submit(store)
+    second = submit(store)
+
+    job = store.claim("worker-a")
+
+    assert job["id"] == first["id"]
+    assert job["status"] == RUNNING
+    assert job["worker"] == "worker-a"
+    assert job["attempts"] == 1
+    assert store.claim("worker-b")["id"] == second["id"]
+    assert store.claim("worker-c") is None
+
+
+def test_expired_lease_is_claimed_again(store):
+    submitted = submit(store)
+    store.claim("crashed")
+    assert store.claim("worker-b") is None
+
+    time.sleep(LEASE * 1.5)
+    job = store.claim("worker-b")
+
+    assert job["id"] == submitted["id"]
+    assert job["worker"] == "worker-b"
+    assert job["attempts"] == 2
+    # The crashed worker can neither extend nor finish a lease it lost
+    assert store.heartbeat(job["id"], "crashed") is None
+    assert not store.finish(job["id"], "crashed", SUCCEEDED, {"summary": "stale"})
+    assert store.finish(job["id"], "worker-b", SUCCEEDED, {"summary": "fresh"})
+    assert store.get(job["id"])["result"] == {"summary": "fresh"}
+
+
+def test_job_fails_when_its_final_attempt_stops_responding(store):
+    submitted = submit(store)
+    for worker in ("first", "second"):
+        store.claim(worker)
+        time.sleep(LEASE * 1.5)
+
+    assert store.claim("third") is None
+    job = store.get(submitted["id"])
+    assert job["status"] == FAILED
+    assert job["attempts"] == 2
+    assert "final attempt" in job["error"]
+
+
+def test_cancel_is_seen_by_the_running_worker(store):
+    queued = submit(store)
+    running = submit(store)
+    # Oldest first: take the one queued earlier out of the way
+    assert store.cancel(queued["id"])["status"] == CANCELLED
+    job = store.claim("worker")
+    assert job["id"] == running["id"]
+
+    assert store.heartbeat(job["id"], "worker") is False
+    assert store.cancel(job["id"])["status"] == RUNNING
+    assert store.heartbeat(job["id"], "worker") is True
+
+    # Whatever the handler returns afterwards is dropped
+    assert store.finish(job["id"], "worker", SUCCEEDED, {"summary": "late"})
+    job = store.get(job["id"])
+    assert job["status"] == CANCELLED
+    assert job["result"] is None
+
+
+def test_purge_removes_expired_results(store):
+    expired = submit(store)
+    kept = submit(store)
+    store.result_ttl = 0
+    store.claim("worker")
+    store.finish(expired["id"], "worker", SUCCEEDED, {"summary": "done"})
+
+    purged = store.purge_expired()
+
+    assert [job["id"] for job in purged] == [expired["id"]]
+    assert store.get(expired["id"]) is None
+    assert store.get(kept["id"])["status"] == QUEUED
+
+
+def test_job_api_round_trip(client, auth_headers, monkeypatch, tmp_path):
+    from routers import jobs
+
+    monkeypatch.setattr(jobs, "job_store", JobStore(str(tmp_path / "api.db")))
+    owner, stranger = auth_headers(user="owner"), auth_headers(user="stranger")
+
+    response = client.post(
+        "/jobs/summarize",
+        json={"text": "A note long enough to summarize.", "model": "distilbart-cnn-12-6"},
+        headers=owner
+    )
+    assert response.status_code == 202, response.text
+    submitted = response.json()
+    assert submitted["status"] == QUEUED
+
+    status = client.get(submitted["status_url"], headers=owner)
+    assert status.status_code == 200
+    assert status.json()["job_id"] == submitted["job_id"]
+    assert status.json()["status"] == QUEUED
+
+    # Someone else's job does not exist as far as they can tell
+    assert client.get(submitted["status_url"], headers=stranger).status_code == 404
+    assert client.delete(submitted["status_url"], headers=stranger).status_code == 404
+
+    cancelled = client.delete(submitted["status_url"], headers=owner)
+    assert cancelled.status_code == 200
+    assert cancelled.json()["status"] == CANCELLED
+    assert client.get(submitted["status_url"], headers=owner).json()["status"] == CANCELLED
+
+
+def test_runner_executes_queued_jobs(store):
+    import asyncio
+    from jobs import JobRunner
+
+    async def handler(ctx):
+        return {"echo": ctx.payload["text"]}
+
+    async def scenario():
+        runner = JobRunner(store, {"summarize": handler}, concurrency=1)
+        runner.start()
+        try:
+            submitted = submit(store)
+            runner.notify()
+            for _ in range(100):
+                job = store.get(submitted["id"])
+                if job["status"] == SUCCEEDED:
+                    return job
+                await asyncio.sleep(0.02)
+        finally:
+            await runner.stop()
+
+    job = asyncio.run(scenario())
+    assert job is not None and job["result"] == {"echo": "a note"}
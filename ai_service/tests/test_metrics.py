@@ -0,0 +1,69 @@
+import os
+import metrics
+
+
+def test_text_format_and_label_escaping(monkeypatch):
+    monkeypatch.setattr(metrics, "_multiproc_dir", None)
+    requests = metrics.Counter("test_format_requests_total", "Requests by path", ["path"])
+    latency = metrics.Histogram("test_format_latency_seconds", "Latency", buckets=(0.1, 1.0))
+
+    requests.labels('a\\b"c\nd').inc(2)
+    for value in (0.05, 0.5, 5.0):
+        latency.observe(value)
+    lines = metrics.generate_latest().splitlines()
+
+    assert "# HELP test_format_requests_total Requests by path" in lines
+    assert "# TYPE test_format_requests_total counter" in lines
+    assert 'test_format_requests_total{path="a\\\\b\\"c\\nd"} 2.0' in lines
+    assert "# TYPE test_format_latency_seconds histogram" in lines
+    # Buckets are cumulative and end with +Inf, which equals the count
+    assert 'test_format_latency_seconds_bucket{le="0.1"} 1' in lines
+    assert 'test_format_latency_seconds_bucket{le="1.0"} 2' in lines
+    assert 'test_format_latency_seconds_bucket{le="+Inf"} 3' in lines
+    assert "test_format_latency_seconds_sum 5.55" in lines
+    assert "test_format_latency_seconds_count 3" in lines
+
+
+def test_workers_are_aggregated(monkeypatch, tmp_path):
+    monkeypatch.setattr(metrics, "_multiproc_dir", None)
+    served = metrics.Counter("test_workers_served_total", "Requests served")
+    busy = metrics.Gauge("test_workers_busy", "Requests in progress")
+    metrics.enable_multiprocess(str(tmp_path))
+
+    # Counted by the supervisor before the fork: must not be counted again per worker
+    served.inc()
+    metrics.write_snapshot(cumulative_only=True)
+
+    ready_read, ready_write = os.pipe()
+    release_read, release_write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.close(ready_read)
+            os.close(release_write)
+            metrics.init_worker(interval=60)
+            served.inc(2)
+            busy.set(7)
+            metrics.write_snapshot()
+            os.write(ready_write, b"x")
+            os.read(release_read, 1)
+        finally:
+            os._exit(0)
+
+    os.close(ready_write)
+    os.close(release_read)
+    try:
+        os.read(ready_read, 1)
+        lines = metrics.generate_latest().splitlines()
+    finally:
+        os.close(release_write)
+        os.waitpid(pid, 0)
+
+    assert "test_workers_served_total 3.0" in lines
+    assert f'test_workers_busy{{worker="{pid}"}} 7.0' in lines
+    assert lines.count("# TYPE test_workers_served_total counter") == 1
+
+    # An exited worker keeps its counts but no longer reports gauges
+    lines = metrics.generate_latest().splitlines()
+    assert "test_workers_served_total 3.0" in lines
+    assert not [line for line in lines if line.startswith("test_workers_busy{")]
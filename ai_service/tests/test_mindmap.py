@@ -0,0 +1,115 @@
+import random
+import time
+import pytest
+from routers import mindmap
+
+NOTE = (
+    "Photosynthesis converts light energy into chemical energy. "
+    "Chlorophyll absorbs light energy in the leaves. "
+    "Photosynthesis produces glucose and oxygen from carbon dioxide. "
+    "Plants store glucose as starch for later energy."
+)
+
+
+class FakeToken:
+    def __init__(self, text, pos="NOUN", stop=False):
+        self.text = text
+        self.lemma_ = text.rstrip("s") if pos == "NOUN" else text
+        self.pos_ = pos
+        self.is_stop = stop
+        self.is_punct = False
+        self.like_num = text.isdigit()
+
+
+class FakeNlp:
+    """spaCy stand-in: every capitalised word is a noun chunk preceded by "the"."""
+
+    def __init__(self):
+        self.batch_sizes = []
+
+    def pipe(self, sentences, batch_size):
+        self.batch_sizes.append(batch_size)
+        for sentence in sentences:
+            tokens = [FakeToken(word.strip(".").lower(), "NOUN" if word[0].isupper() else "VERB")
+                      for word in sentence.split()]
+            chunks = [[FakeToken("the", "DET", stop=True), token] for token in tokens if token.pos_ == "NOUN"]
+            yield type("Doc", (), {"noun_chunks": chunks, "__iter__": lambda self: iter(tokens)})()
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    monkeypatch.setattr(mindmap, "mindmap_cache", mindmap.TTLCache(maxsize=16, ttl=60))
+
+
+@pytest.fixture
+def without_spacy(monkeypatch):
+    monkeypatch.setattr(mindmap, "_nlp", False)
+
+
+def terms_of(node):
+    return [node["text"]] + [term for child in node["children"] for term in terms_of(child)]
+
+
+def test_regex_terms_skip_stopwords_and_short_words(without_spacy):
+    terms = mindmap.sentence_terms(["The plants store glucose as starch for later energy."])
+
+    assert terms == [["plants", "store", "glucose", "starch", "later", "energy"]]
+
+
+def test_regex_mindmap_is_rooted_at_the_most_connected_term(without_spacy):
+    tree = mindmap.build_mindmap(NOTE, max_depth=3, min_keywords=2, max_keywords=4)
+
+    assert tree["id"] == "root"
+    assert tree["text"] == "energy"
+    assert [child["id"] for child in tree["children"]] == [f"keyword-{n}" for n in range(4)]
+    # A term appears at most once in the tree
+    terms = terms_of(tree)
+    assert len(terms) == len(set(terms))
+
+
+def test_spacy_terms_are_lemmatized_noun_chunks(monkeypatch):
+    nlp = FakeNlp()
+    monkeypatch.setattr(mindmap, "_nlp", nlp)
+
+    terms = mindmap.sentence_terms(["Plants store Glucose.", "Leaves absorb Light."])
+
+    # Determiners are dropped from chunks; nouns are also counted on their own
+    assert terms == [["plant", "glucose", "plant", "glucose"], ["leave", "light", "leave", "light"]]
+    assert nlp.batch_sizes == [mindmap.NLP_BATCH_SIZE]
+
+
+def test_min_keywords_above_max_keywords_is_rejected(client):
+    response = client.post("/Mindmap-gen", json={"text": NOTE, "min_keywords": 10, "max_keywords": 5})
+
+    assert response.status_code == 422
+    assert "min_keywords" in response.text
+
+
+def test_repeated_note_is_served_from_the_cache(client, without_spacy, monkeypatch):
+    builds = []
+    build = mindmap.build_mindmap
+    monkeypatch.setattr(mindmap, "build_mindmap", lambda *args: builds.append(args) or build(*args))
+
+    first = client.post("/Mindmap-gen", json={"text": NOTE})
+    second = client.post("/Mindmap-gen", json={"text": NOTE})
+
+    assert first.status_code == 200, first.text
+    assert second.json() == first.json()
+    assert len(builds) == 1
+    assert mindmap.mindmap_cache.stats()["hits"] == 1
+
+
+def test_twenty_page_note_is_mapped_quickly(without_spacy):
+    rng = random.Random(0)
+    words = ["".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(7)) for _ in range(2000)]
+    # About 500 words a page
+    sentences = [" ".join(rng.choice(words) for _ in range(12)) + "." for _ in range(850)]
+    note = " ".join(sentences)
+    assert len(note.split()) >= 10000
+
+    start = time.perf_counter()
+    tree = mindmap.build_mindmap(note, max_depth=4, min_keywords=5, max_keywords=8)
+    elapsed = time.perf_counter() - start
+
+    assert len(tree["children"]) == 8
+    assert elapsed < 1.0
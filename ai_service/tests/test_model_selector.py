@@ -0,0 +1,90 @@
+from models.model_factory import BartModel, LlamaModel, ModelConfig, ModelFactory
+
+
+class FakePipeline:
+    """Summarization pipeline stand-in that records the generation arguments."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, text, **kwargs):
+        self.calls.append(kwargs)
+        return [{"summary_text": "short summary"}]
+
+
+class FakeTokenizer:
+    def __call__(self, text, **kwargs):
+        return {"input_ids": [list(range(len(text.split())))]}
+
+    def decode(self, ids, skip_special_tokens=True):
+        return "generated text"
+
+
+class FakeCausalLM:
+    def __init__(self):
+        self.calls = []
+
+    def generate(self, input_ids=None, **kwargs):
+        self.calls.append(kwargs)
+        return [[0, 1, 2]]
+
+
+def use_model(monkeypatch, model):
+    monkeypatch.setattr(ModelFactory, "get_model", staticmethod(lambda model_id, tier: model))
+
+
+def test_every_huggingface_model_has_a_checkpoint():
+    for models in (ModelConfig.CORPORATE_MODELS, ModelConfig.PERSONAL_MODELS):
+        for model_id, config in models.items():
+            if config["provider"] == "huggingface":
+                assert "model_path" in config, model_id
+
+
+def test_generate_with_bart_maps_max_tokens(client, auth_headers, monkeypatch):
+    model = BartModel("bart-base", ModelConfig.PERSONAL_MODELS["bart-base"])
+    model.model = FakePipeline()
+    use_model(monkeypatch, model)
+
+    response = client.post(
+        "/models/generate",
+        json={"prompt": "a note " * 50, "model_id": "bart-base", "parameters": {"max_tokens": 64}},
+        headers=auth_headers()
+    )
+
+    assert response.status_code == 200, response.text
+    assert response.json()["result"] == "short summary"
+    (kwargs,) = model.model.calls
+    assert "max_tokens" not in kwargs
+    assert kwargs["max_length"] == 64
+
+
+def test_generate_with_llama_maps_max_tokens(client, auth_headers, monkeypatch):
+    model = LlamaModel("tiny-llama", ModelConfig.PERSONAL_MODELS["tiny-llama"])
+    model.model = FakeCausalLM()
+    model.tokenizer = FakeTokenizer()
+    use_model(monkeypatch, model)
+
+    response = client.post(
+        "/models/generate",
+        json={"prompt": "word " * 200, "model_id": "tiny-llama", "parameters": {"max_tokens": 16}},
+        headers=auth_headers()
+    )
+
+    assert response.status_code == 200, response.text
+    assert response.json()["result"] == "generated text"
+    (kwargs,) = model.model.calls
+    assert "max_tokens" not in kwargs
+    assert kwargs["max_new_tokens"] == 16
+
+
+def test_generate_rejects_model_outside_tier(client, auth_headers):
+    response = client.post(
+        "/models/generate",
+        json={"prompt": "hello", "model_id": "gpt-4"},
+        headers=auth_headers("personal")
+    )
+    assert response.status_code == 400
+
+
+def test_token_debug_endpoint_is_not_exposed(client, auth_headers):
+    assert client.get("/models/test-auth", headers=auth_headers("personal")).status_code == 404
@@ -0,0 +1,52 @@
+import json
+import pytest
+import model_store
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    root = tmp_path / "store"
+    root.mkdir()
+    monkeypatch.setattr(model_store, "MODEL_STORE_DIR", str(root))
+    return root
+
+
+def add_entry(root, model_path, directory=None):
+    """Write an entry the way ``fetch`` leaves it, without the weights."""
+    entry = root / (directory or model_path.replace("/", "--"))
+    entry.mkdir()
+    (entry / model_store.MANIFEST).write_text(json.dumps({
+        "source": model_path,
+        "dtype": "bfloat16",
+        "class": "AutoModelForSeq2SeqLM",
+        "files": ["model.safetensors"],
+        "bytes": 0,
+        "created": "2024-01-01T00:00:00Z"
+    }))
+    return str(entry)
+
+
+def test_stored_model_is_loaded_from_local_files(store):
+    location = add_entry(store, "sshleifer/distilbart-cnn-12-6")
+
+    path, kwargs = model_store.load_options("sshleifer/distilbart-cnn-12-6")
+
+    assert path == location
+    assert kwargs == {"torch_dtype": "auto", "low_cpu_mem_usage": True, "local_files_only": True}
+
+
+def test_model_not_in_the_store_comes_from_the_hub(store):
+    add_entry(store, "sshleifer/distilbart-cnn-12-6")
+
+    assert model_store.load_options("facebook/bart-large-cnn") == ("facebook/bart-large-cnn", {})
+
+
+def test_repo_ids_containing_double_dashes(store):
+    add_entry(store, "org/model--v2")
+    (store / "unfinished.partial").mkdir()
+    (store / "no-manifest").mkdir()
+
+    assert model_store.stored_models() == ["org/model--v2"]
+    assert model_store.load_options("org/model--v2")[1]["local_files_only"] is True
+    # Same directory name, different checkpoint
+    assert model_store.load_options("org--model/v2") == ("org--model/v2", {})
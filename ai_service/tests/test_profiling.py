@@ -0,0 +1,53 @@
+import re
+import time
+import pytest
+import profiling
+from tts_service import TTSService
+
+TOKEN = "profile-secret"
+TEXT = " ".join(f"This is sentence number {i} of the test note." for i in range(4))
+SEGMENT_SECONDS = 0.05
+
+
+@pytest.fixture(autouse=True)
+def profiling_enabled(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_TOKEN", TOKEN)
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path / "profiles"))
+
+
+def test_reports_require_the_profile_token(client):
+    for headers in ({}, {"X-Profile-Token": "wrong"}):
+        assert client.get("/profiles", headers=headers).status_code == 403
+        assert client.get(f"/profiles/{'0' * 32}", headers=headers).status_code == 403
+
+
+def test_unauthorized_request_is_not_profiled(client):
+    response = client.get("/metrics", headers={"X-Profile": "1", "X-Profile-Token": "wrong"})
+
+    assert response.status_code == 200
+    assert "X-Profile-Id" not in response.headers
+
+
+def test_streamed_response_is_profiled_until_the_body_is_sent(client, tmp_path, monkeypatch):
+    from routers import tts
+
+    def slow_engine(text, lang):
+        time.sleep(SEGMENT_SECONDS)
+        return b"x"
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(tts, "tts_service", TTSService(headless=True, backend=slow_engine, max_workers=1))
+    headers = {"X-Profile-Token": TOKEN}
+
+    response = client.post("/Text-to-speech/stream", json={"text": TEXT}, headers={"X-Profile": "1", **headers})
+    assert response.status_code == 200
+    assert response.content == b"x" * 4
+    request_id = response.headers["X-Profile-Id"]
+
+    assert request_id in client.get("/profiles", headers=headers).json()["profiles"]
+    report = client.get(f"/profiles/{request_id}", headers=headers)
+    assert report.status_code == 200
+    assert "Request: POST /Text-to-speech/stream" in report.text
+    # The wall time covers synthesizing the body, not just sending the headers
+    wall_time = float(re.search(r"Wall time: ([0-9.]+)s", report.text).group(1))
+    assert wall_time >= 4 * SEGMENT_SECONDS * 0.9
@@ -0,0 +1,128 @@
+import asyncio
+import logging
+import threading
+import pytest
+from fastapi import HTTPException
+import deadlines
+from jobs import CANCELLED, JobRunner, JobStore
+from placement import InferencePlacement
+from scheduler import InferenceScheduler
+
+
+def test_cancelled_request_keeps_its_slot_until_the_call_returns():
+    scheduler = InferenceScheduler(concurrency=1)
+    placement = InferencePlacement(cores=[0], slots=1, threads_per_slot=1, pin=False)
+    started, finish = threading.Event(), threading.Event()
+
+    def slow():
+        started.set()
+        finish.wait(5)
+        return "slow"
+
+    async def request(func):
+        async with scheduler.slot("personal"):
+            return await placement.run(func)
+
+    async def scenario():
+        abandoned = asyncio.create_task(request(slow))
+        await asyncio.to_thread(started.wait, 5)
+        # The client goes away while its model call is running
+        abandoned.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await abandoned
+        assert scheduler.active == 1
+        assert placement.stats()["free"] == 0
+
+        waiting = asyncio.create_task(request(lambda: "next"))
+        await asyncio.sleep(0.05)
+        assert not waiting.done()
+        assert scheduler.stats()["tiers"]["personal"]["queued"] == 1
+
+        finish.set()
+        assert await asyncio.wait_for(waiting, 5) == "next"
+        assert scheduler.active == 0
+        assert placement.stats()["free"] == 1
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        finish.set()
+        placement.slots[0].executor.shutdown(wait=True)
+
+
+def queued_behind_a_running_call(scheduler, deadline):
+    """A scenario where a request holds the only slot and another one waits under ``deadline``."""
+    finish = asyncio.Event()
+
+    async def holder():
+        async with scheduler.slot("personal"):
+            await finish.wait()
+
+    async def waiter():
+        with deadlines.scope(deadline):
+            async with scheduler.slot("personal"):
+                return "admitted"
+
+    return finish, holder, waiter
+
+
+def test_queued_request_leaves_the_queue_when_cancelled():
+    scheduler = InferenceScheduler(concurrency=1)
+    deadline = deadlines.Deadline(60)
+    finish, holder, waiter = queued_behind_a_running_call(scheduler, deadline)
+
+    async def scenario():
+        running = asyncio.create_task(holder())
+        await asyncio.sleep(0)
+        queued = asyncio.create_task(waiter())
+        await asyncio.sleep(0.05)
+        assert scheduler.stats()["tiers"]["personal"]["queued"] == 1
+
+        # The client disconnects while the request is still queued
+        deadline.cancel()
+        with pytest.raises(deadlines.RequestCancelled):
+            await asyncio.wait_for(queued, 1)
+        assert scheduler.stats()["tiers"]["personal"]["queued"] == 0
+
+        finish.set()
+        await running
+        assert scheduler.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_queued_request_times_out_at_its_deadline():
+    scheduler = InferenceScheduler(concurrency=1)
+    finish, holder, waiter = queued_behind_a_running_call(scheduler, deadlines.Deadline(0.2))
+
+    async def scenario():
+        running = asyncio.create_task(holder())
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as raised:
+            await asyncio.wait_for(waiter(), 2)
+        assert raised.value.status_code == 504
+        assert scheduler.stats()["tiers"]["personal"]["queued"] == 0
+
+        finish.set()
+        await running
+        assert scheduler.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_job_is_not_reported_as_failed(tmp_path, caplog):
+    store = JobStore(str(tmp_path / "jobs.db"))
+
+    async def handler(ctx):
+        raise deadlines.RequestCancelled("Request was cancelled")
+
+    runner = JobRunner(store, {"summarize": handler}, concurrency=0)
+    submitted = store.submit("summarize", {}, owner="test-user", tier="personal")
+    job = store.claim(runner.worker_id)
+    store.cancel(submitted["id"])
+
+    with caplog.at_level(logging.INFO, logger="jobs"):
+        asyncio.run(runner._run(job))
+
+    assert store.get(submitted["id"])["status"] == CANCELLED
+    assert not [record for record in caplog.records if record.levelno >= logging.ERROR]
@@ -0,0 +1,113 @@
+import hashlib
+import json
+import os
+import pytest
+from benchmarks.worker_memory import memory_of
+from models.model_factory import BaseModel, ModelFactory
+from routers import summarizer
+
+WEIGHT_BYTES = 32 * 2**20
+WORKERS = 2
+
+
+class StubModule:
+    """Torch module stand-in: a block of weights every worker reads."""
+
+    def __init__(self, size: int):
+        # Random, so the kernel cannot back it with the shared zero page
+        self.weights = os.urandom(size)
+
+    def eval(self):
+        return self
+
+    def requires_grad_(self, requires_grad: bool = True):
+        return self
+
+    def share_memory(self):
+        return self
+
+
+class StubModel(BaseModel):
+    def __init__(self, model_id: str, config: dict):
+        self.model_id = model_id
+        self.config = config
+        self.weights = None
+        self.loads = 0
+
+    def load(self) -> None:
+        if self.weights is None:
+            self.weights = StubModule(WEIGHT_BYTES)
+            self.loads += 1
+
+    def module(self):
+        return self.weights
+
+    def generate(self, prompt: str, **kwargs) -> str:
+        self.load()
+        return hashlib.sha256(self.weights.weights).hexdigest()
+
+    def get_model_info(self) -> dict:
+        return self.config
+
+
+@pytest.fixture
+def stub_factory(monkeypatch):
+    monkeypatch.setattr(ModelFactory, "_instances", {})
+    monkeypatch.setattr(ModelFactory, "_create", staticmethod(StubModel))
+    monkeypatch.setattr(summarizer, "model_cache", {})
+
+
+def test_factory_reuses_model_instances(stub_factory):
+    model = ModelFactory.get_model("bart-base", "personal")
+    model.generate("a prompt")
+
+    assert ModelFactory.get_model("bart-base", "personal") is model
+    assert model.loads == 1
+    with pytest.raises(ValueError):
+        ModelFactory.get_model("bart-large", "personal")
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/smaps_rollup"), reason="needs Linux /proc smaps_rollup")
+def test_forked_workers_share_preloaded_weights(stub_factory):
+    summarizer.preload_models([], [("personal", "bart-base")])
+    summarizer.prepare_for_fork(share_memory=False)
+    model = ModelFactory.get_model("bart-base", "personal")
+    expected = model.generate("a prompt")
+
+    results_read, results_write = os.pipe()
+    release_read, release_write = os.pipe()
+    pids = []
+    for _ in range(WORKERS):
+        pid = os.fork()
+        if pid == 0:
+            os.close(results_read)
+            os.close(release_write)
+            try:
+                # Serve a request: every page of the weights is read in the worker
+                served = ModelFactory.get_model("bart-base", "personal").generate("a prompt")
+                result = {"ok": served == expected, **memory_of(os.getpid())}
+            except BaseException as e:
+                result = {"ok": False, "error": repr(e)}
+            # Always report, then stay alive until every worker has been measured
+            os.write(results_write, (json.dumps(result) + "\n").encode("utf-8"))
+            os.read(release_read, 1)
+            os._exit(0)
+        pids.append(pid)
+
+    os.close(results_write)
+    os.close(release_read)
+    try:
+        with os.fdopen(results_read) as results:
+            workers = [json.loads(results.readline()) for _ in pids]
+    finally:
+        os.close(release_write)
+        for pid in pids:
+            os.waitpid(pid, 0)
+
+    for worker in workers:
+        assert worker["ok"], worker
+        # The weights are mapped from the parent, not copied into the worker
+        assert worker["rss"] - worker["private"] >= WEIGHT_BYTES
+        assert worker["private"] < WEIGHT_BYTES / 2
+        # With the parent and both workers mapping them, each is charged a third
+        assert worker["pss"] < worker["rss"] - WEIGHT_BYTES / 2
@@ -0,0 +1,132 @@
+from routers import summarizer
+
+
+class FakePipeline:
+    """Summarization pipeline stand-in that records the generation arguments.
+
+    Like BART, it fails on an input longer than its window unless asked to
+    truncate; words are split into 4-character subword tokens.
+    """
+
+    window = 1024
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, inputs, **kwargs):
+        self.calls.append(kwargs)
+        for text in inputs if isinstance(inputs, list) else [inputs]:
+            tokens = sum(-(-len(word) // 4) for word in text.split())
+            if tokens > self.window and not kwargs.get("truncation"):
+                raise IndexError("index out of range in self")
+        if isinstance(inputs, list):
+            return [{"summary_text": f"summary {index}."} for index in range(len(inputs))]
+        return [{"summary_text": "summary."}]
+
+
+class FakeTokenizer:
+    def __call__(self, text, **kwargs):
+        return type("Encoding", (), {"input_ids": text.split()})()
+
+
+def test_chunks_are_truncated_to_the_input_window(monkeypatch):
+    monkeypatch.setattr(summarizer, "chunk_summary_cache", summarizer.TTLCache(maxsize=16, ttl=60))
+    model = FakePipeline()
+    # Few words but far more tokens than the model's input window
+    text = " ".join(["pneumonoultramicroscopicsilicovolcanoconiosis"] * 500)
+
+    summary = summarizer.run_summarization(model, FakeTokenizer(), text, 0.3, model_name="test")
+
+    assert summary == "summary."
+    (kwargs,) = model.calls
+    assert kwargs["truncation"] is True
+
+
+def test_batches_are_truncated_to_the_input_window():
+    model = FakePipeline()
+
+    long_words = " ".join(["https://example.com/a/very/long/path"] * 400)
+    summaries = summarizer.summarize_batch(model, [long_words, long_words + " more"], 0.3)
+
+    assert summaries == ["summary 0.", "summary 1."]
+    (kwargs,) = model.calls
+    assert kwargs["truncation"] is True
+
+
+def test_batches_are_bucketed_by_length():
+    items = [{"ratio": 0.3, "tokens": tokens} for tokens in (40, 600, 45, 50, 700, 610, 48)]
+
+    batches = summarizer.plan_batches(items, batch_size=8, batch_tokens=100000, length_spread=1.25)
+
+    assert [[item["tokens"] for item in batch] for batch in batches] == [[40, 45, 48, 50], [600, 610, 700]]
+
+
+def test_batches_are_split_by_ratio_and_size():
+    items = [{"ratio": ratio, "tokens": 100} for ratio in (0.3, 0.5, 0.3, 0.3)]
+
+    batches = summarizer.plan_batches(items, batch_size=2, batch_tokens=100000)
+
+    assert [[item["ratio"] for item in batch] for batch in batches] == [[0.3, 0.3], [0.3], [0.5]]
+
+
+def test_bulk_charges_the_rate_limit_per_batch(client, auth_headers, monkeypatch):
+    import json
+    import time
+    from auth import auth_handler
+    from scheduler import inference_scheduler
+
+    model = FakePipeline()
+    monkeypatch.setattr(summarizer, "model_cache", {
+        "personal_distilbart-cnn-12-6": {"model": model, "tokenizer": FakeTokenizer()}
+    })
+    monkeypatch.setattr(summarizer, "chunk_summary_cache", summarizer.TTLCache(maxsize=16, ttl=60))
+    # Two tokens up front, then one every 0.1s
+    limiter = auth_handler.TokenBucketLimiter({"personal": {"per_minute": 600, "burst": 2}})
+    monkeypatch.setattr(auth_handler, "rate_limiter", limiter)
+    admitted = inference_scheduler.stats()["tiers"]["personal"]["admitted"]
+
+    # Different ratios never share a batch: three batches
+    notes = [{"id": str(index), "text": f"Note number {index} with a few words.", "compression_ratio": ratio}
+             for index, ratio in enumerate((0.3, 0.5, 0.7))]
+    start = time.perf_counter()
+    response = client.post(
+        "/summarizer/bulk",
+        json={"notes": notes, "model": "distilbart-cnn-12-6"},
+        headers=auth_headers(user="bulk-user")
+    )
+    elapsed = time.perf_counter() - start
+
+    assert response.status_code == 200, response.text
+    assert response.headers["X-RateLimit-Limit"] == "2"
+    assert "X-RateLimit-Remaining" in response.headers
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(line["id"] for line in lines if "id" in line) == ["0", "1", "2"]
+    assert lines[-1]["batches"] == 3
+    assert len(model.calls) == 3
+    # One token for the request and one per batch: two of them had to wait for a refill
+    assert elapsed >= 0.15
+    # The model load and every batch went through admission
+    assert inference_scheduler.stats()["tiers"]["personal"]["admitted"] - admitted == 4
+
+
+def test_editing_one_paragraph_recomputes_one_chunk(monkeypatch):
+    monkeypatch.setattr(summarizer, "chunk_summary_cache", summarizer.TTLCache(maxsize=256, ttl=60))
+    paragraphs = [
+        " ".join(f"Paragraph {index} sentence {sentence} talks about topic {index} in some detail." for sentence in range(25))
+        for index in range(12)
+    ]
+    model = FakePipeline()
+    note = "\n\n".join(paragraphs)
+    chunks = len(summarizer.content_chunks(note))
+    assert chunks > len(paragraphs) / 2
+
+    summarizer.run_summarization(model, FakeTokenizer(), note, 0.3, model_name="test")
+    assert len(model.calls) == chunks
+
+    paragraphs[5] = paragraphs[5].replace("sentence 7 talks", "sentence 7 now talks")
+    summarizer.run_summarization(model, FakeTokenizer(), "\n\n".join(paragraphs), 0.3, model_name="test")
+    assert len(model.calls) == chunks + 1
+
+    # Unchanged text is served from the cache entirely
+    summarizer.run_summarization(model, FakeTokenizer(), "\n\n".join(paragraphs), 0.3, model_name="test")
+    assert len(model.calls) == chunks + 1
@@ -0,0 +1,192 @@
+import threading
+import time
+import pytest
+from tts_service import TTSService
+
+SENTENCES = [f"This is sentence number {i} of the test note." for i in range(10)]
+TEXT = " ".join(SENTENCES)
+
+
+def fake_engine(text, lang):
+    # Later sentences finish first, so output order must come from the service
+    number = int(text.split("number ")[1].split()[0])
+    time.sleep(0.002 * (10 - number))
+    return f"<{number}>".encode()
+
+
+def expected_audio():
+    return b"".join(f"<{i}>".encode() for i in range(len(SENTENCES)))
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    # The service writes its cache to ./audio_output
+    monkeypatch.chdir(tmp_path)
+    return TTSService(headless=True, backend=fake_engine, max_workers=3)
+
+
+def test_segments_stream_in_order(service):
+    chunks = list(service.synthesize_segments(TEXT))
+    assert chunks == [f"<{i}>".encode() for i in range(len(SENTENCES))]
+
+
+def test_workers_are_shared_across_requests(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    active = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def counting_engine(text, lang):
+        nonlocal active, peak
+        with lock:
+            active += 1
+            peak = max(peak, active)
+        time.sleep(0.01)
+        with lock:
+            active -= 1
+        return b"x"
+
+    service = TTSService(headless=True, backend=counting_engine, max_workers=2)
+    requests = [threading.Thread(target=lambda: list(service.synthesize_segments(TEXT))) for _ in range(4)]
+    for thread in requests:
+        thread.start()
+    for thread in requests:
+        thread.join()
+    assert peak <= 2
+
+
+def test_stream_endpoint_body_and_cache(service, client, monkeypatch):
+    from routers import tts
+
+    monkeypatch.setattr(tts, "tts_service", service)
+
+    response = client.post("/Text-to-speech/stream", json={"text": TEXT})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "audio/mpeg"
+    assert response.content == expected_audio()
+    assert service.cache.stats()["entries"] == 1
+
+    # The second request is served from the cache
+    again = client.post("/Text-to-speech/stream", json={"text": TEXT})
+    assert again.content == expected_audio()
+    assert service.cache.stats()["hits"] == 1
+
+
+def test_clip_with_fallback_segments_is_not_cached(tmp_path, monkeypatch):
+    from tts_service import FallbackBackend, FunctionBackend
+
+    monkeypatch.chdir(tmp_path)
+
+    def flaky_engine(text, lang):
+        if "number 3 " in text:
+            raise RuntimeError("remote engine unavailable")
+        return b"p"
+
+    backend = FallbackBackend(
+        FunctionBackend(flaky_engine, name="remote"),
+        FunctionBackend(lambda text, lang: b"f", name="local"),
+        timeout=1.0
+    )
+    service = TTSService(headless=True, backend=backend, max_workers=2)
+
+    audio = b"".join(service.stream_speech(TEXT))
+    assert audio.count(b"f") == 1 and audio.count(b"p") == len(SENTENCES) - 1
+    assert backend.fallback_count == 1
+    assert service.cache.stats()["entries"] == 0
+
+
+def test_timed_out_primary_calls_are_bounded():
+    from tts_service import FallbackBackend, FunctionBackend
+
+    release = threading.Event()
+    stuck = FunctionBackend(lambda text, lang: release.wait() and b"p", name="remote")
+    backend = FallbackBackend(stuck, FunctionBackend(lambda text, lang: b"f", name="local"), timeout=0.05, max_workers=2)
+    try:
+        for _ in range(2):
+            assert backend.render("hello there", "en") == (b"f", "local")
+        # Both primary workers are still stuck: the next segment skips the primary entirely
+        start = time.perf_counter()
+        assert backend.render("hello there", "en") == (b"f", "local")
+        assert time.perf_counter() - start < 0.05
+        assert backend.outstanding == 2
+    finally:
+        release.set()
+    backend._pool.shutdown(wait=True)
+    assert backend.outstanding == 0
+
+
+def failing_primary_service(max_workers=2):
+    from tts_service import FallbackBackend, FunctionBackend
+
+    def broken_engine(text, lang):
+        raise RuntimeError("remote engine unavailable")
+
+    backend = FallbackBackend(
+        FunctionBackend(broken_engine, name="remote"),
+        FunctionBackend(lambda text, lang: b"f", name="local"),
+        timeout=1.0
+    )
+    return TTSService(headless=True, backend=backend, max_workers=max_workers)
+
+
+def test_fallback_clip_is_returned_but_not_cached(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    service = failing_primary_service()
+
+    filepath = service.text_to_speech(TEXT, play_audio=False)
+
+    assert filepath is not None
+    with open(filepath, "rb") as f:
+        assert f.read() == b"f" * len(SENTENCES)
+    assert service.cache.stats()["entries"] == 0
+    assert service.cache.get(service.cache_key(TEXT)) is None
+
+
+def test_fallback_clip_url_can_be_fetched(tmp_path, monkeypatch, client):
+    from routers import tts
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(tts, "tts_service", failing_primary_service())
+
+    response = client.post("/Text-to-speech", json={"text": TEXT})
+    assert response.status_code == 200, response.text
+    audio = client.get(response.json()["audio_url"])
+    assert audio.status_code == 200
+    assert audio.content == b"f" * len(SENTENCES)
+
+    returned = client.post("/Text-to-speech", json={"text": TEXT, "return_audio": True})
+    assert returned.status_code == 200
+    assert returned.content == b"f" * len(SENTENCES)
+
+
+def test_uploads_cannot_replace_cached_clips(service, client, monkeypatch):
+    import base64
+    from routers import tts
+
+    monkeypatch.setattr(tts, "tts_service", service)
+    clip = client.post("/Text-to-speech", json={"text": TEXT}).json()
+    name = clip["audio_file"].rsplit("/", 1)[-1]
+
+    forged = base64.b64encode(b"attacker audio").decode("ascii")
+    response = client.post(f"/base64-to-audio?filename={name}", content=forged)
+    assert response.status_code == 400
+
+    assert client.get(clip["audio_url"]).content == expected_audio()
+    assert service.cache.stats()["entries"] == 1
+
+
+def test_uploads_are_kept_within_their_budget(service, client, monkeypatch):
+    import base64
+    import os
+    from routers import tts
+
+    monkeypatch.setattr(tts, "tts_service", service)
+    payload = base64.b64encode(b"u" * 1000).decode("ascii")
+    for index in range(5):
+        response = client.post(f"/base64-to-audio?filename=upload-{index}.mp3", content=payload)
+        assert response.status_code == 200, response.text
+        os.utime(response.json()["audio_file"], (index, index))
+
+    service.trim_uploads(max_bytes=2500)
+    assert sorted(os.listdir(service.upload_dir)) == ["upload-3.mp3", "upload-4.mp3"]
+    assert client.get(response.json()["audio_url"]).content == b"u" * 1000
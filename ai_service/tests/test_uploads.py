@@ -0,0 +1,81 @@
+import asyncio
+import base64
+import os
+import pytest
+from fastapi import FastAPI, File, UploadFile
+from fastapi.testclient import TestClient
+from uploads import UploadLimitMiddleware, write_base64_stream
+
+BOUNDARY = "test-boundary"
+
+
+def multipart_body(payload: bytes) -> bytes:
+    return (
+        f"--{BOUNDARY}\r\n"
+        'Content-Disposition: form-data; name="file"; filename="page.png"\r\n'
+        "Content-Type: image/png\r\n\r\n"
+    ).encode("ascii") + payload + f"\r\n--{BOUNDARY}--\r\n".encode("ascii")
+
+
+@pytest.fixture
+def upload_app():
+    app = FastAPI()
+    app.add_middleware(UploadLimitMiddleware, max_bytes=4096)
+    app.state.received = []
+
+    @app.post("/upload")
+    async def upload(file: UploadFile = File(...)):
+        data = await file.read()
+        app.state.received.append(len(data))
+        return {"size": len(data)}
+
+    return app
+
+
+def post(client, body):
+    return client.post("/upload", content=body, headers={"Content-Type": f"multipart/form-data; boundary={BOUNDARY}"})
+
+
+def test_upload_under_the_cap_is_accepted(upload_app):
+    response = post(TestClient(upload_app), multipart_body(b"x" * 1000))
+
+    assert response.status_code == 200, response.text
+    assert response.json() == {"size": 1000}
+
+
+def test_oversized_upload_is_rejected_from_its_content_length(upload_app):
+    response = post(TestClient(upload_app), multipart_body(b"x" * 10000))
+
+    assert response.status_code == 413
+    assert upload_app.state.received == []
+
+
+def test_oversized_upload_is_cut_off_while_streaming(upload_app):
+    body = multipart_body(b"x" * 10000)
+    # No Content-Length: the body arrives in chunks
+    chunks = (body[start:start + 1024] for start in range(0, len(body), 1024))
+
+    response = post(TestClient(upload_app), chunks)
+
+    assert response.status_code == 413
+    assert upload_app.state.received == []
+
+
+def test_concurrent_decodes_to_one_file_do_not_clobber_each_other(tmp_path):
+    target = str(tmp_path / "audio.mp3")
+    payloads = [os.urandom(48 * 1024), os.urandom(48 * 1024)]
+
+    async def chunks(payload):
+        encoded = base64.b64encode(payload)
+        for start in range(0, len(encoded), 4096):
+            yield encoded[start:start + 4096]
+            # Let the other upload write in between
+            await asyncio.sleep(0)
+
+    async def scenario():
+        return await asyncio.gather(*(write_base64_stream(chunks(payload), target) for payload in payloads))
+
+    assert asyncio.run(scenario()) == [len(payload) for payload in payloads]
+    with open(target, "rb") as f:
+        assert f.read() in payloads
+    assert os.listdir(tmp_path) == ["audio.mp3"]
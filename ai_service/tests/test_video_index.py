@@ -0,0 +1,108 @@
+import json
+import math
+import pytest
+import video_index
+from video_index import VideoIndex, extract_keywords, tokenize
+
+CATALOG = {
+    "python": [
+        ["Python decorators explained", "py1"],
+        {"title": "Python generators and iterators", "video_id": "py2", "channel": "Core Dev"},
+    ],
+    "machine learning": [
+        ["Gradient descent from scratch", "ml1"],
+        ["Python machine learning with scikit-learn", "ml2"],
+    ],
+    "cooking": [
+        ["Sourdough bread at home", "ck1"],
+        # Listed under two topics: indexed once
+        ["Python decorators explained", "py1"],
+    ],
+    "default": [
+        ["Study tips", "def1"],
+    ],
+}
+
+
+@pytest.fixture
+def index():
+    return VideoIndex(CATALOG)
+
+
+def ids(results):
+    return [video["video_id"] for video in results]
+
+
+def test_tokenize_adds_bigrams_and_drops_stopwords():
+    assert tokenize("The basics of Machine Learning in C++") == [
+        "machine", "learning", "c++", "machine learning", "learning c++"
+    ]
+
+
+def test_postings_hold_normalized_weights(index):
+    assert [video["video_id"] for video in index.videos] == ["py1", "py2", "ml1", "ml2", "ck1"]
+    assert index.default_videos == [{"title": "Study tips", "video_id": "def1", "channel": ""}]
+    assert index.videos[1]["channel"] == "Core Dev"
+
+    # "python" is in the topic of py1 and py2 and the title of ml2
+    assert sorted(doc_id for doc_id, _ in index.postings["python"]) == [0, 1, 3]
+    assert [doc_id for doc_id, _ in index.postings["sourdough bread"]] == [4]
+    assert "the" not in index.vocabulary()
+    # Idf falls as a term gets more common
+    assert index.idf["python"] < index.idf["sourdough"]
+
+    # Every document vector has unit length
+    lengths = {}
+    for postings in index.postings.values():
+        for doc_id, weight in postings:
+            lengths[doc_id] = lengths.get(doc_id, 0.0) + weight * weight
+    assert all(math.isclose(length, 1.0) for length in lengths.values())
+
+
+def test_search_ranks_by_tf_idf(index):
+    results = index.search("machine learning in python")
+
+    # Matches the topic twice, the title and both terms: ranked first
+    assert ids(results)[0] == "ml2"
+    assert set(ids(results)) == {"ml2", "ml1", "py1", "py2"}
+    scores = [video["score"] for video in results]
+    assert scores == sorted(scores, reverse=True)
+    assert all(0 < score <= 1 for score in scores)
+
+
+def test_search_limit_and_min_score(index):
+    assert ids(index.search("python", limit=2)) == ids(index.search("python"))[:2]
+    assert ids(index.search("sourdough bread", min_score=0.5)) == ["ck1"]
+    assert index.search("python", min_score=1.01) == []
+
+
+def test_query_without_known_terms_finds_nothing(index):
+    assert index.search("quantum chromodynamics") == []
+    assert index.search("the and of") == []
+
+
+def test_index_loads_from_a_catalog_file(tmp_path):
+    path = tmp_path / "catalog.json"
+    path.write_text(json.dumps(CATALOG))
+
+    assert ids(VideoIndex.from_file(str(path)).search("gradient descent")) == ["ml1"]
+
+
+def test_extract_keywords_prefers_catalog_terms(index, monkeypatch):
+    monkeypatch.setattr(video_index, "KEYWORD_EXTRACTOR", "statistical")
+    note = (
+        "Gradient descent updates the weights. Gradient descent needs a learning rate. "
+        "The learning rate and the weights change as training goes on. Python code helps."
+    )
+
+    assert extract_keywords(note, top_n=4) == ["gradient", "descent", "weights", "learning"]
+
+    # Catalog terms count triple; unigrams of a chosen bigram are skipped
+    assert extract_keywords(note, top_n=4, vocabulary={"learning rate"}) == [
+        "learning rate", "gradient", "descent", "weights"
+    ]
+    # Mentioned once, but known to the catalog: outranks "weights"
+    assert extract_keywords(note, top_n=5, vocabulary=index.vocabulary()) == [
+        "gradient", "descent", "learning", "gradient descent", "python"
+    ]
+    assert extract_keywords("", top_n=3) == []
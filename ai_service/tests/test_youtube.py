@@ -0,0 +1,118 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from caching import TTLCache
+from routers import youtube
+
+# Misses every entry of the offline index, so the live API is queried
+QUERY = "zyxxq flurbish"
+
+
+class StubYouTube(BaseHTTPRequestHandler):
+    requests = []
+
+    def do_GET(self):
+        StubYouTube.requests.append(self.path)
+        body = json.dumps({"items": [
+            {"id": {"videoId": "stub123"}, "snippet": {"title": "Stub video", "channelTitle": "Stub channel"}}
+        ]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_api(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubYouTube)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    StubYouTube.requests = []
+
+    builds = []
+    from googleapiclient import discovery
+    real_build = discovery.build
+
+    def counting_build(*args, **kwargs):
+        builds.append(kwargs)
+        return real_build(*args, **kwargs)
+
+    monkeypatch.setattr(discovery, "build", counting_build)
+    monkeypatch.setattr(youtube, "YOUTUBE_API_KEY", "test-key")
+    monkeypatch.setattr(youtube, "YOUTUBE_API_ENDPOINT", f"http://127.0.0.1:{server.server_port}/youtube/v3/")
+    monkeypatch.setattr(youtube, "_youtube_client", None)
+    monkeypatch.setattr(youtube, "search_cache", TTLCache(maxsize=16, ttl=60))
+    yield builds
+    server.shutdown()
+    server.server_close()
+
+
+def suggest(client, query):
+    response = client.post("/YtSuggestion", json={"query": query, "max_results": 3})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_search_hits_stub_api(client, stub_api):
+    result = suggest(client, QUERY)
+    assert result["video_links"] == ["https://www.youtube.com/watch?v=stub123"]
+    (path,) = StubYouTube.requests
+    assert "/search?" in path, path
+    assert "key=test-key" in path
+
+
+def test_repeated_normalized_query_is_cached(client, stub_api):
+    suggest(client, QUERY)
+    suggest(client, f"  {QUERY.upper()}   ")
+    assert len(StubYouTube.requests) == 1
+    assert youtube.search_cache.stats()["hits"] == 1
+
+
+def test_cached_results_expire(client, stub_api, monkeypatch):
+    monkeypatch.setattr(youtube, "search_cache", TTLCache(maxsize=16, ttl=0.05))
+    suggest(client, QUERY)
+    time.sleep(0.1)
+    suggest(client, QUERY)
+    assert len(StubYouTube.requests) == 2
+
+
+def test_client_is_built_once(client, stub_api):
+    suggest(client, QUERY)
+    first = youtube.get_youtube_client()
+    suggest(client, "another zyxxq query")
+    assert youtube.get_youtube_client() is first
+    assert len(stub_api) == 1
+    assert len(StubYouTube.requests) == 2
+
+
+def default_links(max_results=3):
+    return [f"https://www.youtube.com/watch?v={video['video_id']}" for video in youtube.video_index.default_videos[:max_results]]
+
+
+def test_unreachable_api_falls_back_to_index(client, stub_api, monkeypatch):
+    import socket
+
+    # A port nobody listens on: the connection is refused
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    monkeypatch.setattr(youtube, "YOUTUBE_API_ENDPOINT", f"http://127.0.0.1:{port}/youtube/v3/")
+
+    assert suggest(client, QUERY)["video_links"] == default_links()
+
+
+@pytest.mark.parametrize("error", [TimeoutError("timed out"), OSError("Name or service not known")])
+def test_transport_errors_fall_back_to_index(client, stub_api, monkeypatch, error):
+    class FailingHttp:
+        def request(self, *args, **kwargs):
+            raise error
+
+    monkeypatch.setattr(youtube, "_thread_http", lambda: FailingHttp())
+    assert suggest(client, QUERY)["video_links"] == default_links()
+    assert StubYouTube.requests == []
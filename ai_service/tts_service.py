@@ -1,32 +1,521 @@
 import base64
+import hashlib
+import io
+import json
+import logging
 import os
-from gtts import gTTS
-from datetime import datetime
-import pygame
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+logger = logging.getLogger(__name__)
+
+# Number of segments synthesized concurrently by this process, across requests
+TTS_MAX_WORKERS = int(os.getenv("TTS_MAX_WORKERS", 4))
+
+# Upper bound on the disk space used by cached clips
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+# Clips patched together by the fallback engine are kept apart, under a
+# smaller budget, just long enough for clients to download them
+TTS_FALLBACK_CACHE_MAX_BYTES = int(os.getenv("TTS_FALLBACK_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+# Upper bound on the disk space used by client uploads; the oldest go first
+TTS_UPLOAD_MAX_BYTES = int(os.getenv("TTS_UPLOAD_MAX_BYTES", 256 * 1024 * 1024))
+
+# Default engine, per-language overrides ("es:espeak,fr:espeak") and the
+# local engine used when the primary one is slow or failing
+TTS_BACKEND = os.getenv("TTS_BACKEND", "gtts")
+TTS_LANG_BACKENDS = os.getenv("TTS_LANG_BACKENDS", "")
+TTS_FALLBACK_BACKEND = os.getenv("TTS_FALLBACK_BACKEND", "espeak")
+TTS_FALLBACK_TIMEOUT = float(os.getenv("TTS_FALLBACK_TIMEOUT", 3.0))
+
+# Segments shorter than this are merged into the next one
+MIN_SEGMENT_CHARS = 20
+# Segments are split at clause or word boundaries beyond this length
+MAX_SEGMENT_CHARS = 300
+
+_SENTENCE_END = re.compile(r'(?<=[.!?;:])\s+|\n{2,}')
+_CLAUSE_END = re.compile(r'(?<=[,)])\s+')
+
+class TTSBackend(ABC):
+    """A speech engine turning one text segment into MP3 bytes."""
+
+    name = "base"
+
+    @abstractmethod
+    def synthesize(self, text: str, lang: str) -> bytes:
+        pass
+
+    def is_available(self) -> bool:
+        return True
+
+    def engine_for(self, lang: str) -> str:
+        """Identify the engine (and voice) that will render ``lang``; part of the cache key."""
+        return self.name
+
+    def render(self, text: str, lang: str):
+        """Synthesize ``text`` and return ``(mp3 bytes, engine that actually rendered it)``."""
+        return self.synthesize(text, lang), self.engine_for(lang)
+
+class GTTSBackend(TTSBackend):
+    """Google Translate TTS: good voices, one HTTP round-trip per segment."""
+
+    name = "gtts"
+
+    def synthesize(self, text: str, lang: str) -> bytes:
+        from gtts import gTTS
+        buffer = io.BytesIO()
+        gTTS(text=text, lang=lang).write_to_fp(buffer)
+        return buffer.getvalue()
+
+class EspeakBackend(TTSBackend):
+    """Offline synthesis with espeak-ng, encoded to MP3 with ffmpeg.
+
+    Everything runs locally, so latency is a few milliseconds per sentence
+    and there is no network failure mode.
+    """
+
+    name = "espeak"
+
+    def __init__(self, voice_map=None, speed=160):
+        self.voice_map = voice_map or {}
+        self.speed = speed
+        self.espeak = shutil.which("espeak-ng") or shutil.which("espeak")
+        self.ffmpeg = shutil.which("ffmpeg")
+
+    def is_available(self) -> bool:
+        return bool(self.espeak and self.ffmpeg)
+
+    def engine_for(self, lang: str) -> str:
+        return f"{self.name}:{self.voice_map.get(lang, lang)}:{self.speed}"
+
+    def synthesize(self, text: str, lang: str) -> bytes:
+        if not self.is_available():
+            raise RuntimeError("espeak-ng and ffmpeg are required for local synthesis")
+        voice = self.voice_map.get(lang, lang)
+        wav = subprocess.run(
+            [self.espeak, "-v", voice, "-s", str(self.speed), "--stdout", text],
+            check=True, capture_output=True
+        ).stdout
+        return subprocess.run(
+            [self.ffmpeg, "-loglevel", "error", "-f", "wav", "-i", "pipe:0",
+             "-f", "mp3", "-b:a", "64k", "pipe:1"],
+            input=wav, check=True, capture_output=True
+        ).stdout
+
+class FunctionBackend(TTSBackend):
+    """Adapt a plain ``(text, lang) -> bytes`` callable, e.g. a local stand-in for tests."""
+
+    def __init__(self, func, name=None):
+        self.func = func
+        self.name = name or getattr(func, "__name__", type(func).__name__)
+
+    def synthesize(self, text: str, lang: str) -> bytes:
+        return self.func(text, lang)
+
+class FallbackBackend(TTSBackend):
+    """Try ``primary`` and switch to ``fallback`` when it errors or exceeds ``timeout`` seconds.
+
+    Segments rendered by the fallback engine are counted in
+    ``fallback_count`` and reported by ``render``, so callers can keep
+    mixed-engine clips out of the cache. A primary call that timed out keeps
+    running until the engine returns; while ``max_workers`` of them are
+    still outstanding, segments go straight to the fallback instead of
+    queueing behind them.
+    """
+
+    def __init__(self, primary: TTSBackend, fallback: TTSBackend, timeout=TTS_FALLBACK_TIMEOUT, max_workers=8):
+        self.primary = primary
+        self.fallback = fallback
+        self.timeout = timeout
+        self.name = primary.name
+        self.max_workers = max_workers
+        self.fallback_count = 0
+        self.outstanding = 0
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tts-primary")
+
+    def engine_for(self, lang: str) -> str:
+        return self.primary.engine_for(lang)
+
+    def _finished(self, future):
+        with self._lock:
+            self.outstanding -= 1
+
+    def render(self, text: str, lang: str):
+        with self._lock:
+            saturated = self.outstanding >= self.max_workers
+            if not saturated:
+                self.outstanding += 1
+        if saturated:
+            logger.warning("%s has %d calls outstanding, using %s", self.primary.name, self.outstanding, self.fallback.name)
+        else:
+            future = self._pool.submit(self.primary.synthesize, text, lang)
+            future.add_done_callback(self._finished)
+            try:
+                return future.result(timeout=self.timeout), self.primary.engine_for(lang)
+            except FutureTimeoutError:
+                logger.warning("%s exceeded %.1fs, using %s", self.primary.name, self.timeout, self.fallback.name)
+            except Exception as e:
+                logger.warning("%s failed (%s), using %s", self.primary.name, str(e), self.fallback.name)
+        self.fallback_count += 1
+        return self.fallback.synthesize(text, lang), self.fallback.engine_for(lang)
+
+    def synthesize(self, text: str, lang: str) -> bytes:
+        return self.render(text, lang)[0]
+
+class LanguageRouter(TTSBackend):
+    """Dispatch each language to its configured backend."""
+
+    def __init__(self, default: TTSBackend, by_lang=None):
+        self.default = default
+        self.by_lang = by_lang or {}
+        self.name = default.name
+
+    def backend_for(self, lang: str) -> TTSBackend:
+        return self.by_lang.get(lang, self.default)
+
+    def engine_for(self, lang: str) -> str:
+        return self.backend_for(lang).engine_for(lang)
+
+    def synthesize(self, text: str, lang: str) -> bytes:
+        return self.backend_for(lang).synthesize(text, lang)
+
+    def render(self, text: str, lang: str):
+        return self.backend_for(lang).render(text, lang)
+
+BACKENDS = {
+    "gtts": GTTSBackend,
+    "espeak": EspeakBackend,
+}
+
+def create_backend(name: str) -> TTSBackend:
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown TTS backend: {name}")
+    return BACKENDS[name]()
+
+def backend_from_env() -> TTSBackend:
+    """Build the backend described by the TTS_* environment variables.
+
+    Remote engines are wrapped with the local fallback when it is installed.
+    """
+    def with_fallback(backend):
+        if backend.name == TTS_FALLBACK_BACKEND or not TTS_FALLBACK_BACKEND:
+            return backend
+        fallback = create_backend(TTS_FALLBACK_BACKEND)
+        if not fallback.is_available():
+            return backend
+        return FallbackBackend(backend, fallback, timeout=TTS_FALLBACK_TIMEOUT)
+
+    by_lang = {}
+    for entry in filter(None, (e.strip() for e in TTS_LANG_BACKENDS.split(","))):
+        lang, _, name = entry.partition(":")
+        by_lang[lang.strip()] = with_fallback(create_backend(name.strip()))
+    default = with_fallback(create_backend(TTS_BACKEND))
+    return LanguageRouter(default, by_lang) if by_lang else default
+
+def _split_long(segment, max_chars):
+    """Split an over-long sentence at clause, then word, boundaries."""
+    if len(segment) <= max_chars:
+        return [segment]
+    parts = []
+    current = ""
+    for piece in _CLAUSE_END.split(segment):
+        words = [piece] if len(piece) <= max_chars else piece.split()
+        for word in words:
+            if current and len(current) + len(word) + 1 > max_chars:
+                parts.append(current)
+                current = word
+            else:
+                current = f"{current} {word}" if current else word
+    if current:
+        parts.append(current)
+    return parts
+
+def split_sentences(text, min_chars=MIN_SEGMENT_CHARS, max_chars=MAX_SEGMENT_CHARS):
+    """Split text into sentence-sized segments for independent synthesis."""
+    segments = []
+    pending = ""
+    for sentence in _SENTENCE_END.split(text):
+        sentence = " ".join(sentence.split())
+        if not sentence:
+            continue
+        pending = f"{pending} {sentence}" if pending else sentence
+        if len(pending) >= min_chars:
+            segments.extend(_split_long(pending, max_chars))
+            pending = ""
+    if pending:
+        if segments and len(segments[-1]) + len(pending) < max_chars:
+            segments[-1] = f"{segments[-1]} {pending}"
+        else:
+            segments.append(pending)
+    return segments
+
+class AudioCache:
+    """Content-addressed store of synthesized clips with LRU eviction.
+
+    Clips are stored as ``<sha256>.mp3`` where the hash covers the normalized
+    text, the language and the voice settings, so identical requests map to
+    the same file. Recency is tracked in memory and persisted through the
+    file mtime, which also seeds the LRU order after a restart. Files are
+    written to a temporary name and renamed into place, so a reader never
+    sees a half-written clip.
+    """
+
+    _KEY_PATTERN = re.compile(r'^[0-9a-f]{64}\.mp3$')
+
+    def __init__(self, directory, max_bytes=TTS_CACHE_MAX_BYTES):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._load()
+
+    @staticmethod
+    def key(text, lang, voice=None):
+        payload = json.dumps(
+            {"text": " ".join(text.split()), "lang": lang, "voice": voice or {}},
+            sort_keys=True
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.mp3")
+
+    def get(self, key):
+        """Return the clip path for ``key`` and mark it recently used, or None."""
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            path = self.path(key)
+            if not os.path.exists(path):
+                # Removed behind our back
+                self._size -= self._entries.pop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return path
+
+    def writer(self):
+        """Open a temporary file in the cache directory for a new clip."""
+        return tempfile.NamedTemporaryFile(
+            dir=self.directory, prefix=".tmp-", suffix=".mp3", delete=False
+        )
+
+    def commit(self, key, tmp_path):
+        """Atomically move a finished clip into place and evict if over budget."""
+        path = self.path(key)
+        size = os.path.getsize(tmp_path)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._size -= self._entries.pop(key, 0)
+            self._entries[key] = size
+            self._size += size
+            self._evict()
+        return path
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "size_bytes": self._size,
+                "max_bytes": self.max_bytes
+            }
+
+    def _evict(self):
+        # Always keep the newest clip, even if it alone exceeds the budget
+        while self._size > self.max_bytes and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            self._size -= size
+            self.evictions += 1
+            try:
+                os.remove(self.path(key))
+            except OSError:
+                pass
+
+    def _load(self):
+        found = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.startswith(".tmp-"):
+                # Left over from an interrupted write
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            elif self._KEY_PATTERN.match(name):
+                stat = os.stat(path)
+                found.append((stat.st_mtime, name[:-4], stat.st_size))
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._size += size
+        self._evict()
 
 class TTSService:
-    def __init__(self):
+    def __init__(self, headless=False, backend=None, max_workers=TTS_MAX_WORKERS):
+        """Create the service.
+
+        In headless mode (used by the API server) pygame is never imported or
+        initialized and playback requests are ignored: callers get the audio
+        file back instead of hearing it on the server.
+
+        ``backend`` is a TTSBackend, or a plain ``(text, lang) -> mp3 bytes``
+        callable such as a local stand-in for testing; it defaults to the
+        engine selected by the TTS_* environment variables.
+        """
         self.output_dir = "audio_output"
-        if not os.path.exists(self.output_dir):
-            os.makedirs(self.output_dir)
-        pygame.mixer.init()
+        self.headless = headless
+        if backend is None:
+            backend = backend_from_env()
+        elif not isinstance(backend, TTSBackend):
+            backend = FunctionBackend(backend)
+        self.backend = backend
+        self.max_workers = max(1, max_workers)
+        # Shared by all requests, so max_workers bounds synthesis threads per process
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="tts-segment")
+        # Synthesized clips and client uploads live in separate directories,
+        # so an upload can never take the place of a cached clip
+        self.cache = AudioCache(os.path.join(self.output_dir, "cache"))
+        self.upload_dir = os.path.join(self.output_dir, "uploads")
+        os.makedirs(self.upload_dir, exist_ok=True)
+        # Clips with fallback segments: served to the request that made them,
+        # never looked up, so the next request tries the primary engine again
+        self.fallback_clips = AudioCache(os.path.join(self.output_dir, "fallback"), TTS_FALLBACK_CACHE_MAX_BYTES)
+        self._mixer = None
+        if not headless:
+            import pygame
+            pygame.mixer.init()
+            self._mixer = pygame
 
     def text_to_speech(self, text, lang='en', play_audio=True):
         try:
-            tts = gTTS(text=text, lang=lang)
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"speech_{timestamp}.mp3"
-            filepath = os.path.join(self.output_dir, filename)
-            tts.save(filepath)
+            key = self.cache_key(text, lang)
+            filepath = self.cache.get(key)
+            if filepath is None:
+                for _ in self._synthesize_to_cache(key, text, lang, keep_fallback=True):
+                    pass
+                filepath = self.cache.get(key) or self.fallback_clips.get(key)
+                if filepath is None:
+                    raise RuntimeError("Synthesized clip was evicted before it could be returned")
             
             if play_audio:
-                self._play_audio(filepath)
+                self.play_file(filepath)
             
             return filepath
         except Exception as e:
             print(f"Error in text_to_speech: {str(e)}")
             return None
 
+    def cache_key(self, text, lang='en'):
+        return AudioCache.key(text, lang, {"engine": self.backend.engine_for(lang)})
+
+    def stream_speech(self, text, lang='en', chunk_size=64 * 1024):
+        """Yield MP3 audio for ``text``, from the cache when possible.
+
+        On a miss the clip is synthesized progressively and written to the
+        cache as it streams; it is only committed if the stream completes.
+        """
+        key = self.cache_key(text, lang)
+        filepath = self.cache.get(key)
+        if filepath is not None:
+            with open(filepath, "rb") as f:
+                while True:
+                    data = f.read(chunk_size)
+                    if not data:
+                        return
+                    yield data
+
+        yield from self._synthesize_to_cache(key, text, lang)
+
+    def _synthesize_to_cache(self, key, text, lang, keep_fallback=False):
+        """Synthesize ``text``, yielding audio while teeing it into the cache.
+
+        A clip is only cached if every segment came from the engine the key
+        names; one patched together by the fallback engine is synthesized
+        again next time. With ``keep_fallback`` such a clip is put in
+        ``fallback_clips`` for the caller instead of being thrown away.
+        """
+        out = self.cache.writer()
+        engines = set()
+        try:
+            with out:
+                for audio in self.synthesize_segments(text, lang, engines):
+                    out.write(audio)
+                    yield audio
+            if engines == {self.backend.engine_for(lang)}:
+                self.cache.commit(key, out.name)
+            else:
+                logger.info("Not caching clip rendered by %s", ", ".join(sorted(engines)))
+                if keep_fallback:
+                    self.fallback_clips.commit(key, out.name)
+        finally:
+            if os.path.exists(out.name):
+                os.remove(out.name)
+
+    def synthesize_segments(self, text, lang='en', engines=None):
+        """Yield freshly synthesized MP3 audio for ``text`` segment by segment, in order.
+
+        Sentences are synthesized concurrently on the service's shared pool,
+        but only a window of ``2 * max_workers`` segments of this request is
+        queued or in flight at once, and each
+        segment is yielded as soon as it and all segments before it are done.
+        The first chunk is therefore ready after roughly one sentence's
+        synthesis time. MP3 frames are self-delimiting, so the concatenated
+        chunks form a playable stream. The engines that rendered the
+        segments are added to the ``engines`` set when one is given.
+        """
+        segments = split_sentences(text)
+        if not segments:
+            raise ValueError("No text to speak")
+        def render(segment):
+            audio, engine = self.backend.render(segment, lang)
+            if engines is not None:
+                engines.add(engine)
+            return audio
+
+        if len(segments) == 1:
+            yield render(segments[0])
+            return
+
+        window = 2 * self.max_workers
+        pending = deque()
+        remaining = iter(segments)
+        try:
+            for segment in remaining:
+                pending.append(self._pool.submit(render, segment))
+                if len(pending) >= window:
+                    break
+            while pending:
+                audio = pending.popleft().result()
+                next_segment = next(remaining, None)
+                if next_segment is not None:
+                    pending.append(self._pool.submit(render, next_segment))
+                yield audio
+        finally:
+            # Client went away or a segment failed: drop queued work
+            for future in pending:
+                future.cancel()
+
     def save_base64_audio(self, base64_string, filename="audio.mp3", play_audio=True):
         try:
             # Remove the data URL prefix if present
@@ -37,19 +526,66 @@ class TTSService:
             audio_data = base64.b64decode(base64_string)
             
             # Save to file
-            filepath = os.path.join(self.output_dir, filename)
+            filepath = self.output_path(filename)
             with open(filepath, "wb") as f:
                 f.write(audio_data)
+            self.trim_uploads()
             
             if play_audio:
-                self._play_audio(filepath)
+                self.play_file(filepath)
             
             return filepath
         except Exception as e:
             print(f"Error in save_base64_audio: {str(e)}")
             return None
 
-    def _play_audio(self, filepath):
+    def output_path(self, filename):
+        """Resolve a client-supplied filename inside the upload directory.
+
+        Names shaped like cache keys are refused, so an upload can never be
+        served in place of a synthesized clip.
+        """
+        name = os.path.basename(filename) or "audio.mp3"
+        if AudioCache._KEY_PATTERN.match(name):
+            raise ValueError(f"Reserved file name: {name}")
+        return os.path.join(self.upload_dir, name)
+
+    def audio_path(self, filename):
+        """Find a clip handed out by this service by its file name, or None."""
+        name = os.path.basename(filename)
+        if AudioCache._KEY_PATTERN.match(name):
+            directories = (self.cache.directory, self.fallback_clips.directory)
+        else:
+            directories = (self.upload_dir,)
+        for directory in directories:
+            path = os.path.join(directory, name)
+            if os.path.isfile(path):
+                return path
+        return None
+
+    def trim_uploads(self, max_bytes=TTS_UPLOAD_MAX_BYTES):
+        """Delete the oldest uploads until they fit in ``max_bytes``, keeping the newest."""
+        files = []
+        for entry in os.scandir(self.upload_dir):
+            # Uploads still being written are not counted or touched
+            if entry.is_file() and not entry.name.endswith(".part"):
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        for _, size, path in files[:-1]:
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+
+    def play_file(self, filepath):
+        if self.headless:
+            return
+        pygame = self._mixer
         try:
             pygame.mixer.music.load(filepath)
             pygame.mixer.music.play()
@@ -0,0 +1,212 @@
+import base64
+import binascii
+import mmap
+import os
+import tempfile
+from contextlib import contextmanager
+from fastapi import HTTPException, UploadFile
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers
+
+# Uploads larger than this are rejected with 413
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", 20 * 1024 * 1024))
+# Whole multipart request bodies are cut off at this size while they stream in;
+# by default room for this many files at the per-file cap, plus the form itself
+MAX_UPLOAD_FILES = int(os.getenv("MAX_UPLOAD_FILES", 10))
+MAX_UPLOAD_REQUEST_BYTES = int(os.getenv("MAX_UPLOAD_REQUEST_BYTES", MAX_UPLOAD_FILES * MAX_UPLOAD_BYTES + 64 * 1024))
+
+# Size of the slices used when decoding in-memory base64 strings
+CHUNK_SIZE = 64 * 1024
+
+# A data URL prefix ("data:audio/mpeg;base64,") is never longer than this
+_MAX_PREFIX_LENGTH = 256
+_WHITESPACE = b" \t\r\n"
+
+
+def upload_size(upload: UploadFile) -> int:
+    """Return the size of a spooled upload without reading it into memory."""
+    fileobj = upload.file
+    fileobj.seek(0, os.SEEK_END)
+    size = fileobj.tell()
+    fileobj.seek(0)
+    return size
+
+
+def check_upload_size(upload: UploadFile, max_bytes: int = MAX_UPLOAD_BYTES) -> int:
+    """Reject uploads above the configured cap before anything decodes them."""
+    size = upload_size(upload)
+    if size > max_bytes:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Upload is {size} bytes, the limit is {max_bytes} bytes"
+        )
+    if size == 0:
+        raise HTTPException(status_code=400, detail="Uploaded file is empty")
+    return size
+
+
+class UploadLimitMiddleware:
+    """Reject multipart uploads above ``max_bytes`` before they are spooled.
+
+    Starlette writes every file of a form to disk before the route runs, so
+    ``check_upload_size`` alone only catches an oversized upload once it has
+    been written out. This answers 413 up front from the Content-Length, or
+    as soon as the body received so far passes the cap.
+    """
+
+    def __init__(self, app, max_bytes: int = MAX_UPLOAD_REQUEST_BYTES):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        if not headers.get("content-type", "").startswith("multipart/form-data"):
+            await self.app(scope, receive, send)
+            return
+
+        detail = f"Upload exceeds the limit of {self.max_bytes} bytes"
+        content_length = headers.get("content-length", "")
+        if content_length.isdigit() and int(content_length) > self.max_bytes:
+            await JSONResponse({"detail": detail}, status_code=413)(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # Raised inside the form parsing, so the route's error handling answers it
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+@contextmanager
+def image_source(fileobj):
+    """Yield a seekable source for PIL without copying the upload.
+
+    Starlette spools uploads to a SpooledTemporaryFile: small files stay in
+    memory and are handed over as is, larger ones live on disk and are
+    memory-mapped so pages are only faulted in while the decoder reads them.
+    """
+    fileobj.seek(0)
+    if getattr(fileobj, "_rolled", True) and hasattr(fileobj, "fileno"):
+        try:
+            mapped = mmap.mmap(fileobj.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            mapped = None
+        if mapped is not None:
+            with mapped:
+                yield mapped
+            return
+    yield fileobj
+
+
+def iter_string_chunks(value: str, chunk_size: int = CHUNK_SIZE):
+    """Yield an in-memory string as encoded byte slices."""
+    for start in range(0, len(value), chunk_size):
+        yield value[start:start + chunk_size].encode("ascii", errors="replace")
+
+
+class Base64StreamDecoder:
+    """Incrementally decode base64 text that arrives in arbitrary-sized chunks.
+
+    Only whole 4-character groups are decoded on each feed; the remainder is
+    carried over to the next chunk, so memory use is bounded by the chunk size.
+    """
+
+    def __init__(self):
+        self._pending = b""
+        self._prefix_checked = False
+
+    def feed(self, chunk: bytes) -> bytes:
+        data = self._pending + bytes(chunk).translate(None, _WHITESPACE)
+
+        if not self._prefix_checked:
+            # Remove the data URL prefix if present
+            if data.startswith(b"data:"):
+                comma = data.find(b",")
+                if comma == -1:
+                    if len(data) > _MAX_PREFIX_LENGTH:
+                        raise HTTPException(status_code=400, detail="Malformed data URL")
+                    self._pending = data
+                    return b""
+                data = data[comma + 1:]
+            elif len(data) < 5 and b"data:".startswith(data):
+                self._pending = data
+                return b""
+            self._prefix_checked = True
+
+        usable = len(data) - len(data) % 4
+        self._pending = data[usable:]
+        return self._decode(data[:usable])
+
+    def finish(self) -> bytes:
+        """Decode whatever is left, tolerating missing padding."""
+        data = self._pending
+        self._pending = b""
+        if not data:
+            return b""
+        return self._decode(data + b"=" * (-len(data) % 4))
+
+    @staticmethod
+    def _decode(data: bytes) -> bytes:
+        if not data:
+            return b""
+        try:
+            return base64.b64decode(data, validate=True)
+        except binascii.Error as e:
+            raise HTTPException(status_code=400, detail=f"Invalid base64 payload: {str(e)}")
+
+
+async def write_base64_stream(chunks, filepath: str, max_bytes: int = MAX_UPLOAD_BYTES) -> int:
+    """Decode a (sync or async) stream of base64 chunks straight to ``filepath``.
+
+    The decoded file is written next to its destination and moved into place
+    only once the whole payload decoded, so readers never see a partial file.
+    Returns the number of bytes written.
+    """
+    decoder = Base64StreamDecoder()
+    written = 0
+    # A unique name, so concurrent uploads to the same destination cannot clobber each other
+    out = tempfile.NamedTemporaryFile(
+        dir=os.path.dirname(filepath) or ".",
+        prefix=f"{os.path.basename(filepath)}.",
+        suffix=".part",
+        delete=False
+    )
+    tmp_path = out.name
+
+    def write(out, data):
+        nonlocal written
+        written += len(data)
+        if written > max_bytes:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Decoded audio exceeds the limit of {max_bytes} bytes"
+            )
+        out.write(data)
+
+    try:
+        with out:
+            if hasattr(chunks, "__aiter__"):
+                async for chunk in chunks:
+                    write(out, decoder.feed(chunk))
+            else:
+                for chunk in chunks:
+                    write(out, decoder.feed(chunk))
+            write(out, decoder.finish())
+        if written == 0:
+            raise HTTPException(status_code=400, detail="Empty base64 payload")
+        os.replace(tmp_path, filepath)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return written
@@ -0,0 +1,159 @@
+import heapq
+import json
+import logging
+import math
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+# "statistical" (no model, microseconds) or "keybert" (embedding model, loaded on first use)
+KEYWORD_EXTRACTOR = os.getenv("YT_KEYWORD_EXTRACTOR", "statistical")
+
+_TOKEN = re.compile(r"[a-z0-9][a-z0-9+#.]*[a-z0-9+#]|[a-z0-9]")
+
+STOPWORDS = frozenset("""
+a about above after again against all also am an and any are as at be because been before
+being below between both but by can could did do does doing down during each few for from
+further had has have having he her here hers herself him himself his how i if in into is it
+its itself just let like me more most my myself no nor not now of off on once only or other
+our ours ourselves out over own same she should so some such than that the their theirs them
+themselves then there these they this those through to too under until up use used using very
+was we were what when where which while who whom why will with would you your yours yourself
+yourselves one two also may might must shall get got make made many much way well new
+tutorial course beginners full crash learn introduction intro basics guide
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens with stopwords removed, plus adjacent bigrams."""
+    words = [w for w in _TOKEN.findall(text.lower()) if w not in STOPWORDS]
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+class VideoIndex:
+    """In-memory inverted index over a video catalog with TF-IDF scoring.
+
+    Each video is a document made of its topic (weighted twice) and title.
+    Document vectors are L2-normalized at build time, so a query only walks
+    the posting lists of its own terms and sums precomputed weights.
+    """
+
+    def __init__(self, catalog: Dict[str, list], topic_weight: int = 2):
+        self.videos = []
+        self.default_videos = []
+        self.postings = defaultdict(list)
+        self.idf = {}
+        self._build(catalog, topic_weight)
+
+    @classmethod
+    def from_file(cls, path: str) -> "VideoIndex":
+        """Load a JSON catalog: ``{topic: [[title, video_id], ...] or [{"title", "video_id", "channel"}]}``."""
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def _build(self, catalog, topic_weight):
+        doc_terms = []
+        seen = set()
+        for topic, entries in catalog.items():
+            for entry in entries:
+                if isinstance(entry, dict):
+                    video = {
+                        "title": entry["title"],
+                        "video_id": entry["video_id"],
+                        "channel": entry.get("channel", "")
+                    }
+                else:
+                    title, video_id = entry[0], entry[1]
+                    video = {"title": title, "video_id": video_id, "channel": ""}
+
+                if topic == "default":
+                    self.default_videos.append(video)
+                    continue
+                if video["video_id"] in seen:
+                    continue
+                seen.add(video["video_id"])
+                self.videos.append(video)
+                doc_terms.append(Counter(tokenize(f"{topic} " * topic_weight + video["title"])))
+
+        total = len(doc_terms)
+        df = Counter(term for terms in doc_terms for term in terms)
+        self.idf = {term: math.log(1 + total / count) for term, count in df.items()}
+
+        for doc_id, terms in enumerate(doc_terms):
+            weights = {term: (1 + math.log(tf)) * self.idf[term] for term, tf in terms.items()}
+            norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+            for term, weight in weights.items():
+                self.postings[term].append((doc_id, weight / norm))
+
+    def search(self, query: str, limit: int = 5, min_score: float = 0.0) -> List[dict]:
+        """Return up to ``limit`` videos ranked by cosine similarity to ``query``."""
+        query_terms = Counter(t for t in tokenize(query) if t in self.postings)
+        if not query_terms:
+            return []
+        query_weights = {t: (1 + math.log(tf)) * self.idf[t] for t, tf in query_terms.items()}
+        norm = math.sqrt(sum(w * w for w in query_weights.values()))
+
+        scores = defaultdict(float)
+        for term, query_weight in query_weights.items():
+            for doc_id, weight in self.postings[term]:
+                scores[doc_id] += query_weight * weight
+
+        best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        return [
+            dict(self.videos[doc_id], score=score / norm)
+            for doc_id, score in best
+            if score / norm >= min_score
+        ]
+
+    def vocabulary(self):
+        return self.postings.keys()
+
+
+_keybert_model = None
+_keybert_lock = threading.Lock()
+
+
+def _keybert_keywords(text: str, top_n: int) -> List[str]:
+    global _keybert_model
+    if _keybert_model is None:
+        with _keybert_lock:
+            if _keybert_model is None:
+                from keybert import KeyBERT
+                _keybert_model = KeyBERT()
+    keywords = _keybert_model.extract_keywords(
+        text, keyphrase_ngram_range=(1, 2), stop_words="english", top_n=top_n
+    )
+    return [keyword for keyword, _ in keywords]
+
+
+def extract_keywords(text: str, top_n: int = 5, vocabulary=None) -> List[str]:
+    """Pick the terms of a note that best describe its topic.
+
+    The default statistical extractor ranks unigrams and bigrams by frequency,
+    boosting terms the catalog knows about, and drops unigrams already covered
+    by a selected bigram. Set YT_KEYWORD_EXTRACTOR=keybert to use KeyBERT.
+    """
+    if KEYWORD_EXTRACTOR == "keybert":
+        try:
+            return _keybert_keywords(text, top_n)
+        except Exception as e:
+            logger.warning(f"KeyBERT keyword extraction failed, using statistical extractor: {str(e)}")
+
+    counts = Counter(t for t in tokenize(text) if len(t) > 2)
+    if vocabulary is not None:
+        for term in counts:
+            if term in vocabulary:
+                counts[term] *= 3
+
+    keywords = []
+    for term, _ in counts.most_common():
+        if " " not in term and any(term in kw.split() for kw in keywords):
+            continue
+        keywords.append(term)
+        if len(keywords) == top_n:
+            break
+    return keywords